@@ -0,0 +1,54 @@
+"""
+Compare the splitting of documents into passages by the indexing preprocessor (BatchTokenChunker, one batched call to
+the fast tokenizer) with SentencePreProcessor (haystack's PreProcessor, one tokenizer call per sentence) on the
+crawled documents, with the configuration of the indexing pipeline. The passages of both are checked to be identical.
+
+Usage: python3 dev/benchmarks/benchmark_chunker.py --num_docs 1000 --batch_size 1000 --repeat 3
+"""
+import argparse
+import json
+
+from haystack.schema import Document
+from transformers import AutoTokenizer
+
+from benchmark_utils import load_passages, timeit, summarize
+
+from pipelines.preprocessor import SentencePreProcessor, BatchTokenChunker
+
+EMBEDDING_MODEL = "panosgriz/covid_el_paraphrase-multilingual-MiniLM-L12-v2"
+
+
+def process_in_batches(preprocessor, documents, batch_size: int):
+    passages = []
+    for i in range(0, len(documents), batch_size):
+        passages.extend(preprocessor.process(documents[i:i + batch_size]))
+    return passages
+
+def main(num_docs: int, batch_size: int, repeat: int, tokenizer: str = EMBEDDING_MODEL):
+
+    documents = [Document(content=content) for content in load_passages(limit=num_docs)]
+    num_chars = sum(len(doc.content) for doc in documents)
+    config = dict(clean_empty_lines=True, split_by="token", split_length=128, split_respect_sentence_boundary=True,
+                  tokenizer=AutoTokenizer.from_pretrained(tokenizer), progress_bar=False)
+
+    report = {"tokenizer": tokenizer, "documents": len(documents), "mb": round(num_chars / 2**20, 2), "batch_size": batch_size}
+    results = {}
+    for name, preprocessor in (("preprocessor", SentencePreProcessor(**config)), ("batch_token_chunker", BatchTokenChunker(**config))):
+        # The documents are copied, because cleaning may modify them in place
+        passages, timings = timeit(lambda: process_in_batches(preprocessor, [Document.from_dict(d.to_dict()) for d in documents], batch_size), repeat=repeat)
+        results[name] = passages
+        report[name] = {**summarize(timings), "passages": len(passages), "docs_per_s": round(len(documents) / min(timings), 1)}
+
+    report["speedup"] = round(report["preprocessor"]["mean_ms"] / report["batch_token_chunker"]["mean_ms"], 2)
+    report["identical_passages"] = [(d.id, d.content, d.meta) for d in results["preprocessor"]] == [(d.id, d.content, d.meta) for d in results["batch_token_chunker"]]
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_docs", type=int, default=None, help="number of crawled documents to split (default: all)")
+    parser.add_argument("--batch_size", type=int, default=1000, help="number of documents per process() call, as the .jsonl windows of the indexing pipeline")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tokenizer", default=EMBEDDING_MODEL, help="fast tokenizer the passages are split with (default: the embedding model's)")
+    args = parser.parse_args()
+    main(num_docs=args.num_docs, batch_size=args.batch_size, repeat=args.repeat, tokenizer=args.tokenizer)
@@ -0,0 +1,76 @@
+"""
+Measure passage embedding throughput on CPU: the EmbeddingRetriever of the indexing pipeline in one process against
+PassageEmbeddingEngine with an increasing number of cores. The passages are the crawled documents split as the
+indexing pipeline splits them. The engine's embeddings are checked against the retriever's.
+
+Usage: python3 dev/benchmarks/benchmark_embedding_engine.py --num_docs 500 --cores 1 2 4 8 --threads_per_worker 1
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+import torch
+from haystack.schema import Document
+from haystack.nodes import EmbeddingRetriever
+from transformers import AutoTokenizer
+
+from benchmark_utils import load_passages
+
+from pipelines.preprocessor import SentencePreProcessor
+from pipelines.embedding_engine import PassageEmbeddingEngine
+
+EMBEDDING_MODEL = "panosgriz/covid_el_paraphrase-multilingual-MiniLM-L12-v2"
+
+
+def load_chunks(num_docs: int):
+    preprocessor = SentencePreProcessor(
+        clean_empty_lines=True,
+        split_by="token",
+        split_length=128,
+        split_respect_sentence_boundary=True,
+        tokenizer=AutoTokenizer.from_pretrained(EMBEDDING_MODEL),
+        progress_bar=False
+        )
+    return preprocessor.process([Document(content=passage) for passage in load_passages(limit=num_docs)])
+
+def main(num_docs: int, cores_list, threads_per_worker: int, batch_size: int):
+
+    chunks = load_chunks(num_docs)
+    texts = [doc.content for doc in chunks]
+
+    retriever = EmbeddingRetriever(embedding_model=EMBEDDING_MODEL, max_seq_len=128, use_gpu=False, batch_size=batch_size, progress_bar=False)
+    report = {"passages": len(texts), "threads_per_worker": threads_per_worker}
+    for cores in cores_list:
+        torch.set_num_threads(cores)
+        start = time.perf_counter()
+        baseline = retriever.embed_documents(chunks)
+        report[f"retriever_{cores}_threads"] = {"passages_per_s": round(len(texts) / (time.perf_counter() - start), 1)}
+
+    for cores in cores_list:
+        num_workers = max(1, cores // threads_per_worker)
+        engine = PassageEmbeddingEngine(EMBEDDING_MODEL, max_seq_len=128, num_workers=num_workers,
+                                        threads_per_worker=threads_per_worker, batch_size=batch_size)
+        # Start the workers and load their models outside of the measurement
+        engine.embed(texts[:num_workers * batch_size])
+        start = time.perf_counter()
+        embeddings = engine.embed(texts)
+        elapsed = time.perf_counter() - start
+        engine.close()
+        report[f"engine_{cores}_cores"] = {
+            "workers": num_workers,
+            "passages_per_s": round(len(texts) / elapsed, 1),
+            "max_abs_diff": float(np.abs(embeddings - baseline).max()),
+        }
+
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_docs", type=int, default=500, help="number of crawled documents to split and embed")
+    parser.add_argument("--cores", nargs="+", type=int, default=[1, 2, 4, 8])
+    parser.add_argument("--threads_per_worker", type=int, default=1)
+    parser.add_argument("--batch_size", type=int, default=64)
+    args = parser.parse_args()
+    main(num_docs=args.num_docs, cores_list=args.cores, threads_per_worker=args.threads_per_worker, batch_size=args.batch_size)
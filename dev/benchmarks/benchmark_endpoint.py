@@ -0,0 +1,96 @@
+"""
+Measure the latency of a query endpoint of a running QA-subsystem service on the evaluation questions.
+
+Run it once per server configuration and compare the reports, e.g. for the extractive endpoint before/after the
+CPU reader profile:
+    READER_DEVICE=cuda -> python3 dev/benchmarks/benchmark_endpoint.py --endpoint extractive-query --label before
+    READER_DEVICE=cpu  -> python3 dev/benchmarks/benchmark_endpoint.py --endpoint extractive-query --label after
+
+With --concurrency, the questions are also sent by several concurrent users, e.g. for the generator's continuous
+batching scheduler (the aggregate tokens/sec is computed from the generated_tokens meta of the answers):
+    GENERATOR_MAX_BATCH_SIZE=16 -> python3 dev/benchmarks/benchmark_endpoint.py --endpoint rag-query --label batching --concurrency 1 4 16
+
+For the extractive-first cascade, the latency is also reported per answering path (the `answered_by` field):
+    python3 dev/benchmarks/benchmark_endpoint.py --endpoint cascade-query --label cascade
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+from benchmark_utils import SCRIPT_DIR, load_questions, timeit, summarize
+
+HAYSTACK_SERVICE_HOST = os.environ["HAYSTACK_SERVICE_HOST"] if "HAYSTACK_SERVICE_HOST" in os.environ else "localhost"
+HAYSTACK_SERVICE_PORT = int(
+    os.environ['HAYSTACK_SERVICE_PORT']) if "HAYSTACK_SERVICE_PORT" in os.environ else 8000
+
+
+def post_query(endpoint: str, query: str, params: dict) -> dict:
+    r = requests.post(url=f"http://{HAYSTACK_SERVICE_HOST}:{HAYSTACK_SERVICE_PORT}/{endpoint}", json={"query": query, "params": params})
+    r.raise_for_status()
+    return r.json()
+
+def summarize_by_path(results: list, timings: list) -> dict:
+    """Share of queries and latency per answering path of the cascade endpoint"""
+
+    paths = {}
+    for result, t in zip(results, timings):
+        paths.setdefault(result.get("answered_by"), []).append(t)
+    return {str(path): {"share": round(len(t) / len(timings), 3), **summarize(t)} for path, t in paths.items()}
+
+def run_concurrent(endpoint: str, questions: list, params: dict, concurrency: int) -> dict:
+    """Send the questions from `concurrency` concurrent users and report latency and aggregate generation throughput"""
+
+    def timed_query(question):
+        return timeit(post_query, endpoint, question["question"], params)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed_query, questions))
+    elapsed = time.perf_counter() - start
+
+    timings = [t for _, ts in results for t in ts]
+    generated_tokens = sum(answer.get("meta", {}).get("generated_tokens", 0) for result, _ in results for answer in result.get("answers", []))
+    return {
+        **summarize(timings),
+        "queries_per_s": round(len(questions) / elapsed, 3),
+        "generated_tokens_per_s": round(generated_tokens / elapsed, 3),
+    }
+
+def main(endpoint: str, label: str, num_queries: int, params: dict, concurrency: list):
+
+    questions = load_questions(limit=num_queries)
+    # Warm up the models before timing
+    post_query(endpoint, questions[0]["question"], params)
+
+    if concurrency:
+        report = {"endpoint": endpoint, "label": label, "num_queries": len(questions), "params": params}
+        for num_users in concurrency:
+            report[f"concurrency_{num_users}"] = run_concurrent(endpoint, questions, params, num_users)
+    else:
+        timings, results = [], []
+        for question in questions:
+            result, t = timeit(post_query, endpoint, question["question"], params)
+            timings.extend(t)
+            results.append(result)
+        report = {"endpoint": endpoint, "label": label, "num_queries": len(questions), "params": params, **summarize(timings)}
+        if any("answered_by" in result for result in results):
+            report["by_path"] = summarize_by_path(results, timings)
+    print(json.dumps(report, indent=4))
+
+    os.makedirs(os.path.join(SCRIPT_DIR, "reports"), exist_ok=True)
+    with open(os.path.join(SCRIPT_DIR, "reports", f"{endpoint}_{label}.json"), "w") as fp:
+        json.dump(report, fp, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--endpoint", type=str, default="extractive-query", help="query endpoint to benchmark")
+    parser.add_argument("--label", type=str, required=True, help="name of the server configuration under test")
+    parser.add_argument("--num_queries", type=int, default=100, help="number of evaluation questions to send")
+    parser.add_argument("--params", type=json.loads, default={"Retriever": {"top_k": 10}, "Ranker": {"top_k": 10}}, help="pipeline params as a JSON string")
+    parser.add_argument("--concurrency", type=int, nargs="*", default=[], help="numbers of concurrent users to benchmark, e.g. 1 4 16")
+    args = parser.parse_args()
+    main(endpoint=args.endpoint, label=args.label, num_queries=args.num_queries, params=args.params, concurrency=args.concurrency)
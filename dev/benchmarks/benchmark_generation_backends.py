@@ -0,0 +1,53 @@
+"""
+Decoding throughput (generated tokens/sec) and latency of the Generator's generation backends on the evaluation
+questions, with the Generator's prompt template.
+
+Usage:
+    python3 dev/benchmarks/benchmark_generation_backends.py --backends cpu --num_threads 8 --num_queries 20
+    python3 dev/benchmarks/benchmark_generation_backends.py --backends llama_cpp --gguf_path meltemi-7b-instruct-v1.Q4_K_M.gguf
+"""
+import argparse
+import json
+
+from transformers import AutoTokenizer
+from haystack.schema import Document
+
+from benchmark_utils import load_questions, timeit, summarize
+from benchmark_prefix_cache import PROMPT_MESSAGES
+
+from pipelines.generation import render_prompt, encode_prompt
+from pipelines.generation_backends import load_backend
+
+
+def main(model_name: str, backends: list, num_threads: int, gguf_path: str, num_queries: int, max_new_tokens: int):
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    prompt = tokenizer.apply_chat_template(PROMPT_MESSAGES, add_generation_prompt=True, tokenize=False)
+    questions = load_questions(limit=num_queries)
+
+    report = {"model": model_name, "num_queries": len(questions), "max_new_tokens": max_new_tokens, "num_threads": num_threads}
+    for name in backends:
+        backend = load_backend(name, model_name, num_threads=num_threads, gguf_path=gguf_path)
+        timings, generated_tokens = [], 0
+        for question in questions:
+            input_ids = encode_prompt(tokenizer, render_prompt(prompt, question["question"], [Document(content=question["context"])]))
+            output_ids, t = timeit(backend.generate, input_ids, max_new_tokens=max_new_tokens, do_sample=False)
+            timings.extend(t)
+            generated_tokens += output_ids.shape[1]
+
+        report[name] = {**summarize(timings), "tokens_per_s": round(generated_tokens / sum(timings), 3)}
+        print(json.dumps(report, indent=4))
+        del backend
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="ilsp/Meltemi-7B-Instruct-v1", help="causal LM with a chat template (its tokenizer is used by every backend)")
+    parser.add_argument("--backends", type=str, nargs="+", default=["cpu"], help="generation backends to benchmark: gpu, cpu, llama_cpp")
+    parser.add_argument("--num_threads", type=int, default=None, help="CPU threads of the cpu and llama_cpp backends")
+    parser.add_argument("--gguf_path", type=str, default=None, help=".gguf model file of the llama_cpp backend")
+    parser.add_argument("--num_queries", type=int, default=20, help="number of evaluation questions to run")
+    parser.add_argument("--max_new_tokens", type=int, default=100, help="max_new_tokens of every generation")
+    args = parser.parse_args()
+    main(model_name=args.model, backends=args.backends, num_threads=args.num_threads, gguf_path=args.gguf_path,
+         num_queries=args.num_queries, max_new_tokens=args.max_new_tokens)
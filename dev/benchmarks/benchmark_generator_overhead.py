@@ -0,0 +1,63 @@
+"""
+Measure the per-request overhead of constructing a PromptNode on every Generator call (previous behaviour) against
+reusing one PromptNode built once (current behaviour).
+
+A tiny causal model generating a single token keeps the generation cost negligible, so the difference between the
+two timings is the construction overhead. Pass --model ilsp/Meltemi-7B-Instruct-v1 on a GPU host for the real model.
+
+Usage: python3 dev/benchmarks/benchmark_generator_overhead.py --num_queries 50
+"""
+import argparse
+import json
+
+from benchmark_utils import load_questions, timeit, summarize
+
+from transformers import AutoModelForCausalLM, AutoTokenizer
+from haystack.nodes import PromptNode, PromptTemplate, AnswerParser
+from haystack.schema import Document
+
+PROMPT = 'Ερώτηση: {query} | Κείμενο: {join(documents)} | Απάντηση: '
+GENERATION_KWARGS = {'max_new_tokens': 1, 'do_sample': False}
+
+
+def build_prompt_node(model_name, model, tokenizer):
+    return PromptNode(model_name_or_path=model_name,
+                      default_prompt_template=PromptTemplate(prompt=PROMPT, output_parser=AnswerParser()),
+                      top_k=1,
+                      model_kwargs={
+                          'model': model,
+                          'tokenizer': tokenizer,
+                          'task_name': 'text2text-generation',
+                          'device': None,
+                          "generation_kwargs": GENERATION_KWARGS
+                      })
+
+def per_call_prompt_node(model_name, model, tokenizer, query, documents):
+    prompt_node = build_prompt_node(model_name, model, tokenizer)
+    return prompt_node.run(query=query, documents=documents)
+
+def main(model_name: str, num_queries: int):
+
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    persistent_prompt_node = build_prompt_node(model_name, model, tokenizer)
+
+    timings = {"per_call": [], "persistent": []}
+    for question in load_questions(limit=num_queries):
+        documents = [Document(content=question["context"])]
+        _, t = timeit(per_call_prompt_node, model_name, model, tokenizer, question["question"], documents)
+        timings["per_call"].extend(t)
+        _, t = timeit(persistent_prompt_node.run, query=question["question"], documents=documents, generation_kwargs=GENERATION_KWARGS)
+        timings["persistent"].extend(t)
+
+    report = {name: summarize(t) for name, t in timings.items()}
+    report["overhead_removed_per_request_ms"] = round(report["per_call"]["mean_ms"] - report["persistent"]["mean_ms"], 3)
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="sshleifer/tiny-gpt2", help="causal LM to generate with")
+    parser.add_argument("--num_queries", type=int, default=50, help="number of evaluation questions to run")
+    args = parser.parse_args()
+    main(model_name=args.model, num_queries=args.num_queries)
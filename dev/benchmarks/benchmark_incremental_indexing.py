@@ -0,0 +1,59 @@
+"""
+Measure the time to re-ingest an unchanged corpus with incremental indexing: the crawled documents are indexed into
+a scratch index, then indexed again. The second run only hashes and looks up the passages, nothing is embedded.
+With --num_changed, that many documents are modified before the second run.
+
+Usage: python3 dev/benchmarks/benchmark_incremental_indexing.py --num_changed 0
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from benchmark_utils import CRAWLED_DOCS_FILE
+
+from pipelines.indexing_pipeline import index_jsonl_stream, DOCUMENT_STORE, INCREMENTAL_INDEXING
+
+BENCHMARK_INDEX = "benchmark_incremental_indexing"
+
+
+def change_documents(path: str, num_changed: int):
+    with open(path, "r", encoding="utf-8") as fp:
+        docs = [json.loads(line) for line in fp if line.strip()]
+    for doc in docs[:num_changed]:
+        doc["content"] += " Ενημερώθηκε."
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.writelines(json.dumps(doc, ensure_ascii=False) + "\n" for doc in docs)
+
+def timed_ingest(path: str) -> dict:
+    start = time.perf_counter()
+    stats = index_jsonl_stream(path, meta={"source": os.path.basename(CRAWLED_DOCS_FILE)}, index=BENCHMARK_INDEX)
+    stats["seconds"] = round(time.perf_counter() - start, 2)
+    return stats
+
+def main(num_changed: int):
+
+    if not INCREMENTAL_INDEXING:
+        raise ValueError("Set INCREMENTAL_INDEXING=true to benchmark incremental indexing")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus = os.path.join(tmp_dir, "crawled_docs.jsonl")
+        shutil.copy(CRAWLED_DOCS_FILE, corpus)
+
+        report = {"first_ingest": timed_ingest(corpus)}
+        if num_changed:
+            change_documents(corpus, num_changed)
+        report["re_ingest"] = timed_ingest(corpus)
+        report["speedup"] = round(report["first_ingest"]["seconds"] / report["re_ingest"]["seconds"], 1)
+
+    DOCUMENT_STORE.delete_index(BENCHMARK_INDEX)
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_changed", type=int, default=0, help="number of documents to modify before re-ingesting")
+    args = parser.parse_args()
+    main(num_changed=args.num_changed)
@@ -0,0 +1,81 @@
+"""
+Report how much near-duplicate detection (NearDuplicateFilter) shrinks the index on the data sources: the files are
+split into passages as the indexing pipeline splits them, and the passages of all sources are passed through the
+filter in order, without a document store. For every threshold the report gives the skipped passages per source,
+the number of sources linked to the kept passages, and the time per passage.
+
+Usage: python3 dev/benchmarks/benchmark_near_duplicates.py --thresholds 0.7 0.8 0.9
+"""
+import argparse
+import glob
+import json
+import os
+import time
+from collections import Counter
+
+from haystack.schema import Document
+from transformers import AutoTokenizer
+
+from benchmark_utils import SRC_DIR
+
+from pipelines.preprocessor import BatchTokenChunker
+from pipelines.incremental_indexing import ChangedPassagesFilter
+from pipelines.near_duplicates import NearDuplicateFilter, SOURCE_META_FIELD, NEAR_DUPLICATE_SOURCES_META_FIELD
+from utils.parallel_file_converter import ParallelFileConverter
+
+DEFAULT_FILES = sorted(glob.glob(os.path.join(SRC_DIR, "external_data", "*.jsonl"))) + \
+    sorted(glob.glob(os.path.join(SRC_DIR, "external_data", "data", "*")))
+EMBEDDING_MODEL = "panosgriz/covid_el_paraphrase-multilingual-MiniLM-L12-v2"
+
+
+def load_passages(files, tokenizer: str = EMBEDDING_MODEL):
+    preprocessor = BatchTokenChunker(
+        clean_empty_lines=True,
+        split_by="token",
+        split_length=128,
+        split_respect_sentence_boundary=True,
+        tokenizer=AutoTokenizer.from_pretrained(tokenizer),
+        progress_bar=False
+        )
+    converter = ParallelFileConverter(preprocessor=preprocessor, num_workers=1)
+    passages = converter.convert(files, meta=[{SOURCE_META_FIELD: os.path.basename(f)} for f in files])
+    # Ids of the indexing pipeline: the same passage in two sources is two passages
+    ChangedPassagesFilter(document_store=None).assign_ids(passages)
+    return list({doc.id: doc for doc in passages}.values())
+
+def main(files, thresholds, tokenizer: str = EMBEDDING_MODEL):
+
+    passages = load_passages(files, tokenizer=tokenizer)
+    passages_per_source = Counter(doc.meta[SOURCE_META_FIELD] for doc in passages)
+    report = {"tokenizer": tokenizer, "passages": len(passages), "passages_per_source": dict(passages_per_source)}
+
+    for threshold in thresholds:
+        near_duplicate_filter = NearDuplicateFilter(document_store=None, threshold=threshold, mode="link")
+        documents = [Document.from_dict(doc.to_dict()) for doc in passages]
+        start = time.perf_counter()
+        output, _ = near_duplicate_filter.run(documents=documents)
+        elapsed = time.perf_counter() - start
+
+        duplicate_ids = set(output["near_duplicate_ids"])
+        skipped = Counter(doc.meta[SOURCE_META_FIELD] for doc in documents if doc.id in duplicate_ids)
+        # Near-duplicates of a passage of another source are linked to it, the ones within a source are not
+        linked_sources = sum(len(doc.meta.get(NEAR_DUPLICATE_SOURCES_META_FIELD, [])) for doc in output["documents"])
+        report[f"threshold_{threshold}"] = {
+            "kept": len(output["documents"]),
+            "near_duplicates": output["near_duplicates"],
+            "index_shrinkage": round(output["near_duplicates"] / len(documents), 4) if documents else 0.0,
+            "near_duplicates_per_source": dict(skipped),
+            "linked_sources": linked_sources,
+            "ms_per_passage": round(1000 * elapsed / len(documents), 3) if documents else None,
+        }
+
+    print(json.dumps(report, indent=4, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", nargs="+", default=DEFAULT_FILES, help="source files (default: src/external_data/*.jsonl and src/external_data/data/*)")
+    parser.add_argument("--thresholds", nargs="+", type=float, default=[0.7, 0.8, 0.9], help="Jaccard similarity thresholds to report")
+    parser.add_argument("--tokenizer", default=EMBEDDING_MODEL, help="tokenizer the passages are split with (default: the embedding model's)")
+    args = parser.parse_args()
+    main(files=args.files, thresholds=args.thresholds, tokenizer=args.tokenizer)
@@ -0,0 +1,93 @@
+"""
+Measure the throughput of the file conversion and preprocessing stage of the indexing pipeline, sequentially (the
+haystack converter pipeline) and with ParallelFileConverter for several numbers of worker processes.
+Embedding and writing to the document store are not included.
+
+The default corpus mixes the example pdf/txt/jsonl files of the tests with the crawled and wikipedia .jsonl
+documents. Pass your own files or directories (e.g. with .docx files) with --files.
+
+Usage: python3 dev/benchmarks/benchmark_parallel_conversion.py --num_workers 1 2 4 8
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+from transformers import AutoTokenizer
+
+from benchmark_utils import REPO_DIR, SRC_DIR, CRAWLED_DOCS_FILE
+
+from pipelines.preprocessor import SentencePreProcessor
+from utils.file_type_classifier import init_file_to_doc_pipeline
+from utils.parallel_file_converter import ParallelFileConverter, SUPPORTED_EXTENSIONS
+
+DEFAULT_FILES = [
+    os.path.join(REPO_DIR, "test", "example_data"),
+    CRAWLED_DOCS_FILE,
+    os.path.join(SRC_DIR, "external_data", "wiki_docs.jsonl"),
+]
+EMBEDDING_MODEL = "panosgriz/covid_el_paraphrase-multilingual-MiniLM-L12-v2"
+
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(f for f in glob.glob(os.path.join(path, "**", "*"), recursive=True) if f.lower().endswith(SUPPORTED_EXTENSIONS)))
+        else:
+            files.append(path)
+    return files
+
+def measure(convert, files, size_mb):
+    start = time.perf_counter()
+    documents = convert(files)
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": round(elapsed, 2),
+        "documents": len(documents),
+        "files_per_s": round(len(files) / elapsed, 2),
+        "documents_per_s": round(len(documents) / elapsed, 1),
+        "mb_per_s": round(size_mb / elapsed, 2),
+    }
+
+def main(files, num_workers_list):
+
+    files = collect_files(files)
+    size_mb = sum(os.path.getsize(f) for f in files) / 2**20
+    by_type = {}
+    for f in files:
+        extension = os.path.splitext(f)[1].lower()
+        by_type[extension] = by_type.get(extension, 0) + 1
+
+    preprocessor = SentencePreProcessor(
+        clean_empty_lines=True,
+        split_by="token",
+        split_length=128,
+        split_respect_sentence_boundary=True,
+        tokenizer=AutoTokenizer.from_pretrained(EMBEDDING_MODEL)
+        )
+
+    sequential = init_file_to_doc_pipeline(custom_preprocessor=preprocessor)
+    report = {"files": by_type, "size_mb": round(size_mb, 2)}
+    report["sequential"] = measure(lambda fs: sequential.run(file_paths=fs)["documents"], files, size_mb)
+
+    for num_workers in num_workers_list:
+        converter = ParallelFileConverter(preprocessor=preprocessor, num_workers=num_workers)
+        # Start the pool outside of the measurement
+        converter.convert(files[:2])
+        result = measure(converter.convert, files, size_mb)
+        result["speedup"] = round(report["sequential"]["seconds"] / result["seconds"], 2)
+        report[f"parallel_{num_workers}_workers"] = result
+        if converter._pool is not None:
+            converter._pool.shutdown()
+
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", nargs="+", default=DEFAULT_FILES, help="files or directories to convert")
+    parser.add_argument("--num_workers", nargs="+", type=int, default=[1, 2, 4, os.cpu_count()], help="numbers of worker processes to measure")
+    args = parser.parse_args()
+    main(files=args.files, num_workers_list=args.num_workers)
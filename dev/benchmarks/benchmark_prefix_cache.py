@@ -0,0 +1,63 @@
+"""
+Time to first token of the Generator's prompts with and without reusing the key/value cache of the constant
+system instruction prefix (PrefixCache), and check that greedy outputs are identical.
+
+Usage: python3 dev/benchmarks/benchmark_prefix_cache.py --num_queries 50
+"""
+import argparse
+import json
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+from haystack.schema import Document
+
+from benchmark_utils import load_questions, timeit, summarize
+
+from pipelines.generation import PrefixCache, render_prompt, encode_prompt
+
+PROMPT_MESSAGES = [
+    {"role": "system", "content": 'Χρησιμοποιώντας τις πληροφορίες που περιέχονται στο παρακάτω Κείμενο, δώσε μια ολοκληρωμένη απάντηση στην Ερώτηση. Εάν δεν μπορείς να απαντήσεις με βάση το Κείμενο, απάντα "Δεν γνωρίζω".'},
+    {"role": "user", "content": 'Ερώτηση: {query} | Κείμενο: {join(documents)} | Απάντηση: '}
+]
+
+
+def main(model_name: str, num_queries: int, check_tokens: int):
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype="auto", device_map="auto").eval()
+    prompt = tokenizer.apply_chat_template(PROMPT_MESSAGES, add_generation_prompt=True, tokenize=False)
+    prefix = prompt[:prompt.rindex("\n", 0, prompt.index("{query}")) + 1]
+    prefix_cache = PrefixCache.from_text(model, tokenizer, prefix)
+
+    def first_token_without_cache(input_ids):
+        return model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), max_new_tokens=1, do_sample=False)
+
+    timings = {"ttft_without_cache": [], "ttft_with_cache": []}
+    identical = 0
+    questions = load_questions(limit=num_queries)
+    with torch.inference_mode():
+        for question in questions:
+            text = render_prompt(prompt, question["question"], [Document(content=question["context"])])
+            input_ids = encode_prompt(tokenizer, text).to(model.device)
+
+            _, t = timeit(first_token_without_cache, input_ids)
+            timings["ttft_without_cache"].extend(t)
+            _, t = timeit(prefix_cache.generate, input_ids, max_new_tokens=1, do_sample=False)
+            timings["ttft_with_cache"].extend(t)
+
+            expected = model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), max_new_tokens=check_tokens, do_sample=False)[:, input_ids.shape[1]:]
+            identical += int(torch.equal(expected, prefix_cache.generate(input_ids, max_new_tokens=check_tokens, do_sample=False)))
+
+    report = {name: summarize(t) for name, t in timings.items()}
+    report["prefix_tokens"] = prefix_cache.prefix_length
+    report["identical_greedy_outputs"] = f"{identical}/{len(questions)}"
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="ilsp/Meltemi-7B-Instruct-v1", help="causal LM with a chat template")
+    parser.add_argument("--num_queries", type=int, default=50, help="number of evaluation questions to run")
+    parser.add_argument("--check_tokens", type=int, default=50, help="number of greedy tokens compared between both paths")
+    args = parser.parse_args()
+    main(model_name=args.model, num_queries=args.num_queries, check_tokens=args.check_tokens)
@@ -0,0 +1,79 @@
+"""
+Measure the query time tokenization work saved by storing passage token ids at index time (see PassageTokenizer).
+
+For every evaluation question, the ranker and reader inputs of `top_k` passages are built once by tokenizing the passage
+text (current path) and once from the stored token ids (pretokenized path). Only tokenization is timed; no model is run.
+
+Usage: python3 dev/benchmarks/benchmark_pretokenization.py --num_queries 200 --top_k 10
+"""
+import argparse
+import json
+import random
+from types import SimpleNamespace
+
+from benchmark_utils import load_passages, load_questions, timeit, summarize
+
+from haystack.schema import Document
+from haystack.modeling.model.feature_extraction import tokenize_batch_question_answering
+
+from pipelines.passage_tokenizer import PassageTokenizer, get_pretokenized
+from pipelines.ranker import SentenceTransformersRanker
+from pipelines.reader import PretokenizedSquadProcessor
+
+RANKER_MODEL = "amberoad/bert-multilingual-passage-reranking-msmarco"
+READER_MODEL = "panosgriz/mdeberta-v3-base-squad2-covid-el_small"
+
+
+def main(num_queries: int, top_k: int, ranker_model: str = RANKER_MODEL, reader_model: str = READER_MODEL):
+
+    passage_tokenizer = PassageTokenizer(tokenizer_names=[ranker_model, reader_model])
+    ranker_tokenizer = passage_tokenizer.tokenizers[ranker_model]
+    reader_tokenizer = passage_tokenizer.tokenizers[reader_model]
+
+    # Use 128 token passages, like the ones produced by the indexing pipeline
+    passages = []
+    for text in load_passages():
+        ids = ranker_tokenizer.encode(text, add_special_tokens=False)
+        passages.extend(ranker_tokenizer.decode(ids[i : i + 128]) for i in range(0, len(ids), 128))
+    documents = [Document(content=text) for text in passages]
+    passage_tokenizer.run(documents=documents)
+
+    ranker = SimpleNamespace(transformer_tokenizer=ranker_tokenizer, embed_meta_fields=None)
+    processor = SimpleNamespace(tokenizer=reader_tokenizer, pretokenized={})
+    processor._get_passage_tokens = lambda b: PretokenizedSquadProcessor._get_passage_tokens(processor, b)
+
+    rng = random.Random(0)
+    timings = {"ranker": [], "ranker_pretokenized": [], "reader": [], "reader_pretokenized": []}
+
+    for question in load_questions(limit=num_queries):
+        query = question["question"]
+        docs = rng.sample(documents, top_k)
+        processor.pretokenized = {doc.id: get_pretokenized(doc, reader_model) for doc in docs}
+        pre_baskets = [{"context": doc.content, "qas": [{"question": query, "id": doc.id, "answers": []}]} for doc in docs]
+        indices = list(range(len(docs)))
+
+        _, t = timeit(ranker_tokenizer, [query] * len(docs), [doc.content for doc in docs], max_length=512, padding="max_length", truncation=True, return_tensors="pt")
+        timings["ranker"].extend(t)
+        _, t = timeit(SentenceTransformersRanker._get_pretokenized_features, ranker, query, docs)
+        timings["ranker_pretokenized"].extend(t)
+        _, t = timeit(tokenize_batch_question_answering, pre_baskets, reader_tokenizer, indices)
+        timings["reader"].extend(t)
+        _, t = timeit(PretokenizedSquadProcessor._tokenize_questions, processor, pre_baskets, indices)
+        timings["reader_pretokenized"].extend(t)
+
+    report = {"ranker_model": ranker_model, "reader_model": reader_model, **{name: summarize(t) for name, t in timings.items()}}
+    report["saved_per_query_ms"] = round(
+        report["ranker"]["mean_ms"] + report["reader"]["mean_ms"]
+        - report["ranker_pretokenized"]["mean_ms"] - report["reader_pretokenized"]["mean_ms"], 3
+    )
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_queries", type=int, default=200, help="number of evaluation questions to run")
+    parser.add_argument("--top_k", type=int, default=10, help="number of passages per query")
+    parser.add_argument("--ranker_model", default=RANKER_MODEL, help="model whose tokenizer builds the ranker inputs")
+    parser.add_argument("--reader_model", default=READER_MODEL, help="model whose tokenizer builds the reader inputs")
+    args = parser.parse_args()
+    main(num_queries=args.num_queries, top_k=args.top_k, ranker_model=args.ranker_model, reader_model=args.reader_model)
@@ -0,0 +1,56 @@
+"""
+Compare the offline sentence segmenter (utils.sentence_segmentation) with nltk's Greek punkt model on the crawled
+documents: segmentation time, number of sentences and the share of documents segmented identically.
+The nltk path is timed as remove_incomplete_sentences used it, with nltk.download('punkt') before every call, and
+without the download.
+
+Usage: python3 dev/benchmarks/benchmark_sentence_segmentation.py --num_docs 1000
+"""
+import argparse
+import json
+
+import nltk
+
+from benchmark_utils import load_passages, timeit, summarize
+
+from utils.sentence_segmentation import get_sentence_segmenter
+
+
+def nltk_with_download(text: str):
+    nltk.download("punkt", quiet=True)
+    return nltk.sent_tokenize(text, language="greek")
+
+def main(num_docs: int):
+
+    passages = load_passages(limit=num_docs)
+    # Load both models before timing
+    segmenter = get_sentence_segmenter("greek")
+    nltk.sent_tokenize("Φόρτωση.", language="greek")
+
+    timings = {"segmenter": [], "nltk": [], "nltk_with_download": []}
+    num_sentences = {"segmenter": 0, "nltk": 0}
+    identical = 0
+    for passage in passages:
+        ours, t = timeit(segmenter.split, passage)
+        timings["segmenter"].extend(t)
+        theirs, t = timeit(nltk.sent_tokenize, passage, language="greek")
+        timings["nltk"].extend(t)
+        _, t = timeit(nltk_with_download, passage)
+        timings["nltk_with_download"].extend(t)
+
+        num_sentences["segmenter"] += len(ours)
+        num_sentences["nltk"] += len(theirs)
+        identical += int(ours == theirs)
+
+    report = {name: summarize(t) for name, t in timings.items()}
+    report["docs_per_s"] = {name: round(len(passages) / sum(t), 1) for name, t in timings.items()}
+    report["num_sentences"] = num_sentences
+    report["identical_segmentations"] = f"{identical}/{len(passages)}"
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--num_docs", type=int, default=None, help="number of crawled documents to segment (default: all)")
+    args = parser.parse_args()
+    main(num_docs=args.num_docs)
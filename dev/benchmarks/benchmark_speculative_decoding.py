@@ -0,0 +1,63 @@
+"""
+Greedy decoding latency of the Generator's model with and without speculative decoding (a small draft model proposing
+tokens that the target model verifies), the acceptance rate of the drafted tokens and a check that the outputs are identical.
+
+The draft model must share the target model's tokenizer.
+
+Usage: python3 dev/benchmarks/benchmark_speculative_decoding.py --draft_model <draft model> --num_draft_tokens 4 --num_queries 50
+"""
+import argparse
+import json
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+from haystack.schema import Document
+
+from benchmark_utils import load_questions, timeit, summarize
+from benchmark_prefix_cache import PROMPT_MESSAGES
+
+from pipelines.generation import SpeculativeDecoder, render_prompt, encode_prompt
+
+
+def main(model_name: str, draft_model_name: str, num_draft_tokens: int, num_queries: int, max_new_tokens: int):
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype="auto", device_map="auto").eval()
+    draft_model = AutoModelForCausalLM.from_pretrained(draft_model_name, torch_dtype="auto").to(model.device).eval()
+    decoder = SpeculativeDecoder(model, draft_model, num_draft_tokens=num_draft_tokens, eos_token_id=tokenizer.eos_token_id)
+    prompt = tokenizer.apply_chat_template(PROMPT_MESSAGES, add_generation_prompt=True, tokenize=False)
+
+    def greedy(input_ids):
+        return model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), max_new_tokens=max_new_tokens, do_sample=False)[:, input_ids.shape[1]:]
+
+    timings = {"greedy": [], "speculative": []}
+    identical = 0
+    questions = load_questions(limit=num_queries)
+    with torch.inference_mode():
+        for question in questions:
+            text = render_prompt(prompt, question["question"], [Document(content=question["context"])])
+            input_ids = encode_prompt(tokenizer, text).to(model.device)
+
+            expected, t = timeit(greedy, input_ids)
+            timings["greedy"].extend(t)
+            output, t = timeit(decoder.generate, input_ids, max_new_tokens=max_new_tokens, do_sample=False)
+            timings["speculative"].extend(t)
+            identical += int(torch.equal(expected.cpu(), output))
+
+    report = {name: summarize(t) for name, t in timings.items()}
+    report["speedup"] = round(report["greedy"]["mean_ms"] / report["speculative"]["mean_ms"], 3)
+    report["speculative_decoding"] = decoder.summarize(decoder.stats)
+    report["identical_greedy_outputs"] = f"{identical}/{len(questions)}"
+    print(json.dumps(report, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, default="ilsp/Meltemi-7B-Instruct-v1", help="target causal LM")
+    parser.add_argument("--draft_model", type=str, required=True, help="small causal LM with the same tokenizer as the target model")
+    parser.add_argument("--num_draft_tokens", type=int, default=4, help="tokens proposed by the draft model per verification step")
+    parser.add_argument("--num_queries", type=int, default=50, help="number of evaluation questions to run")
+    parser.add_argument("--max_new_tokens", type=int, default=100, help="max_new_tokens of every generation")
+    args = parser.parse_args()
+    main(model_name=args.model, draft_model_name=args.draft_model, num_draft_tokens=args.num_draft_tokens,
+         num_queries=args.num_queries, max_new_tokens=args.max_new_tokens)
@@ -0,0 +1,81 @@
+"""
+Measure the throughput and peak memory of indexing a large .jsonl file, streamed in windows (index_jsonl_stream) or
+converted as a whole by the indexing pipeline (JsonConverter). The file is generated by repeating the crawled
+documents up to --num_lines lines. The documents are written to a scratch index, which is deleted afterwards.
+
+Peak RSS is a per-process high-water mark, so run every mode in its own process:
+
+Usage: python3 dev/benchmarks/benchmark_streaming_ingestion.py --mode stream --num_lines 1000000
+       python3 dev/benchmarks/benchmark_streaming_ingestion.py --mode full --num_lines 100000
+"""
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+
+from benchmark_utils import CRAWLED_DOCS_FILE
+
+from pipelines.indexing_pipeline import indexing_pipeline, index_jsonl_stream, near_duplicate_filter, DOCUMENT_STORE
+
+BENCHMARK_INDEX = "benchmark_streaming_ingestion"
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def write_corpus(path: str, num_lines: int):
+    """Repeat the lines of the crawled documents file until the corpus has `num_lines` lines"""
+
+    with open(CRAWLED_DOCS_FILE, "r", encoding="utf-8") as fp:
+        lines = [line if line.endswith("\n") else line + "\n" for line in fp if line.strip()]
+    with open(path, "w", encoding="utf-8") as fp:
+        for i in range(num_lines):
+            fp.write(lines[i % len(lines)])
+
+def main(mode: str, num_lines: int, window_size: int):
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus = os.path.join(tmp_dir, "corpus.jsonl")
+        write_corpus(corpus, num_lines)
+        size_mb = os.path.getsize(corpus) / 2**20
+
+        # The models are loaded on import: the baseline includes them
+        baseline_rss_mb = peak_rss_mb()
+        start = time.perf_counter()
+        if mode == "stream":
+            stats = index_jsonl_stream(corpus, window_size=window_size, index=BENCHMARK_INDEX)
+            num_documents = stats["documents"]
+        else:
+            params = {"DocumentStore": {"index": BENCHMARK_INDEX}}
+            if near_duplicate_filter is not None:
+                params["NearDuplicates"] = {"index": BENCHMARK_INDEX}
+            result = indexing_pipeline.run(file_paths=[corpus], params=params)
+            num_documents = len(result.get("documents", []))
+        elapsed = time.perf_counter() - start
+
+    DOCUMENT_STORE.delete_index(BENCHMARK_INDEX)
+
+    print(json.dumps({
+        "mode": mode,
+        "window_size": window_size if mode == "stream" else None,
+        "lines": num_lines,
+        "size_mb": round(size_mb, 1),
+        "documents": num_documents,
+        "seconds": round(elapsed, 1),
+        "lines_per_s": round(num_lines / elapsed, 1),
+        "documents_per_s": round(num_documents / elapsed, 1),
+        "baseline_rss_mb": round(baseline_rss_mb, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }, indent=4))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["stream", "full"], default="stream")
+    parser.add_argument("--num_lines", type=int, default=1000000)
+    parser.add_argument("--window_size", type=int, default=1000, help="lines per window of the stream mode")
+    args = parser.parse_args()
+    main(mode=args.mode, num_lines=args.num_lines, window_size=args.window_size)
@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import time
+import random
+from typing import List
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.abspath(os.path.join(SCRIPT_DIR, "..", ".."))
+SRC_DIR = os.path.join(REPO_DIR, "src")
+# Make the application modules (pipelines, utils, ...) importable from the benchmark scripts
+sys.path.append(SRC_DIR)
+
+CRAWLED_DOCS_FILE = os.path.join(SRC_DIR, "external_data", "crawled_docs.jsonl")
+EVAL_FILE = os.path.join(REPO_DIR, "dev", "data", "covid_QA_el_small", "dev_file_small.json")
+
+
+def load_passages(filename: str = CRAWLED_DOCS_FILE, limit: int = None) -> List[str]:
+    """Load the content of the documents of a .jsonl file"""
+
+    passages = []
+    with open(filename, "r", encoding="utf-8") as fp:
+        for line in fp:
+            passages.append(json.loads(line)["content"])
+            if limit is not None and len(passages) >= limit:
+                break
+    return passages
+
+def load_questions(filename: str = EVAL_FILE, limit: int = None, seed: int = 42) -> List[dict]:
+    """Load question/context/answers triples from a SQuAD format file"""
+
+    with open(filename, "r", encoding="utf-8") as fp:
+        data = json.load(fp)["data"]
+
+    questions = []
+    for article in data:
+        for paragraph in article["paragraphs"]:
+            for qa in paragraph["qas"]:
+                questions.append({
+                    "question": qa["question"],
+                    "context": paragraph["context"],
+                    "answers": [answer["text"] for answer in qa.get("answers", [])]
+                })
+    random.Random(seed).shuffle(questions)
+    return questions[:limit] if limit is not None else questions
+
+def timeit(fn, *args, repeat: int = 1, **kwargs):
+    """Run fn `repeat` times and return its last result and the list of wall clock timings in seconds"""
+
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return result, timings
+
+def summarize(timings: List[float]) -> dict:
+    """Mean, p50 and p95 of timings in milliseconds"""
+
+    timings_ms = np.asarray(timings) * 1000
+    return {
+        "mean_ms": round(float(np.mean(timings_ms)), 3),
+        "p50_ms": round(float(np.percentile(timings_ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(timings_ms, 95)), 3),
+    }
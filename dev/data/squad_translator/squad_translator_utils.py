@@ -4,13 +4,16 @@ import json
 import os
 import tempfile
 from sacremoses import MosesTokenizer, MosesDetokenizer
+import sys
 from collections import defaultdict
-from nltk import sent_tokenize
 from simalign import SentenceAligner
 from google_api import GoogleApi
 from tqdm import tqdm
 
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(SCRIPT_DIR, "..", "..", "..", "src"))
+
+from utils.sentence_segmentation import get_sentence_segmenter
 
 # PROCESSING TEXT
 tokenizer_en = MosesTokenizer(lang='en')
@@ -60,7 +63,7 @@ def split_sentences(text, lang, delimiter=SPLIT_DELIMITER, max_size=MAX_NUM_TOKE
 
 def tokenize_sentences(text, lang):
     sentences = [chunk
-                 for sentence in sent_tokenize(text, LANGUAGE_ISO_MAP[lang])
+                 for sentence in get_sentence_segmenter(LANGUAGE_ISO_MAP[lang]).split(text)
                  for chunk in split_sentences(sentence, lang)]
     return sentences
 
@@ -128,7 +131,7 @@ def remove_extra_text(source, translation, lang='el'):
 
     with open ("translated_answers.txt", "a", encoding="utf-8") as writer:
         writer.write (f"\nno trim:\t {translation}")
-        translation = sent_tokenize(translation, LANGUAGE_ISO_MAP[lang])[0]
+        translation = get_sentence_segmenter(LANGUAGE_ISO_MAP[lang]).split(translation)[0]
         if ', ' in translation and ', ' not in source:
              translation = translation.split(', ')
         for sentence in translation:
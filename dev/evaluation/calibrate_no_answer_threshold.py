@@ -0,0 +1,100 @@
+"""
+Pick the NoAnswerGate threshold of the extractive QA pipeline from evaluation data.
+
+Every evaluation question is run through Retriever -> Ranker -> Reader on an evaluation index. For each question
+the top ranker score and whether the Reader's best answer is correct are recorded. A threshold t skips the Reader for
+all questions whose top ranker score is below t; the chosen threshold is the highest one whose share of lost correct
+answers stays within --max_answer_loss.
+
+Usage: python3 calibrate_no_answer_threshold.py --evaluate npho_20 --max_answer_loss 0.02
+"""
+from typing import List, Dict
+import os
+import sys
+import json
+import argparse
+
+import requests
+from tqdm import tqdm
+from haystack import Pipeline
+from haystack.document_stores import ElasticsearchDocumentStore
+from haystack.nodes import FARMReader, SentenceTransformersRanker
+
+from main import index_eval_labels
+from utils import load_and_save_npho_datasets, load_and_save_xquad_dataset
+from qa_metrics import answer_f1
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src"))
+from pipelines.cached_embedding_retriever import CachedEmbeddingRetriever
+from pipelines.no_answer_gate import pick_threshold
+
+RETRIEVER_MODEL = "panosgriz/covid_el_paraphrase-multilingual-MiniLM-L12-v2"
+RANKER_MODEL = "amberoad/bert-multilingual-passage-reranking-msmarco"
+READER_MODEL = "panosgriz/mdeberta-v3-base-squad2-covid-el_small"
+
+
+def collect_scores(eval_filename: str, top_k: int = 10, min_f1: float = 0.5) -> List[Dict]:
+    """Run the extractive QA pipeline on the evaluation questions and collect (top ranker score, correct) pairs"""
+
+    requests.delete("http://localhost:9200/eval_docs")
+    document_store = ElasticsearchDocumentStore(embedding_dim=384, index="eval_docs", label_index="label_index")
+    index_eval_labels(document_store, eval_filename)
+
+    retriever = CachedEmbeddingRetriever(embedding_model=RETRIEVER_MODEL, document_store=document_store, max_seq_len=128)
+    document_store.update_embeddings(retriever=retriever, index="eval_docs")
+    ranker = SentenceTransformersRanker(model_name_or_path=RANKER_MODEL, scale_score=True)
+    reader = FARMReader(model_name_or_path=READER_MODEL, use_confidence_scores=True, top_k=1)
+
+    p = Pipeline()
+    p.add_node(retriever, name="Retriever", inputs=["Query"])
+    p.add_node(ranker, name="Ranker", inputs=["Retriever"])
+
+    labels = document_store.get_all_labels_aggregated(index="label_index", drop_negative_labels=True, drop_no_answers=True)
+    samples = []
+    for label in tqdm(labels, desc="Collecting ranker scores"):
+        result = p.run(query=label.query, params={"Retriever": {"top_k": top_k, "index": "eval_docs"}, "Ranker": {"top_k": top_k}})
+        documents = result["documents"]
+        top_score = max((doc.score for doc in documents), default=0.0)
+        answers = reader.predict(query=label.query, documents=documents, top_k=1)["answers"] if documents else []
+        prediction = answers[0].answer if answers else ""
+        samples.append({
+            "query": label.query,
+            "top_ranker_score": top_score,
+            "correct": bool(prediction) and answer_f1(prediction, label.answers) >= min_f1
+        })
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the no-answer threshold on ranker scores")
+    parser.add_argument("--evaluate", choices=['xquad', 'npho_10', 'npho_20', 'other'], required=True,
+                        help="Choose the dataset to calibrate on")
+    parser.add_argument("--file_path", type=str, help="File path for 'other' dataset")
+    parser.add_argument("--max_answer_loss", type=float, default=0.02, help="maximum share of correct answers that may be skipped")
+    parser.add_argument("--top_k", type=int, default=10, help="number of retrieved and ranked documents")
+    args = parser.parse_args()
+
+    if args.evaluate == "xquad":
+        load_and_save_xquad_dataset()
+        eval_filename = "datasets/xquad-el.json"
+    elif args.evaluate == "other":
+        if not args.file_path or not os.path.isfile(args.file_path):
+            parser.error("Please provide an existing --file_path for 'other' dataset calibration.")
+        eval_filename = args.file_path
+    else:
+        load_and_save_npho_datasets()
+        eval_filename = f"datasets/npho-covid-SQuAD-el_{args.evaluate.split('_')[1]}.json"
+
+    samples = collect_scores(eval_filename, top_k=args.top_k)
+    report = pick_threshold(samples, max_answer_loss=args.max_answer_loss)
+    print(f"Chosen threshold: {report['chosen']['threshold']:.4f} "
+          f"(skips {report['chosen']['skipped']:.1%} of queries, loses {report['chosen']['answer_loss']:.1%} of correct answers)")
+    print(f"Set NO_ANSWER_THRESHOLD={report['chosen']['threshold']:.4f} in the haystack service environment")
+
+    with open(f"reports/no_answer_threshold_{os.path.basename(eval_filename).split('.')[0]}.json", "w") as fp:
+        json.dump(report, fp, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    os.makedirs("datasets", exist_ok=True)
+    os.makedirs("reports", exist_ok=True)
+    main()
@@ -1,12 +1,17 @@
 import json
 import os
+import sys
 import argparse
 import requests
-from haystack.nodes import FARMReader, BM25Retriever, EmbeddingRetriever, DensePassageRetriever, SentenceTransformersRanker
+from haystack.nodes import FARMReader, BM25Retriever, DensePassageRetriever, SentenceTransformersRanker
 from haystack.document_stores import ElasticsearchDocumentStore
 from main import evaluate_reader, evaluate_retriever_ranker_pipeline, fetch_eval_dataset
 from utils import load_and_save_npho_datasets, load_and_save_xquad_dataset
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src"))
+# Serves the passage embeddings of earlier runs from the persistent embedding cache
+from pipelines.cached_embedding_retriever import CachedEmbeddingRetriever
+
 def evaluate_on_xquad(eval_type):
     load_and_save_xquad_dataset()
     if eval_type == "reader":
@@ -69,7 +74,7 @@ def run_retriever_evaluation(eval_filename):
                 "label_index": "label_index",
                 "index": "eval_docs"
             },
-            "retriever_class": EmbeddingRetriever,
+            "retriever_class": CachedEmbeddingRetriever,
             "retriever_args": {
                 "embedding_model": "/home/pgriziotis/thesis/qa-subsystem/dev/retriever/adapted_retriever"
             }
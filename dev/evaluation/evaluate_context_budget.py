@@ -0,0 +1,98 @@
+"""
+Latency vs answer quality trade-off of the RAG prompt context (ContextBuilder token budget and sentence compression)
+on the Greek COVID QA evaluation set.
+
+The evaluation documents are indexed in an `eval_docs` index. Every question is retrieved and ranked once; then, for
+every context configuration, the ContextBuilder and the Generator are run on the ranked documents and the generation
+latency, the prompt context size and the answer quality (token F1 and bi-encoder semantic similarity against the
+gold answers) are recorded.
+
+Usage: python3 evaluate_context_budget.py --eval_filename ../data/covid_QA_el/dev_file.json --num_questions 100
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import requests
+from tqdm import tqdm
+from haystack import Pipeline
+from haystack.document_stores import ElasticsearchDocumentStore
+
+from main import index_eval_labels
+from qa_metrics import answer_f1
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Before this directory, so that `utils` is the src package and not dev/evaluation/utils.py
+sys.path.insert(0, os.path.join(SCRIPT_DIR, "..", "..", "src"))
+
+from pipelines.rag_pipeline import ranker, generator, context_builder
+from pipelines.cached_embedding_retriever import CachedEmbeddingRetriever
+
+EMBEDDING_MODEL = "panosgriz/covid_el_paraphrase-multilingual-MiniLM-L12-v2"
+# (token_budget, min_sentence_similarity); (None, None) is the full ranked context as before the ContextBuilder
+CONTEXT_CONFIGS = [(None, None), (2048, None), (1024, None), (512, None), (256, None), (1024, 0.3), (512, 0.3), (512, 0.5)]
+
+
+def semantic_similarity(answer: str, gold_answers: list) -> float:
+    if not answer or not gold_answers:
+        return 0.0
+    embeddings = context_builder.embedding_model.encode([answer] + gold_answers)
+    return float(context_builder.embedding_model.similarity(embeddings[:1], embeddings[1:]).max())
+
+def main(eval_filename: str, num_questions: int, top_k: int, max_new_tokens: int):
+
+    requests.delete("http://localhost:9200/eval_docs")
+    document_store = ElasticsearchDocumentStore(embedding_dim=384, index="eval_docs", label_index="label_index")
+    index_eval_labels(document_store, eval_filename)
+    retriever = CachedEmbeddingRetriever(embedding_model=EMBEDDING_MODEL, document_store=document_store, max_seq_len=128)
+    document_store.update_embeddings(retriever=retriever, index="eval_docs")
+
+    p = Pipeline()
+    p.add_node(retriever, name="Retriever", inputs=["Query"])
+    p.add_node(ranker, name="Ranker", inputs=["Retriever"])
+
+    labels = document_store.get_all_labels_aggregated(index="label_index", drop_negative_labels=True, drop_no_answers=True)[:num_questions]
+    ranked = [(label, p.run(query=label.query, params={"Retriever": {"top_k": top_k, "index": "eval_docs"}, "Ranker": {"top_k": top_k}})["documents"]) for label in tqdm(labels, desc="Retrieving")]
+
+    reports = {}
+    for token_budget, min_sentence_similarity in CONTEXT_CONFIGS:
+        latencies, context_tokens, f1_scores, sas_scores = [], [], [], []
+        for label, documents in tqdm(ranked, desc=f"budget={token_budget}, min_similarity={min_sentence_similarity}"):
+            start = time.perf_counter()
+            if token_budget is None and min_sentence_similarity is None:
+                context = documents
+            else:
+                context = context_builder.run(query=label.query, documents=documents, token_budget=token_budget, min_sentence_similarity=min_sentence_similarity)[0]["documents"]
+            result, _ = generator.run(query=label.query, documents=context, max_new_tokens=max_new_tokens)
+            latencies.append(time.perf_counter() - start)
+
+            answer = result["answers"][0].answer if result["answers"] else ""
+            context_tokens.append(sum(context_builder.count_tokens(doc.content) for doc in context))
+            f1_scores.append(answer_f1(answer, label.answers))
+            sas_scores.append(semantic_similarity(answer, label.answers))
+
+        reports[f"budget={token_budget}_min_similarity={min_sentence_similarity}"] = {
+            "mean_latency_s": float(np.mean(latencies)),
+            "p95_latency_s": float(np.percentile(latencies, 95)),
+            "mean_context_tokens": float(np.mean(context_tokens)),
+            "f1": float(np.mean(f1_scores)),
+            "sas": float(np.mean(sas_scores)),
+        }
+        print(json.dumps(reports, indent=4))
+
+    with open(f"reports/context_budget_{os.path.basename(eval_filename).split('.')[0]}.json", "w") as fp:
+        json.dump(reports, fp, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--eval_filename", type=str, default=os.path.join(SCRIPT_DIR, "..", "data", "covid_QA_el", "dev_file.json"), help="SQuAD format evaluation file")
+    parser.add_argument("--num_questions", type=int, default=100, help="number of evaluation questions")
+    parser.add_argument("--top_k", type=int, default=10, help="number of retrieved and ranked documents")
+    parser.add_argument("--max_new_tokens", type=int, default=100, help="max_new_tokens of the Generator")
+    args = parser.parse_args()
+    os.makedirs("reports", exist_ok=True)
+    main(eval_filename=args.eval_filename, num_questions=args.num_questions, top_k=args.top_k, max_new_tokens=args.max_new_tokens)
@@ -0,0 +1,24 @@
+import re
+from typing import List
+from collections import Counter
+
+
+def normalize_answer(text: str) -> List[str]:
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return text.split()
+
+def answer_f1(prediction: str, gold_answers: List[str]) -> float:
+    """Best token level F1 of the prediction against the gold answers (SQuAD style)"""
+
+    best_f1 = 0.0
+    pred_tokens = normalize_answer(prediction)
+    for gold in gold_answers:
+        gold_tokens = normalize_answer(gold)
+        common = Counter(pred_tokens) & Counter(gold_tokens)
+        num_same = sum(common.values())
+        if num_same == 0:
+            continue
+        precision = num_same / len(pred_tokens)
+        recall = num_same / len(gold_tokens)
+        best_f1 = max(best_f1, 2 * precision * recall / (precision + recall))
+    return best_f1
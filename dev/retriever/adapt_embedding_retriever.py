@@ -1,16 +1,19 @@
 import json
+import sys
 import random
 from tqdm.auto import tqdm
 from transformers import AutoTokenizer
 from sentence_transformers import SentenceTransformer
 from haystack.document_stores.elasticsearch import ElasticsearchDocumentStore
-from haystack.nodes.retriever import EmbeddingRetriever
 from haystack.nodes.retriever.sparse import BM25Retriever 
 from haystack.nodes.label_generator import PseudoLabelGenerator
 from haystack.nodes import PreProcessor
 from get_gpl_data import GPL_data
 import os 
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src"))
+from pipelines.cached_embedding_retriever import CachedEmbeddingRetriever
+
 os.environ['TOKENIZERS_PARALLELISM'] = 'true'
 
 # Define constants
@@ -57,7 +60,8 @@ with open(TRAINING_DATA_FILE, "w") as fp:
     fp.write(str(output["gpl_labels"]))
 
 # Initialize and train embedding retriever
-retriever = EmbeddingRetriever(
+# The embeddings of the base model are cached across runs; the cache is disabled once the model is trained
+retriever = CachedEmbeddingRetriever(
     document_store=document_store,
     embedding_model=BI_ENCODER,
     model_format="sentence_transformers",
@@ -8,6 +8,8 @@ from haystack.utils import launch_es
 DOCUMENTSTORE_PARAMS_HOST = os.environ["DOCUMENTSTORE_PARAMS_HOST"] if "DOCUMENTSTORE_PARAMS_HOST" in os.environ else "localhost"
 DOCUMENTSTORE_PARAMS_PORT = int(
     os.environ['DOCUMENTSTORE_PARAMS_PORT']) if "DOCUMENTSTORE_PARAMS_PORT" in os.environ else 9200
+# Alias of the live versioned index (see document_store/reindex.py), or the name of a plain index
+DOCUMENT_INDEX = os.environ["DOCUMENT_INDEX"] if "DOCUMENT_INDEX" in os.environ else "document"
 
 def check_elasticsearch():
     """Check if Elasticsearch is up and running."""
@@ -21,14 +23,14 @@ def check_elasticsearch():
     except requests.exceptions.RequestException:
         return False
 
-def initialize_document_store():
-    """Initialize a Elasticsearch document store object."""
+def initialize_document_store(index: str = DOCUMENT_INDEX):
+    """Initialize a Elasticsearch document store object. Reading and writing through an alias reach the index it points to."""
     return ElasticsearchDocumentStore(
         host=DOCUMENTSTORE_PARAMS_HOST,
         port=DOCUMENTSTORE_PARAMS_PORT,
         username="",
         password="",
-        index="document",
+        index=index,
         embedding_dim=384,
         duplicate_documents="overwrite"
     )
@@ -0,0 +1,156 @@
+"""
+Blue/green reindexing: build the document index from the source files into a new versioned index while the live
+index keeps serving queries, validate it, switch the alias that the application reads (DOCUMENT_INDEX) to it in one
+atomic request and delete the previous versions.
+
+The first run migrates a plain `document` index: the alias replaces it in the same atomic request.
+
+Passages written to the alias while the new index is built would be lost at the switch, so the /file-upload endpoint
+rejects uploads while a version newer than the live one exists (reindex_in_progress). Do not run
+ingest_data_to_doc_store.py during a reindex. A reindex that was killed leaves its index behind and keeps uploads
+blocked until that index is deleted.
+
+Usage: python3 src/document_store/reindex.py [--files src/external_data/*.jsonl] [--keep_previous 1]
+"""
+from typing import Dict, List, Optional
+import argparse
+import glob
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from document_store.initialize_document_store import initialize_document_store, DOCUMENT_INDEX
+from pipelines.indexing_pipeline import indexing_pipeline, index_jsonl_stream, retriever, near_duplicate_filter, INCREMENTAL_INDEXING, STREAMING_WINDOW_SIZE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOURCES = sorted(glob.glob(os.path.join(os.path.dirname(SCRIPT_DIR), "external_data", "*.jsonl")))
+SMOKE_QUERY = "Πώς μεταδίδεται ο κορωνοϊός;"
+
+
+class ReindexError(Exception):
+    pass
+
+
+def get_alias_indices(client, alias: str) -> List[str]:
+    """The indices the alias points to"""
+    if not client.indices.exists_alias(name=alias):
+        return []
+    return list(client.indices.get_alias(name=alias).keys())
+
+def build_index(index: str, file_paths: List[str]) -> int:
+    """Index the files into `index` with the indexing pipeline. Returns the number of written passages."""
+
+    written = 0
+    streamed = [p for p in file_paths if STREAMING_WINDOW_SIZE > 0 and Path(p).suffix.lower() == ".jsonl"]
+    for path in streamed:
+        written += index_jsonl_stream(path, meta={"source": Path(path).name}, index=index)["documents"]
+
+    others = [p for p in file_paths if p not in streamed]
+    if others:
+        params = {"DocumentStore": {"index": index}}
+        if INCREMENTAL_INDEXING:
+            params["ChangedPassages"] = {"index": index}
+        if near_duplicate_filter is not None:
+            params["NearDuplicates"] = {"index": index}
+        result = indexing_pipeline.run(file_paths=others, meta=[{"source": Path(p).name} for p in others], params=params)
+        written += len(result.get("documents", []))
+    return written
+
+def validate_index(document_store, index: str, written: int, live_count: Optional[int], min_count_ratio: float, smoke_query: str):
+    """Raise a ReindexError if the new index is not fit to serve queries"""
+
+    count = document_store.get_document_count(index=index)
+    if count == 0:
+        raise ReindexError(f"The new index {index} is empty")
+    # Incremental indexing writes every distinct passage once, so the index holds exactly the written passages
+    if INCREMENTAL_INDEXING and count != written:
+        raise ReindexError(f"The new index {index} holds {count} passages, {written} were written")
+    if live_count and count < min_count_ratio * live_count:
+        raise ReindexError(f"The new index {index} holds {count} passages, less than {min_count_ratio:.0%} of the {live_count} live ones")
+
+    documents = retriever.retrieve(query=smoke_query, index=index, top_k=1)
+    if not documents:
+        raise ReindexError(f"The smoke query '{smoke_query}' retrieved nothing from the new index {index}")
+    logger.info(f"Validated {index}: {count} passages, smoke query retrieved '{documents[0].content[:80]}...'")
+
+def switch_alias(client, alias: str, index: str):
+    """Point the alias to the index, and only to it, in one atomic request"""
+
+    actions = [{"remove": {"index": old, "alias": alias}} for old in get_alias_indices(client, alias)]
+    actions.append({"add": {"index": index, "alias": alias}})
+    if client.indices.exists(index=alias) and not client.indices.exists_alias(name=alias):
+        # A plain index of the alias name (before the first reindex) is deleted as the alias takes its place
+        actions.append({"remove_index": {"index": alias}})
+    client.indices.update_aliases(body={"actions": actions})
+    logger.info(f"Alias {alias} now points to {index}")
+
+def get_versions(client, alias: str) -> List[str]:
+    """The versioned indices of the alias, oldest first; the timestamp suffix sorts them by creation time"""
+    return sorted(client.indices.get(index=f"{alias}_v*"))
+
+def reindex_in_progress(client, alias: str = DOCUMENT_INDEX) -> Optional[str]:
+    """The version being built: a versioned index newer than the one the alias points to, if any"""
+
+    live = get_alias_indices(client, alias)
+    newer = [name for name in get_versions(client, alias) if not live or name > max(live)]
+    return newer[-1] if newer else None
+
+def collect_garbage(client, alias: str, new_index: str, keep_previous: int) -> List[str]:
+    """
+    Delete the versioned indices older than `new_index` that the alias does not point to, except the `keep_previous`
+    newest. Newer versions belong to a reindex that is still running and are kept.
+    """
+    live = set(get_alias_indices(client, alias))
+    versions = sorted((name for name in get_versions(client, alias) if name < new_index and name not in live), reverse=True)
+    deleted = versions[keep_previous:]
+    for name in deleted:
+        client.indices.delete(index=name)
+        logger.info(f"Deleted old index {name}")
+    return deleted
+
+def reindex(file_paths: List[str], alias: str = DOCUMENT_INDEX, min_count_ratio: float = 0.9, smoke_query: str = SMOKE_QUERY,
+            keep_previous: int = 0) -> Dict:
+
+    new_index = f"{alias}_v{time.strftime('%Y%m%d%H%M%S')}"
+    # Creates the new index with the document store's mapping
+    document_store = initialize_document_store(index=new_index)
+    client = document_store.client
+
+    live_count = document_store.get_document_count(index=alias) if client.indices.exists(index=alias) else None
+    replicas = client.indices.get_settings(index=new_index)[new_index]["settings"]["index"].get("number_of_replicas", "1")
+    # No replicas while loading. Refreshes stay on: the document store writes with refresh "wait_for", and the lookups
+    # of the incremental and near-duplicate filters only see refreshed passages.
+    client.indices.put_settings(index=new_index, body={"index": {"number_of_replicas": 0}})
+
+    start = time.perf_counter()
+    try:
+        written = build_index(new_index, file_paths)
+        client.indices.put_settings(index=new_index, body={"index": {"number_of_replicas": replicas}})
+        client.indices.refresh(index=new_index)
+        validate_index(document_store, new_index, written, live_count, min_count_ratio, smoke_query)
+    except Exception:
+        logger.error(f"Reindexing failed, deleting {new_index}. The alias {alias} is unchanged.")
+        client.indices.delete(index=new_index)
+        raise
+
+    switch_alias(client, alias, new_index)
+    deleted = collect_garbage(client, alias, new_index, keep_previous)
+    return {"index": new_index, "passages": written, "seconds": round(time.perf_counter() - start, 1), "deleted": deleted}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the document index into a new versioned index and switch the alias to it")
+    parser.add_argument("--files", nargs="+", default=DEFAULT_SOURCES, help="source files to index (default: src/external_data/*.jsonl)")
+    parser.add_argument("--alias", default=DOCUMENT_INDEX, help="alias that the application reads")
+    parser.add_argument("--min_count_ratio", type=float, default=0.9, help="minimum passage count of the new index relative to the live one")
+    parser.add_argument("--smoke_query", default=SMOKE_QUERY)
+    parser.add_argument("--keep_previous", type=int, default=0, help="number of previous versions to keep for rollback")
+    args = parser.parse_args()
+    logger.info(reindex(args.files, alias=args.alias, min_count_ratio=args.min_count_ratio, smoke_query=args.smoke_query, keep_previous=args.keep_previous))
@@ -1,25 +1,199 @@
+"""
+Index the data files into the document store with the indexing pipeline of the application, without going through
+the HTTP upload endpoint.
+
+The files are cut into conversion tasks (windows of --window_size lines of .jsonl files, page ranges of pdf files),
+which are converted and split into passages in a pool of processes while the passages of the finished tasks are
+embedded and bulk written in order. After every written task the file offset is saved to a checkpoint file, so that
+an interrupted run resumes where it stopped. A throughput summary, with the share of new passages skipped as
+near-duplicates, is printed at the end.
+
+Run it where the application runs, e.g.: docker compose exec haystack python3 external_data/ingest_data_to_doc_store.py
+"""
+from typing import Dict, List
+from collections import deque
+import argparse
 import glob
-import requests
+import json
 import logging
 import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from tqdm import tqdm
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from pipelines.answer_cache import AnswerCache, DEFAULT_ANSWER_CACHE_PATH
+from utils.parallel_file_converter import ParallelFileConverter
 
 logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(os.path.dirname(SCRIPT_DIR), "cache", "ingest_checkpoint.json")
+# Unlike the upload endpoint (INDEXING_NUM_WORKERS), the script converts in one process per CPU by default
+DEFAULT_NUM_WORKERS = os.cpu_count() or 1
+
+
+def load_checkpoint(path: str) -> Dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as fp:
+        return json.load(fp)
+
+def save_checkpoint(path: str, checkpoint: Dict[str, dict]):
+    # Write and rename, so that an interruption never leaves a partial checkpoint
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as fp:
+        json.dump(checkpoint, fp, indent=2)
+    os.replace(path + ".tmp", path)
+
+def file_version(path: str) -> dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+class BulkIngestion:
+    """Streams files through parallel conversion and in-order embedding and writing, with per file checkpoints"""
+
+    def __init__(self, checkpoint_path: str, window_size: int = 1000, num_workers: int = DEFAULT_NUM_WORKERS, max_pending: int = None):
+        """
+        :param window_size: Number of .jsonl lines per conversion task.
+        :param max_pending: Maximum number of submitted conversion tasks. Bounds the memory of converted passages waiting to be embedded.
+        """
+        # Imported here and not at module level: the spawned conversion processes re-import this script, and must not
+        # load the models and the document store client of the indexing pipeline
+        from pipelines.indexing_pipeline import preprocessor, passage_indexing_pipeline, changed_passages_filter, INCREMENTAL_INDEXING
+
+        self.passage_indexing_pipeline = passage_indexing_pipeline
+        self.changed_passages_filter = changed_passages_filter
+        self.incremental_indexing = INCREMENTAL_INDEXING
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint = load_checkpoint(checkpoint_path)
+        self.converter = ParallelFileConverter(preprocessor=preprocessor, num_workers=num_workers, lines_per_task=window_size)
+        self.max_pending = max_pending or 2 * self.converter.num_workers
+        self.stats = {"files": 0, "skipped_files": 0, "passages": 0, "unchanged": 0, "near_duplicates": 0, "removed": 0}
+        self.answer_cache = AnswerCache(os.getenv("ANSWER_CACHE_PATH", DEFAULT_ANSWER_CACHE_PATH)) if os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1") != "0" else None
+
+    def plan(self, file_paths: List[str]) -> list:
+        """(file, task) pairs still to index, after the checkpointed offset of every file"""
 
-HAYSTACK_SERVICE_HOST = os.environ["HAYSTACK_SERVICE_HOST"] if "HAYSTACK_SERVICE_HOST" in os.environ else "localhost"
-HAYSTACK_SERVICE_PORT = int(
-    os.environ['HAYSTACK_SERVICE_PORT']) if "HAYSTACK_SERVICE_PORT" in os.environ else 8000
+        planned = []
+        for path in file_paths:
+            key = os.path.abspath(path)
+            state = self.checkpoint.get(key)
+            if state is not None and {k: state.get(k) for k in ("size", "mtime_ns")} != file_version(path):
+                logger.info(f"{path} changed since its checkpoint, indexing it from the start")
+                state = None
+            if state is not None and state["done"]:
+                self.stats["skipped_files"] += 1
+                continue
 
+            offset = state["offset"] if state is not None else None
+            tasks = self.converter.plan_tasks([path], meta={"source": Path(path).name})
+            if offset is not None:
+                tasks = [task for task in tasks if task.end is not None and task.end > offset]
+            # A resumed file keeps the indexing run of the passages written before the interruption
+            run_id = state.get("run_id") if offset is not None else uuid.uuid4().hex
+            self.checkpoint[key] = {**file_version(path), "offset": offset, "done": not tasks, "run_id": run_id,
+                                    "remaining": len(tasks)}
+            planned.extend((key, task) for task in tasks)
+        save_checkpoint(self.checkpoint_path, self.checkpoint)
+        return planned
 
-def ingest_data():
+    def run(self, file_paths: List[str]) -> dict:
+
+        planned = self.plan(file_paths)
+        total_bytes = sum(os.path.getsize(path) for path in file_paths if not self.checkpoint.get(os.path.abspath(path), {}).get("done", True))
+
+        start = time.perf_counter()
+        pending = deque()
+        tasks = iter(planned)
+        with tqdm(total=len(planned), unit="task", desc="Indexing") as progress:
+            while True:
+                while len(pending) < self.max_pending:
+                    item = next(tasks, None)
+                    if item is None:
+                        break
+                    pending.append((item[0], item[1], self.converter.submit(item[1])))
+                if not pending:
+                    break
+
+                key, task, future = pending.popleft()
+                # The passages of a file are stored under its run id, to remove the ones a re-ingested file dropped
+                params = {"ChangedPassages": {"remove_dropped": False, "run_id": self.checkpoint[key]["run_id"]}} if self.incremental_indexing else None
+                result = self.passage_indexing_pipeline.run(documents=future.result(), params=params)
+                self._on_task_done(key, task, result)
+
+                progress.update(1)
+                progress.set_postfix(passages=self.stats["passages"], passages_per_s=round(self.stats["passages"] / (time.perf_counter() - start), 1))
+
+        elapsed = time.perf_counter() - start
+        new_passages = self.stats["passages"] + self.stats["near_duplicates"]
+        summary = {
+            **self.stats,
+            # Share of the new passages that near-duplicate detection kept out of the index
+            "index_shrinkage": round(self.stats["near_duplicates"] / new_passages, 4) if new_passages else 0.0,
+            "seconds": round(elapsed, 1),
+            "mb_per_s": round(total_bytes / 2**20 / elapsed, 2) if elapsed else None,
+            "passages_per_s": round(self.stats["passages"] / elapsed, 1) if elapsed else None,
+        }
+        return summary
+
+    def _on_task_done(self, key: str, task, result: dict):
+
+        written_ids = [doc.id for doc in result.get("documents", [])]
+        self.stats["passages"] += len(written_ids)
+        self.stats["unchanged"] += result.get("unchanged_passages", 0)
+        self.stats["near_duplicates"] += result.get("near_duplicates", 0)
+        # Stored copies of the passages indexed before incremental indexing
+        self.stats["removed"] += len(result.get("removed_ids", []))
+        self._invalidate_cached_answers(written_ids + result.get("removed_ids", []))
+
+        state = self.checkpoint[key]
+        state["offset"] = task.end
+        state["remaining"] -= 1
+        if state["remaining"] == 0:
+            self._on_file_done(key, state)
+        save_checkpoint(self.checkpoint_path, self.checkpoint)
+
+    def _on_file_done(self, key: str, state: dict):
+
+        if self.incremental_indexing:
+            # Checkpoints written before run ids do not know the run of the passages written before the interruption
+            if state["run_id"] is None:
+                logger.info(f"{key} was resumed from a checkpoint without a run id, its dropped passages are not removed")
+            else:
+                removed_ids = self.changed_passages_filter.remove_stale_documents(Path(key).name, state["run_id"])
+                self.stats["removed"] += len(removed_ids)
+                self._invalidate_cached_answers(removed_ids)
+        state["done"] = True
+        self.stats["files"] += 1
+
+    def _invalidate_cached_answers(self, document_ids: List[str]):
+        if self.answer_cache is not None and document_ids:
+            self.answer_cache.invalidate_documents(document_ids)
+
+
+def ingest_data(file_paths: List[str], checkpoint_path: str = DEFAULT_CHECKPOINT_PATH, window_size: int = 1000,
+                num_workers: int = DEFAULT_NUM_WORKERS, restart: bool = False) -> dict:
+    """
+    Index the files into the document store. Returns the throughput summary.
     """
-    Call the file-upload endpoint with all the files in the index data folder.
-    """ 
-    
-    dir = os.path.dirname(os.path.abspath(__file__))
-    for file in glob.glob(f"{dir}/*.jsonl"):
-        logging.info(f"Indexing content in {file} to document store")
-        with open(file, "rb") as f:
-            requests.post(url=f"http://{HAYSTACK_SERVICE_HOST}:{HAYSTACK_SERVICE_PORT}/file-upload", files={"files": f})   
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return BulkIngestion(checkpoint_path, window_size=window_size, num_workers=num_workers).run(file_paths)
 
 if __name__ == "__main__":
-    ingest_data()
+    parser = argparse.ArgumentParser(description="Index data files into the document store")
+    parser.add_argument("--files", nargs="+", default=sorted(glob.glob(os.path.join(SCRIPT_DIR, "*.jsonl"))), help="files to index (default: the .jsonl files of this folder)")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH, help="file of the per file offsets of the indexed data")
+    parser.add_argument("--window_size", type=int, default=1000, help="number of .jsonl lines per conversion task")
+    parser.add_argument("--num_workers", type=int, default=DEFAULT_NUM_WORKERS, help="number of conversion processes (default: the number of CPUs)")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and index all files from the start")
+    args = parser.parse_args()
+    summary = ingest_data(args.files, checkpoint_path=args.checkpoint, window_size=args.window_size, num_workers=args.num_workers, restart=args.restart)
+    print(json.dumps(summary, indent=4))
@@ -7,10 +7,15 @@ import tempfile
 import argparse
 import json
 import os
+import sys
 from pathlib import Path
 
+# Add the src directory to the Python path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')))
+
 from haystack.pipelines import Pipeline
-from haystack.nodes import PreProcessor, JsonConverter
+from haystack.nodes import JsonConverter
+from pipelines.preprocessor import SentencePreProcessor
 
 from clean_wiki import preprocess_wiki_docs
 from keyword_filtering import KeywordFilterer
@@ -41,7 +46,7 @@ def preporocess_wiki_files (file_paths):
     
     global FILTERING
 
-    preprocessor = PreProcessor(
+    preprocessor = SentencePreProcessor(
         clean_empty_lines=True,
         split_by = "word",
         split_length=256,
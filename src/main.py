@@ -4,6 +4,7 @@ from fastapi import FastAPI, UploadFile, File, HTTPException
 from pathlib import Path
 import os
 import uuid
+import shutil
 import logging
 from numpy import ndarray
 
@@ -12,9 +13,13 @@ import time
 
 from schema import QueryRequest, QueryResponse
 
-from pipelines.rag_pipeline import rag_pipeline
+from pipelines.rag_pipeline import rag_pipeline, answer_cache
 from pipelines.extractive_qa_pipeline import extractive_qa_pipeline
-from pipelines.indexing_pipeline import indexing_pipeline
+from pipelines.indexing_pipeline import indexing_pipeline, index_jsonl_stream, STREAMING_WINDOW_SIZE
+from pipelines.cascade_pipeline import cascade_pipeline
+from pipelines.query_pipeline import query_pipeline
+from document_store.initialize_document_store import document_store
+from document_store.reindex import reindex_in_progress
 
 from utils.metrics import add_relevancy_scores_to_results
 
@@ -33,7 +38,8 @@ def check_status():
 @app.post("/file-upload")
 def upload_files(
     files: List[UploadFile] = File(...),
-    keep_files: Optional[bool] = False
+    keep_files: Optional[bool] = False,
+    stream_jsonl: Optional[bool] = False
     ):
     """
     You can use this endpoint to upload a file for indexing
@@ -43,18 +49,42 @@ def upload_files(
 
     Pass the `keep_files=true` parameter if you want to keep files in the file_upload folder after being indexed
     Pass the `recreate_index=true` parameter if you want to delete all indexed data and create document store index from scratch.
+
+    Pass the `stream_jsonl=true` parameter to index .jsonl files in windows of STREAMING_WINDOW_SIZE lines, so that
+    memory does not grow with their size. Their lines, passages and windows are then reported in `streamed_files`
+    instead of returning their documents.
+
+    Uploads are rejected with 409 while src/document_store/reindex.py builds a new index, since the switch to it would
+    drop them.
     """
 
+    building_index = reindex_in_progress(document_store.client)
+    if building_index:
+        raise HTTPException(status_code=409, detail=f"The index is being rebuilt into {building_index}. Retry the upload once the reindex has finished.")
+
     file_paths = []
     
     for file_to_upload in files:
         file_path = Path(FILE_UPLOAD_PATH) / f"{uuid.uuid4().hex}_{file_to_upload.filename}"
         with file_path.open("wb") as fo:
-            fo.write(file_to_upload.file.read())
+            shutil.copyfileobj(file_to_upload.file, fo)
         file_paths.append(file_path)
         file_to_upload.file.close()
-        
-    result = indexing_pipeline.run(file_paths=file_paths)
+
+    def invalidate_cached_answers(document_ids):
+        # Drop the cached answers generated from overwritten or removed documents
+        if answer_cache is not None:
+            answer_cache.invalidate_documents(document_ids)
+
+    # The passages of a file are tracked by its original name, so that re-uploading it only indexes what changed
+    sources = {p: {"source": p.name.split("_", 1)[1]} for p in file_paths}
+    streamed_paths = [p for p in file_paths if stream_jsonl and STREAMING_WINDOW_SIZE > 0 and p.suffix.lower() == ".jsonl"]
+    other_paths = [p for p in file_paths if p not in streamed_paths]
+
+    result = indexing_pipeline.run(file_paths=other_paths, meta=[sources[p] for p in other_paths]) if other_paths else {"documents": []}
+    invalidate_cached_answers([document.id for document in result.get('documents', [])] + result.get('removed_ids', []))
+    if stream_jsonl:
+        result["streamed_files"] = [index_jsonl_stream(p, meta=sources[p], on_change=invalidate_cached_answers) for p in streamed_paths]
 
     for document in result.get('documents', []):
         if isinstance(document.embedding, ndarray):
@@ -109,3 +139,45 @@ def ask_rag_pipeline(request: QueryRequest):
         json.dumps({"request": request, "response": result, "time": f"{(time.time() - start_time):.2f}"}, default=str, ensure_ascii=False)
     )
     return result    
+
+
+@app.post("/cascade-query")
+def ask_cascade_pipeline(request: QueryRequest):
+    """Extractive-first query: the Generator only runs when the Reader's best answer is not confident enough"""
+
+    start_time = time.time()
+
+    params = request.params or {}
+    result = cascade_pipeline.run(query=request.query, params=params)
+
+    # Ensure answers and documents exist, even if they're empty lists
+    if not "documents" in result:
+        result["documents"] = []
+    if not "answers" in result:
+        result["answers"] = []
+
+    # Compute how relevant answers are to query and add relevancy scores in results.
+    result = add_relevancy_scores_to_results(results=result)
+
+    logger.info(
+        json.dumps({"request": request, "response": result, "answered_by": result.get("answered_by"), "time": f"{(time.time() - start_time):.2f}"}, default=str, ensure_ascii=False)
+    )
+    return result
+
+
+@app.post("/query")
+def ask_query_pipeline(request: QueryRequest):
+    """Extractive and generative answers of one retrieval and ranking pass, with the Reader and the Generator run at the same time"""
+
+    start_time = time.time()
+
+    params = request.params or {}
+    result = query_pipeline.run(query=request.query, params=params)
+
+    # One relevancy pass over the answers of both branches
+    result = add_relevancy_scores_to_results(results=result)
+
+    logger.info(
+        json.dumps({"request": request, "response": result, "time": f"{(time.time() - start_time):.2f}"}, default=str, ensure_ascii=False)
+    )
+    return result
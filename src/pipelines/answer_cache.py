@@ -0,0 +1,117 @@
+from typing import Any, Dict, Iterable, List, Optional
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ANSWER_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "generated_answers.sqlite")
+
+
+def normalize_query(query: str) -> str:
+    """Case, unicode form, whitespace and trailing punctuation insensitive form of a query"""
+    query = unicodedata.normalize("NFC", query).casefold()
+    query = re.sub(r"\s+", " ", query)
+    return query.strip(" .;;?!")
+
+
+class AnswerCache:
+    """
+    Bounded, persistent cache of generated answers in a local SQLite file.
+
+    An entry is keyed by the normalized query, the ids and content hashes of the documents in the prompt and the
+    generation parameters, so a cached answer is only served for the same prompt context. The least recently used
+    entries are evicted beyond `max_entries`. The entries a document contributed to are dropped when the document is
+    overwritten (see `invalidate_documents`).
+    """
+
+    def __init__(self, path: str, max_entries: int = 10000):
+        """
+        :param path: SQLite file of the cache. Created if it does not exist.
+        :param max_entries: Maximum number of cached answers.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, value TEXT NOT NULL, last_access REAL NOT NULL)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS answer_documents (document_id TEXT NOT NULL, key TEXT NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS answer_documents_id ON answer_documents (document_id)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS answers_last_access ON answers (last_access)")
+
+    @staticmethod
+    def make_key(query: str, documents: Iterable[Any], generation_params: Dict[str, Any]) -> str:
+        """Cache key of a query, the documents (with `id` and `content`) of its prompt and the generation parameters"""
+
+        key = {
+            "query": normalize_query(query),
+            "documents": [(doc.id, hashlib.sha256(doc.content.encode("utf-8")).hexdigest()) for doc in documents],
+            "params": generation_params,
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT value FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute("UPDATE answers SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any], document_ids: List[str]):
+        """Cache a JSON serializable value, linked to the documents it was generated from"""
+
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO answers (key, value, last_access) VALUES (?, ?, ?)",
+                                     (key, json.dumps(value, ensure_ascii=False), time.time()))
+            self._connection.execute("DELETE FROM answer_documents WHERE key = ?", (key,))
+            self._connection.executemany("INSERT INTO answer_documents (document_id, key) VALUES (?, ?)",
+                                         [(doc_id, key) for doc_id in set(document_ids)])
+            self._evict()
+
+    def invalidate_documents(self, document_ids: Iterable[str]) -> int:
+        """Drop the cached answers generated from any of the documents. Returns the number of dropped answers."""
+
+        document_ids = list(set(document_ids))
+        dropped = 0
+        with self._lock, self._connection:
+            # Query in chunks to stay below SQLite's limit of bound parameters
+            for i in range(0, len(document_ids), 500):
+                chunk = document_ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                keys = [row[0] for row in self._connection.execute(
+                    f"SELECT DISTINCT key FROM answer_documents WHERE document_id IN ({placeholders})", chunk)]
+                dropped += self._delete(keys)
+        if dropped:
+            logger.info(f"Invalidated {dropped} cached answers of {len(document_ids)} overwritten documents")
+        return dropped
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM answers")
+            self._connection.execute("DELETE FROM answer_documents")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def _evict(self):
+        excess = self._connection.execute("SELECT COUNT(*) FROM answers").fetchone()[0] - self.max_entries
+        if excess > 0:
+            keys = [row[0] for row in self._connection.execute("SELECT key FROM answers ORDER BY last_access LIMIT ?", (excess,))]
+            self._delete(keys)
+
+    def _delete(self, keys: List[str]) -> int:
+        for key in keys:
+            self._connection.execute("DELETE FROM answers WHERE key = ?", (key,))
+            self._connection.execute("DELETE FROM answer_documents WHERE key = ?", (key,))
+        return len(keys)
@@ -0,0 +1,46 @@
+from typing import Any, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+
+from haystack.pipelines import Pipeline
+
+
+class BranchingQueryPipeline:
+    """
+    Run a retrieval pipeline once and feed its ranked documents to several answering branches at the same time.
+
+    Every branch is a pipeline rooted at "Query" that takes the ranked documents as input. Branches run in threads;
+    the model inference releases the GIL, so e.g. the Reader and the Generator overlap. The answers of all branches
+    are merged into one list. Nodes are shared by concurrent requests and branches, so they must not keep per call
+    state on themselves (the Reader runs every call on its own copy of the inferencer settings).
+    """
+
+    def __init__(self, retrieval: Pipeline, branches: Dict[str, Pipeline]):
+        """
+        :param retrieval: Pipeline that returns the ranked `documents` of a query.
+        :param branches: Answering pipelines by name. Their results are also returned under their name.
+        """
+        self.retrieval = retrieval
+        self.branches = branches
+        self.executor = ThreadPoolExecutor(max_workers=len(branches), thread_name_prefix="QueryBranch")
+
+    @staticmethod
+    def _params_for(pipeline: Pipeline, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep the params targeted at the nodes of a pipeline"""
+        return {name: value for name, value in params.items() if name in pipeline.graph.nodes}
+
+    def run(self, query: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+
+        params = params or {}
+        documents = self.retrieval.run(query=query, params=self._params_for(self.retrieval, params)).get("documents", [])
+
+        futures = {
+            name: self.executor.submit(branch.run, query=query, documents=documents, params=self._params_for(branch, params))
+            for name, branch in self.branches.items()
+        }
+        result = {"query": query, "documents": documents, "answers": []}
+        for name, future in futures.items():
+            branch_result = future.result()
+            result["answers"].extend(branch_result.get("answers", []))
+            result[name] = {key: value for key, value in branch_result.items() if key not in ("query", "documents", "answers")}
+
+        return result
@@ -0,0 +1,63 @@
+from typing import List, Optional
+import logging
+
+import numpy as np
+from haystack.schema import Document
+from haystack.nodes import EmbeddingRetriever
+
+from pipelines.embedding_cache import EmbeddingCache, get_model_revision, DEFAULT_EMBEDDING_CACHE_DIR
+from pipelines.embedding_engine import PassageEmbeddingEngine
+
+logger = logging.getLogger(__name__)
+
+
+class CachedEmbeddingRetriever(EmbeddingRetriever):
+    """
+    EmbeddingRetriever that serves passage embeddings from a persistent EmbeddingCache, so that only the passages the
+    cache does not hold reach the model (at indexing and in `document_store.update_embeddings`). The cache misses are
+    embedded by the `embedding_engine` if one is given. Queries are embedded as usual.
+    """
+
+    def __init__(self, embedding_cache_dir: Optional[str] = DEFAULT_EMBEDDING_CACHE_DIR,
+                 embedding_engine: Optional[PassageEmbeddingEngine] = None, **kwargs):
+        """
+        Same arguments as EmbeddingRetriever.
+
+        :param embedding_cache_dir: Directory of the embedding caches. None disables the cache.
+        :param embedding_engine: Multi-process engine of the same model that embeds large sets of passages.
+        """
+        super().__init__(**kwargs)
+        self.embedding_engine = embedding_engine
+        self.embedding_cache = None
+        if embedding_cache_dir is not None:
+            self.embedding_cache = EmbeddingCache(model_key=self.get_model_key(), cache_dir=embedding_cache_dir)
+
+    def get_model_key(self) -> dict:
+        """Everything that determines the passage embeddings of the retriever"""
+        return {
+            "model": str(self.embedding_model),
+            "revision": get_model_revision(str(self.embedding_model), self.model_version),
+            "max_seq_len": self.max_seq_len,
+            "model_format": self.model_format,
+            "pooling_strategy": self.pooling_strategy,
+        }
+
+    def embed_documents(self, documents: List[Document]) -> np.ndarray:
+        # The text the model embeds, including the meta fields of `embed_meta_fields`
+        documents = self._preprocess_documents(documents)
+        if self.embedding_cache is None:
+            return self._embed(documents)
+        return self.embedding_cache.embed([doc.content for doc in documents], lambda positions: self._embed([documents[i] for i in positions]))
+
+    def _embed(self, documents: List[Document]) -> np.ndarray:
+        # A few passages are not worth a round trip to the engine's workers
+        if self.embedding_engine is not None and len(documents) > self.embedding_engine.batch_size:
+            return self.embedding_engine.embed([doc.content for doc in documents])
+        return self.embedding_encoder.embed_documents(documents)
+
+    def train(self, *args, **kwargs):
+        super().train(*args, **kwargs)
+        # The cached embeddings belong to the model before training
+        logger.info("Disabling the embedding cache and engine of the retrained model")
+        self.embedding_cache = None
+        self.embedding_engine = None
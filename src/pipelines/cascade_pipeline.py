@@ -0,0 +1,33 @@
+import os
+import sys
+import logging
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from haystack.pipelines import Pipeline
+
+from pipelines.retrieval import retriever, ranker
+from pipelines.extractive_qa_pipeline import reader
+from pipelines.rag_pipeline import context_builder, generator
+from pipelines.reader_confidence_gate import ReaderConfidenceGate
+
+logging.basicConfig(format="%(levelname)s - %(name)s -  %(message)s", level=logging.WARNING)
+logging.getLogger("haystack").setLevel(logging.INFO)
+
+# Minimum Reader confidence of the best answer for the extractive-first cascade to skip the Generator
+CASCADE_MIN_CONFIDENCE = float(os.getenv("CASCADE_MIN_CONFIDENCE", 0.7))
+# Minimum relevancy score of the best Reader answer. Unset skips the relevancy check.
+CASCADE_MIN_RELEVANCY = float(os.environ["CASCADE_MIN_RELEVANCY"]) if "CASCADE_MIN_RELEVANCY" in os.environ else None
+
+# Extractive-first cascade: the retriever and ranker run once; the Generator only runs on the ranked documents when
+# the Reader is not confident enough. The nodes are shared with the extractive and RAG pipelines.
+p = Pipeline()
+p.add_node(component=retriever, name="Retriever", inputs=["Query"])
+p.add_node(component=ranker, name="Ranker", inputs=["Retriever"])
+p.add_node(component=reader, name="Reader", inputs=["Ranker"])
+p.add_node(component=ReaderConfidenceGate(min_confidence=CASCADE_MIN_CONFIDENCE, min_relevancy=CASCADE_MIN_RELEVANCY), name="ReaderConfidenceGate", inputs=["Reader"])
+p.add_node(component=context_builder, name="ContextBuilder", inputs=["ReaderConfidenceGate.output_2"])
+p.add_node(component=generator, name="Generator", inputs=["ContextBuilder"])
+
+cascade_pipeline = p
@@ -0,0 +1,144 @@
+from typing import List, Optional
+import logging
+import threading
+
+from transformers import AutoTokenizer
+from sentence_transformers import SentenceTransformer
+
+from haystack.schema import Document
+from haystack.nodes.base import BaseComponent
+
+from utils.sentence_segmentation import get_sentence_segmenter
+
+logger = logging.getLogger(__name__)
+
+
+class ContextBuilder(BaseComponent):
+    """
+    Assemble the documents that go into the Generator's prompt within a token budget.
+
+    Documents are added in descending ranker score order until the budget, counted with the generator's tokenizer,
+    is filled; the document that does not fit is cut at its last sentence within the budget.
+    Optionally, sentences whose bi-encoder similarity to the query is below a threshold are dropped from every
+    document first, so that the budget is spent on the relevant parts of the passages.
+    """
+    outgoing_edges = 1
+
+    def __init__(
+        self,
+        tokenizer_name_or_path: str,
+        token_budget: Optional[int] = None,
+        embedding_model: Optional[str] = None,
+        min_sentence_similarity: Optional[float] = None,
+        language: str = "greek",
+    ):
+        """
+        :param tokenizer_name_or_path: Tokenizer of the generator model used to count prompt tokens.
+        :param token_budget: Maximum number of document tokens in the prompt. None disables the budget.
+        :param embedding_model: Bi-encoder used to score sentences against the query. Required for sentence compression.
+                                It is loaded when the first documents are compressed.
+        :param min_sentence_similarity: Drop sentences with a lower cosine similarity to the query. None disables compression.
+        :param language: Language of the sentence segmenter ("greek" or "english").
+        """
+        super().__init__()
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_name_or_path)
+        self.token_budget = token_budget
+        self.min_sentence_similarity = min_sentence_similarity
+        self.language = language
+        self.sentence_segmenter = get_sentence_segmenter(language)
+        self.embedding_model_name = embedding_model
+        self._embedding_model = None
+        self._embedding_model_lock = threading.Lock()
+
+        if min_sentence_similarity is not None and embedding_model is None:
+            raise ValueError("An embedding_model is required to compress documents with min_sentence_similarity.")
+
+    @property
+    def embedding_model(self) -> SentenceTransformer:
+        if self.embedding_model_name is None:
+            raise ValueError("An embedding_model is required to compress documents with min_sentence_similarity.")
+        with self._embedding_model_lock:
+            if self._embedding_model is None:
+                self._embedding_model = SentenceTransformer(self.embedding_model_name)
+        return self._embedding_model
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def split_sentences(self, text: str) -> List[str]:
+        return self.sentence_segmenter.split(text)
+
+    def compress(self, query: str, documents: List[Document], min_sentence_similarity: float) -> List[Document]:
+        """Keep only the sentences of each document that are similar enough to the query (at least the most similar one)"""
+
+        sentences_per_doc = [self.split_sentences(doc.content) for doc in documents]
+        all_sentences = [sentence for sentences in sentences_per_doc for sentence in sentences]
+        if not all_sentences:
+            return documents
+
+        query_embedding = self.embedding_model.encode([query])
+        sentence_embeddings = self.embedding_model.encode(all_sentences)
+        similarities = self.embedding_model.similarity(sentence_embeddings, query_embedding)[:, 0].tolist()
+
+        compressed = []
+        offset = 0
+        for doc, sentences in zip(documents, sentences_per_doc):
+            doc_similarities = similarities[offset : offset + len(sentences)]
+            offset += len(sentences)
+            if not sentences:
+                continue
+            best = max(range(len(sentences)), key=lambda i: doc_similarities[i])
+            kept = [s for i, s in enumerate(sentences) if i == best or doc_similarities[i] >= min_sentence_similarity]
+            compressed.append(Document(id=doc.id, content=" ".join(kept), meta=doc.meta, score=doc.score))
+
+        return compressed
+
+    def fill_budget(self, documents: List[Document], token_budget: int) -> List[Document]:
+        """Add documents until the token budget is spent, cutting the last one at a sentence boundary"""
+
+        selected = []
+        used = 0
+        for doc in documents:
+            num_tokens = self.count_tokens(doc.content)
+            if used + num_tokens <= token_budget:
+                selected.append(doc)
+                used += num_tokens
+                continue
+
+            kept = []
+            for sentence in self.split_sentences(doc.content):
+                sentence_tokens = self.count_tokens(sentence)
+                if used + sentence_tokens > token_budget:
+                    break
+                kept.append(sentence)
+                used += sentence_tokens
+            if kept:
+                selected.append(Document(id=doc.id, content=" ".join(kept), meta=doc.meta, score=doc.score))
+            break
+
+        return selected
+
+    def run(self, query: str, documents: List[Document], token_budget: Optional[int] = None, min_sentence_similarity: Optional[float] = None):
+
+        token_budget = self.token_budget if token_budget is None else token_budget
+        min_sentence_similarity = self.min_sentence_similarity if min_sentence_similarity is None else min_sentence_similarity
+
+        documents = sorted(documents, key=lambda doc: doc.score if doc.score is not None else 0.0, reverse=True)
+        if min_sentence_similarity is not None:
+            documents = self.compress(query, documents, min_sentence_similarity)
+        if token_budget is not None:
+            documents = self.fill_budget(documents, token_budget)
+
+        logger.debug(f"Built context of {sum(self.count_tokens(doc.content) for doc in documents)} tokens from {len(documents)} documents")
+
+        return {"documents": documents}, "output_1"
+
+    def run_batch(self, queries: List[str], documents: List[List[Document]], token_budget: Optional[int] = None, min_sentence_similarity: Optional[float] = None):
+
+        if len(queries) == 1:
+            queries = queries * len(documents)
+        built = [
+            self.run(query=query, documents=docs, token_budget=token_budget, min_sentence_similarity=min_sentence_similarity)[0]["documents"]
+            for query, docs in zip(queries, documents)
+        ]
+        return {"documents": built}, "output_1"
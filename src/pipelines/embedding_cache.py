@@ -0,0 +1,147 @@
+from typing import Callable, Dict, List, Optional
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "embeddings")
+
+
+def get_model_revision(model_name_or_path: str, revision: Optional[str] = None) -> str:
+    """
+    Revision of an embedding model: the given hub revision, or for a local model directory a fingerprint of its files,
+    so that retraining a model saved to the same directory does not serve stale embeddings.
+    """
+    if not os.path.isdir(model_name_or_path):
+        return revision or "main"
+    fingerprint = hashlib.sha256()
+    for root, _, files in sorted(os.walk(model_name_or_path)):
+        for name in sorted(files):
+            stat = os.stat(os.path.join(root, name))
+            fingerprint.update(f"{os.path.relpath(os.path.join(root, name), model_name_or_path)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    return fingerprint.hexdigest()[:16]
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of the passage embeddings of one model configuration.
+
+    The embeddings are rows of a float32 array in a memory-mapped file, which grows as rows are added, and an SQLite
+    index maps the sha256 hash of a passage's content to its row. Every model key (model name, revision, max_seq_len,
+    ...) has its own directory under `cache_dir`.
+    """
+
+    def __init__(self, model_key: Dict, cache_dir: str = DEFAULT_EMBEDDING_CACHE_DIR, growth_rows: int = 16384):
+        """
+        :param model_key: JSON serializable description of everything that determines the embeddings.
+        :param cache_dir: Directory of the caches of all models.
+        :param growth_rows: Minimum number of rows the array file grows by.
+        """
+        self.model_key = model_key
+        key = json.dumps(model_key, sort_keys=True)
+        self.directory = os.path.join(cache_dir, hashlib.sha256(key.encode("utf-8")).hexdigest()[:16])
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "model_key.json"), "w", encoding="utf-8") as fp:
+            fp.write(key)
+
+        self.growth_rows = growth_rows
+        self.array_path = os.path.join(self.directory, "embeddings.f32")
+        self._array = None
+        self._lock = threading.Lock()
+        # Transactions are begun explicitly: put() takes the write lock before it reads the next free row
+        self._connection = sqlite3.connect(os.path.join(self.directory, "index.sqlite"), check_same_thread=False, isolation_level=None)
+        with self._connection:
+            self._connection.execute("CREATE TABLE IF NOT EXISTS embeddings (content_hash TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        row = self._connection.execute("SELECT value FROM info WHERE key = 'dim'").fetchone()
+        self.dim = row[0] if row else None
+
+    @staticmethod
+    def content_hash(content: str) -> str:
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _get_rows(self, hashes: List[str]) -> Dict[str, int]:
+        rows = {}
+        # Query in chunks to stay below SQLite's limit of bound parameters
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows.update(self._connection.execute(f"SELECT content_hash, row FROM embeddings WHERE content_hash IN ({placeholders})", chunk))
+        return rows
+
+    def _map_array(self, num_rows: int, writable: bool = False) -> np.ndarray:
+        """Memory-map the array file with at least `num_rows` rows, growing the file if writing"""
+
+        capacity = os.path.getsize(self.array_path) // (4 * self.dim) if os.path.exists(self.array_path) else 0
+        if writable and capacity < num_rows:
+            capacity = max(num_rows, capacity + self.growth_rows, 2 * capacity)
+            with open(self.array_path, "ab") as fp:
+                fp.truncate(capacity * 4 * self.dim)
+        if self._array is None or self._array.shape[0] < capacity or (writable and self._array.mode != "r+"):
+            self._array = np.memmap(self.array_path, dtype=np.float32, mode="r+" if writable else "r", shape=(capacity, self.dim))
+        return self._array
+
+    def get(self, contents: List[str]) -> Dict[int, np.ndarray]:
+        """Cached embeddings by position in `contents`"""
+
+        hashes = [self.content_hash(content) for content in contents]
+        with self._lock:
+            rows = self._get_rows(list(set(hashes)))
+            if not rows:
+                return {}
+            array = self._map_array(max(rows.values()) + 1)
+            return {i: np.array(array[rows[h]]) for i, h in enumerate(hashes) if h in rows}
+
+    def put(self, contents: List[str], embeddings: np.ndarray):
+        """Add the embeddings of passages that are not cached yet"""
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        with self._lock, self._connection:
+            # Hold the database write lock from reading the next free row until its rows are inserted, so that
+            # processes sharing the cache (e.g. indexing workers) do not write their embeddings to the same rows
+            self._connection.execute("BEGIN IMMEDIATE")
+            if self.dim is None:
+                row = self._connection.execute("SELECT value FROM info WHERE key = 'dim'").fetchone()
+                self.dim = row[0] if row else embeddings.shape[1]
+                self._connection.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('dim', ?)", (self.dim,))
+            hashes = {}
+            for content, embedding in zip(contents, embeddings):
+                hashes.setdefault(self.content_hash(content), embedding)
+            existing = self._get_rows(list(hashes))
+            new = [(h, embedding) for h, embedding in hashes.items() if h not in existing]
+            if not new:
+                return
+            first_row = self._connection.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM embeddings").fetchone()[0]
+            array = self._map_array(first_row + len(new), writable=True)
+            array[first_row:first_row + len(new)] = np.stack([embedding for _, embedding in new])
+            array.flush()
+            self._connection.executemany("INSERT INTO embeddings (content_hash, row) VALUES (?, ?)",
+                                         [(h, first_row + i) for i, (h, _) in enumerate(new)])
+
+    def embed(self, contents: List[str], embed_fn: Callable[[List[int]], np.ndarray]) -> np.ndarray:
+        """
+        Embeddings of the passages, computed with `embed_fn` only for the cache misses.
+
+        :param embed_fn: Embeds the passages at the given positions of `contents`.
+        """
+        if not contents:
+            return embed_fn([])
+
+        cached = self.get(contents)
+        missing = [i for i in range(len(contents)) if i not in cached]
+        if missing:
+            computed = np.asarray(embed_fn(missing), dtype=np.float32)
+            self.put([contents[i] for i in missing], computed)
+            cached.update(zip(missing, computed))
+        logger.info(f"Embedding cache: {len(contents) - len(missing)} hits, {len(missing)} misses")
+        return np.stack([cached[i] for i in range(len(contents))])
@@ -0,0 +1,114 @@
+from typing import Callable, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import multiprocessing
+import os
+
+import numpy as np
+from transformers import AutoTokenizer
+
+logger = logging.getLogger(__name__)
+
+
+class PassageEmbeddingEngine:
+    """
+    Embed passages with a sentence-transformers model in a pool of CPU worker processes.
+
+    The passages are sorted by token length and cut into batches, so that every batch pads to a similar length, and
+    the batches are spread over the workers. Every worker loads the model once, runs torch with `threads_per_worker`
+    threads and is pinned to its own cores when the machine has enough of them. The embeddings are returned in the
+    order of the input passages.
+    """
+
+    def __init__(self, model_name_or_path: str, max_seq_len: int = 128, num_workers: Optional[int] = None,
+                 threads_per_worker: int = 1, batch_size: int = 64, load_model: Optional[Callable] = None):
+        """
+        :param model_name_or_path: sentence-transformers model, as given to the EmbeddingRetriever.
+        :param max_seq_len: Maximum number of tokens of a passage, as given to the EmbeddingRetriever.
+        :param num_workers: Number of worker processes. Defaults to the number of CPUs divided by `threads_per_worker`.
+        :param threads_per_worker: Number of torch threads of every worker.
+        :param batch_size: Number of passages per batch.
+        :param load_model: Module level function (model_name_or_path, max_seq_len) -> model with an `encode` method like
+            SentenceTransformer.encode, called once in every worker. Defaults to loading a SentenceTransformer.
+        """
+        self.model_name_or_path = model_name_or_path
+        self.max_seq_len = max_seq_len
+        self.threads_per_worker = threads_per_worker
+        self.num_workers = num_workers or max(1, (os.cpu_count() or 1) // threads_per_worker)
+        self.batch_size = batch_size
+        self.load_model = load_model or load_sentence_transformer
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name_or_path)
+        self._pool = None
+
+    def get_batches(self, texts: List[str]) -> List[List[int]]:
+        """Positions of the texts grouped into batches of similar token length"""
+
+        lengths = self.tokenizer(texts, truncation=True, max_length=self.max_seq_len, return_length=True)["length"]
+        order = sorted(range(len(texts)), key=lambda i: lengths[i])
+        return [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        batches = self.get_batches(texts)
+        results = self._get_pool().map(_embed_batch, [[texts[i] for i in batch] for batch in batches])
+
+        embeddings = None
+        for batch, batch_embeddings in zip(batches, results):
+            if embeddings is None:
+                embeddings = np.zeros((len(texts), batch_embeddings.shape[1]), dtype=batch_embeddings.dtype)
+            embeddings[batch] = batch_embeddings
+        return embeddings
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            logger.info(f"Starting {self.num_workers} embedding processes with {self.threads_per_worker} threads each")
+            context = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self.load_model, self.model_name_or_path, self.max_seq_len, self.threads_per_worker, context.Value("i", 0))
+                )
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def load_sentence_transformer(model_name_or_path: str, max_seq_len: int):
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name_or_path, device="cpu")
+    model.max_seq_length = max_seq_len
+    return model
+
+
+# Model of each pool process, loaded once by the pool initializer
+_model = None
+
+def _init_worker(load_model: Callable, model_name_or_path: str, max_seq_len: int, num_threads: int, worker_counter):
+    global _model
+
+    with worker_counter.get_lock():
+        worker_id = worker_counter.value
+        worker_counter.value += 1
+
+    # Pin the worker to its own cores if every worker can get `num_threads` of them
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else []
+    if len(cores) >= (worker_id + 1) * num_threads:
+        os.sched_setaffinity(0, cores[worker_id * num_threads:(worker_id + 1) * num_threads])
+
+    # Limit the OpenMP threads before torch starts them
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    import torch
+
+    torch.set_num_threads(num_threads)
+    _model = load_model(model_name_or_path, max_seq_len)
+
+def _embed_batch(texts: List[str]) -> np.ndarray:
+    return _model.encode(texts, batch_size=len(texts), convert_to_numpy=True, show_progress_bar=False)
@@ -1,6 +1,5 @@
 
 from typing import List, Dict, Any, Optional, Union
-from haystack.nodes import FARMReader, EmbeddingRetriever
 from haystack.pipelines import Pipeline
 import os 
 import sys
@@ -13,32 +12,40 @@ logging.basicConfig(format="%(levelname)s - %(name)s -  %(message)s", level=logg
 logging.getLogger("haystack").setLevel(logging.INFO)
 
 from document_store.initialize_document_store import document_store as DOCUMENT_STORE
-from pipelines.ranker import SentenceTransformersRanker
+from pipelines.retrieval import retriever, ranker
+from pipelines.reader import ExtractiveReader, cpu_profile_kwargs
+from pipelines.no_answer_gate import NoAnswerGate
 
 if DOCUMENT_STORE is None:
     raise ValueError("the imported document_store is None. Please make sure that the Elasticsearch service is properly launched")
-    
-retriever = EmbeddingRetriever(
-    embedding_model="panosgriz/covid_el_paraphrase-multilingual-MiniLM-L12-v2",
-    document_store=DOCUMENT_STORE,
-    top_k= 10
-    )
-ranker = SentenceTransformersRanker(
-    model_name_or_path="amberoad/bert-multilingual-passage-reranking-msmarco",
-    scale_score=True,
-    top_k=10
-    )
-reader = FARMReader(
+
+# Set READER_DEVICE=cpu to serve the Reader with the CPU profile (dynamic sequence length, quantized model, no multiprocessing for small inputs)
+READER_DEVICE = os.getenv("READER_DEVICE", "cuda")
+READER_NUM_THREADS = int(os.environ["READER_NUM_THREADS"]) if "READER_NUM_THREADS" in os.environ else None
+# Set READER_PACK_PASSAGES=true to pack several short ranked passages into each Reader input window
+READER_PACK_PASSAGES = os.getenv("READER_PACK_PASSAGES", "false").lower() == "true"
+# Minimum top Ranker score for a query to reach the Reader (see dev/evaluation/calibrate_no_answer_threshold.py). Unset disables the gate.
+NO_ANSWER_THRESHOLD = float(os.environ["NO_ANSWER_THRESHOLD"]) if "NO_ANSWER_THRESHOLD" in os.environ else None
+
+if READER_DEVICE == "cpu":
+    reader_kwargs = cpu_profile_kwargs(num_threads=READER_NUM_THREADS)
+else:
+    reader_kwargs = {"use_gpu": True, "devices": ["cuda:0", "cuda:1", "cuda:2", "cuda:3"]}
+
+reader = ExtractiveReader(
     model_name_or_path="panosgriz/mdeberta-v3-base-squad2-covid-el_small",
-    use_gpu=True,
-    devices=["cuda:0", "cuda:1", "cuda:2", "cuda:3"],
     use_confidence_scores=True,
-    top_k = 3
+    top_k = 3,
+    pack_passages=READER_PACK_PASSAGES,
+    **reader_kwargs
     )
 
+no_answer_gate = NoAnswerGate(threshold=NO_ANSWER_THRESHOLD)
+
 p = Pipeline()
 p.add_node(component=retriever, name ="Retriever", inputs=["Query"])
 p.add_node(component=ranker, name="Ranker", inputs=["Retriever"])
-p.add_node(component=reader, name="Reader", inputs=["Ranker"])
+p.add_node(component=no_answer_gate, name="NoAnswerGate", inputs=["Ranker"])
+p.add_node(component=reader, name="Reader", inputs=["NoAnswerGate.output_1"])
 
 extractive_qa_pipeline = p
\ No newline at end of file
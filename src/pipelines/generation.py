@@ -0,0 +1,554 @@
+from typing import List, Dict, Any, Optional, Iterator, Sequence
+from concurrent.futures import Future
+from queue import Queue
+import threading
+import logging
+import re
+
+import torch
+import torch.nn.functional as F
+from transformers import StoppingCriteria
+from haystack.schema import Document
+
+logger = logging.getLogger(__name__)
+
+try:
+    from transformers import DynamicCache
+except ImportError:  # transformers < 4.36 only knows the legacy tuple format
+    DynamicCache = None
+
+
+def render_prompt(prompt: str, query: str, documents: List[Document], delimiter: str = " ") -> str:
+    """Fill the `{query}` and `{join(documents)}` placeholders of the Generator's prompt (same as haystack's PromptTemplate)"""
+    return prompt.replace("{query}", query).replace("{join(documents)}", delimiter.join(doc.content for doc in documents))
+
+def encode_prompt(tokenizer, text: str) -> torch.Tensor:
+    """Tokenize a prompt, without adding a second BOS token if the chat template already starts with it"""
+    add_special_tokens = not (tokenizer.bos_token and text.startswith(tokenizer.bos_token))
+    return tokenizer(text, return_tensors="pt", add_special_tokens=add_special_tokens).input_ids
+
+
+class SentenceStoppingCriteria(StoppingCriteria):
+    """
+    Stop decoding at a sentence boundary once a soft token budget is reached, or as soon as the answer contains a
+    refusal phrase (e.g. "Δεν γνωρίζω"). `reason` records why decoding was stopped: "sentence_boundary", "refusal",
+    or None when the criterion did not stop it (end of sequence token or max_new_tokens).
+
+    Works as a transformers stopping criterion in `generate()` and, through `should_stop`, in the GenerationScheduler,
+    the SpeculativeDecoder and the generation backends.
+    """
+
+    # A sentence ends with . ; (Greek question mark) or ! after a word of at least two letters, so that numbers
+    # ("3.5") and abbreviations ("π.χ.") do not count as sentence ends
+    SENTENCE_END = re.compile(r"(?:[^\W\d_]{2,}|[)\"»])[.;!]$")
+
+    def __init__(self, tokenizer, soft_max_new_tokens: Optional[int] = None, stop_phrases: Sequence[str] = ("Δεν γνωρίζω",)):
+        """
+        :param tokenizer: Tokenizer of the generating model, used to decode the generated tokens.
+        :param soft_max_new_tokens: Stop at the first sentence end after this many generated tokens. None disables it.
+        :param stop_phrases: Stop as soon as the generated text contains one of these phrases.
+        """
+        self.tokenizer = tokenizer
+        self.soft_max_new_tokens = soft_max_new_tokens
+        self.stop_phrases = list(stop_phrases)
+        self.prompt_length = None
+        self.reason = None
+
+    def should_stop(self, generated_ids: List[int]) -> bool:
+        """Whether decoding should stop after the given generated token ids (prompt excluded)"""
+
+        text = self.tokenizer.decode(generated_ids, skip_special_tokens=True)
+        if any(phrase in text for phrase in self.stop_phrases):
+            self.reason = "refusal"
+        elif self.soft_max_new_tokens is not None and len(generated_ids) >= self.soft_max_new_tokens and self.SENTENCE_END.search(text.rstrip()):
+            self.reason = "sentence_boundary"
+        return self.reason is not None
+
+    def trim_refusal(self, text: str) -> str:
+        """Cut a refusal answer right after the refusal phrase and close the sentence"""
+        for phrase in self.stop_phrases:
+            if phrase in text:
+                return text[:text.index(phrase) + len(phrase)].strip() + "."
+        return text
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        # generate() calls the criterion after every new token, so the first call has exactly one generated token
+        if self.prompt_length is None:
+            self.prompt_length = input_ids.shape[1] - 1
+        stop = self.should_stop(input_ids[0, self.prompt_length:].tolist())
+        return torch.full((input_ids.shape[0],), stop, dtype=torch.bool, device=input_ids.device)
+
+
+def should_stop(stopping_criteria, generated_ids: List[int]) -> bool:
+    """Evaluate a list of SentenceStoppingCriteria (the `stopping_criteria` generation argument) outside of generate()"""
+    return any(criteria.should_stop(generated_ids) for criteria in stopping_criteria or [])
+
+
+class PrefixCache:
+    """
+    Key/value cache of a constant prompt prefix (e.g. the system instruction of the chat template), computed once and
+    reused by every generation whose prompt starts with the same tokens, so that only the rest of the prompt is prefilled.
+    Prompts that do not start with the prefix tokens are generated without the cache.
+    """
+
+    def __init__(self, model, prefix_ids: torch.Tensor):
+        """
+        :param model: The causal LM the cache is computed with.
+        :param prefix_ids: Token ids of the constant prefix, of shape [1, prefix_length].
+        """
+        self.model = model
+        self.prefix_ids = prefix_ids.to(model.device)
+
+        with torch.inference_mode():
+            past_key_values = model(input_ids=self.prefix_ids, use_cache=True).past_key_values
+        # Keep the legacy tuple format: every request builds its own cache object on top of these tensors
+        if hasattr(past_key_values, "to_legacy_cache"):
+            past_key_values = past_key_values.to_legacy_cache()
+        self.past_key_values = past_key_values
+
+    @classmethod
+    def from_text(cls, model, tokenizer, prefix: str) -> "PrefixCache":
+        return cls(model, encode_prompt(tokenizer, prefix))
+
+    @property
+    def prefix_length(self) -> int:
+        return self.prefix_ids.shape[1]
+
+    def matches(self, input_ids: torch.Tensor) -> bool:
+        """Whether the prompt starts with the cached prefix and has at least one more token to prefill"""
+        n = self.prefix_length
+        return input_ids.shape[0] == 1 and input_ids.shape[1] > n and torch.equal(input_ids[0, :n], self.prefix_ids[0])
+
+    def get_cache(self):
+        """A fresh cache for one generation. The cache update concatenates new tensors, so the prefix tensors are never modified."""
+        if DynamicCache is not None:
+            return DynamicCache.from_legacy_cache(self.past_key_values)
+        return self.past_key_values
+
+    @torch.inference_mode()
+    def generate(self, input_ids: torch.Tensor, max_new_tokens: int = 100, do_sample: bool = False, temperature: float = 1.0, top_p: float = 1.0,
+                 stopping_criteria: Optional[List[SentenceStoppingCriteria]] = None) -> torch.Tensor:
+        """Generate from the full prompt ids, reusing the prefix cache if the prompt starts with it. Returns only the new tokens."""
+
+        input_ids = input_ids.to(self.model.device)
+        if not self.matches(input_ids):
+            logger.debug("Prompt does not start with the cached prefix tokens; generating without the prefix cache")
+            output_ids = self.model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), max_new_tokens=max_new_tokens,
+                                             do_sample=do_sample, temperature=temperature, top_p=top_p, stopping_criteria=stopping_criteria)
+            return output_ids[:, input_ids.shape[1]:]
+
+        # generate() (transformers 4.39) does not skip the prompt tokens held by a given cache, so the rest of the
+        # prompt is prefilled and the answer decoded here
+        n = self.prefix_length
+        out = self.model(input_ids=input_ids[:, n:], past_key_values=self.get_cache(), use_cache=True,
+                         position_ids=torch.arange(n, input_ids.shape[1], device=input_ids.device).unsqueeze(0))
+        eos_token_id = self.model.generation_config.eos_token_id
+        eos_token_ids = eos_token_id if isinstance(eos_token_id, list) else [eos_token_id]
+        generated = []
+        while True:
+            generated.append(sample_next_token(out.logits[0, -1], do_sample, temperature, top_p))
+            if generated[-1] in eos_token_ids or len(generated) >= max_new_tokens or should_stop(stopping_criteria, generated):
+                break
+            out = self.model(input_ids=torch.tensor([generated[-1:]], device=input_ids.device), past_key_values=out.past_key_values, use_cache=True)
+
+        return torch.tensor([generated], dtype=torch.long)
+
+
+def next_token_probs(logits: torch.Tensor, temperature: float = 1.0, top_p: float = 1.0) -> torch.Tensor:
+    """Sampling distribution over the vocabulary after temperature and nucleus (top_p) filtering"""
+
+    probs = torch.softmax(logits.float() / max(temperature, 1e-5), dim=-1)
+    if top_p < 1.0:
+        sorted_probs, sorted_ids = torch.sort(probs, descending=True)
+        # keep the smallest set of tokens whose cumulative probability reaches top_p (at least one token)
+        remove = torch.cumsum(sorted_probs, dim=-1) - sorted_probs > top_p
+        sorted_probs[remove] = 0.0
+        probs = torch.zeros_like(probs).scatter(-1, sorted_ids, sorted_probs)
+    return probs / probs.sum(dim=-1, keepdim=True)
+
+def sample_next_token(logits: torch.Tensor, do_sample: bool = False, temperature: float = 1.0, top_p: float = 1.0) -> int:
+    """Pick the next token from the logits of one sequence (greedy, or temperature + nucleus sampling)"""
+
+    if not do_sample:
+        return int(torch.argmax(logits, dim=-1))
+    return int(torch.multinomial(next_token_probs(logits, temperature, top_p), num_samples=1))
+
+
+class GenerationRequest:
+    """A prompt submitted to the GenerationScheduler. Wait for `result()` or iterate over `stream()` for its tokens."""
+
+    _END_OF_STREAM = None
+
+    def __init__(self, input_ids: torch.Tensor, max_new_tokens: int = 100, do_sample: bool = False, temperature: float = 1.0, top_p: float = 1.0,
+                 stopping_criteria: Optional[List[SentenceStoppingCriteria]] = None):
+        self.input_ids = input_ids
+        self.stopping_criteria = stopping_criteria
+        self.max_new_tokens = max_new_tokens
+        self.do_sample = do_sample
+        self.temperature = temperature
+        self.top_p = top_p
+        self.generated_ids: List[int] = []
+        self._future: Future = Future()
+        self._tokens: Queue = Queue()
+
+    def add_token(self, token_id: int):
+        self.generated_ids.append(token_id)
+        self._tokens.put(token_id)
+
+    def finish(self, error: Optional[BaseException] = None):
+        self._tokens.put(self._END_OF_STREAM)
+        if error is not None:
+            self._future.set_exception(error)
+        else:
+            self._future.set_result(self.generated_ids)
+
+    def result(self, timeout: Optional[float] = None) -> List[int]:
+        """Block until the generation is finished and return the generated token ids"""
+        return self._future.result(timeout=timeout)
+
+    def stream(self) -> Iterator[int]:
+        """Yield the generated token ids as they are decoded"""
+        while True:
+            token_id = self._tokens.get()
+            if token_id is self._END_OF_STREAM:
+                break
+            yield token_id
+        # re-raise a generation error, if any
+        self._future.result()
+
+
+class GenerationScheduler:
+    """
+    Continuous batching of concurrent generations on one causal LM.
+
+    A background thread keeps a running decode batch. At every token boundary, waiting requests are prefilled and
+    admitted into the batch (up to `max_batch_size`) and finished sequences are retired, so concurrent callers share
+    each forward pass instead of decoding one sequence at a time. Sequences of different lengths are left-padded in the
+    batched key/value cache and masked out with the attention mask.
+    """
+
+    def __init__(self, model, eos_token_id: Optional[int] = None, max_batch_size: int = 16, prefix_cache: Optional[PrefixCache] = None):
+        """
+        :param model: The causal LM to generate with.
+        :param eos_token_id: Token that ends a sequence. Defaults to the model's generation config.
+        :param max_batch_size: Maximum number of sequences decoded together.
+        :param prefix_cache: Cache of a constant prompt prefix reused when prefilling matching prompts.
+        """
+        self.model = model
+        self.eos_token_id = eos_token_id if eos_token_id is not None else model.generation_config.eos_token_id
+        self.max_batch_size = max_batch_size
+        self.prefix_cache = prefix_cache
+
+        self._waiting: Queue = Queue()
+        self._active: List[GenerationRequest] = []
+        self._past_key_values = None
+        self._attention_mask: Optional[torch.Tensor] = None
+        self._next_tokens: Optional[torch.Tensor] = None
+
+        self._thread = threading.Thread(target=self._loop, name="GenerationScheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, input_ids: torch.Tensor, **generation_kwargs) -> GenerationRequest:
+        """Queue a prompt (token ids of shape [1, prompt_length]) for generation"""
+
+        request = GenerationRequest(input_ids.to(self.model.device), **generation_kwargs)
+        self._waiting.put(request)
+        return request
+
+    def generate(self, input_ids: torch.Tensor, **generation_kwargs) -> torch.Tensor:
+        """Blocking generation, with the same return format as `PrefixCache.generate` (new token ids only)"""
+
+        generated_ids = self.submit(input_ids, **generation_kwargs).result()
+        return torch.tensor([generated_ids], dtype=torch.long)
+
+    def _loop(self):
+        while True:
+            try:
+                self._admit_waiting_requests()
+                self._decode_step()
+            except Exception as e:
+                logger.exception("Generation batch failed")
+                for request in self._active:
+                    request.finish(error=e)
+                self._active = []
+                self._past_key_values, self._attention_mask, self._next_tokens = None, None, None
+
+    def _admit_waiting_requests(self):
+
+        # Block while there is nothing to decode
+        waiting = [self._waiting.get()] if not self._active else []
+        while len(self._active) + len(waiting) < self.max_batch_size and not self._waiting.empty():
+            waiting.append(self._waiting.get_nowait())
+
+        for request in waiting:
+            try:
+                self._admit(request)
+            except Exception as e:
+                logger.exception("Prefill of a generation request failed")
+                request.finish(error=e)
+
+    @torch.inference_mode()
+    def _admit(self, request: GenerationRequest):
+        """Prefill a new request on its own and merge its cache into the running batch"""
+
+        input_ids = request.input_ids
+        if self.prefix_cache is not None and self.prefix_cache.matches(input_ids):
+            n = self.prefix_cache.prefix_length
+            out = self.model(input_ids=input_ids[:, n:], past_key_values=self.prefix_cache.get_cache(), use_cache=True,
+                             position_ids=torch.arange(n, input_ids.shape[1], device=input_ids.device).unsqueeze(0))
+        else:
+            out = self.model(input_ids=input_ids, use_cache=True)
+        past_key_values = _to_legacy_cache(out.past_key_values)
+
+        token_id = sample_next_token(out.logits[0, -1], request.do_sample, request.temperature, request.top_p)
+        request.add_token(token_id)
+        if self._is_finished(request, token_id):
+            request.finish()
+            return
+
+        attention_mask = torch.ones((1, past_key_values[0][0].shape[2]), dtype=torch.long, device=input_ids.device)
+        next_tokens = torch.tensor([[token_id]], device=input_ids.device)
+        if not self._active:
+            self._past_key_values, self._attention_mask, self._next_tokens = past_key_values, attention_mask, next_tokens
+        else:
+            self._past_key_values, self._attention_mask = _merge_left_padded(
+                self._past_key_values, self._attention_mask, past_key_values, attention_mask
+            )
+            self._next_tokens = torch.cat([self._next_tokens, next_tokens], dim=0)
+        self._active.append(request)
+
+    @torch.inference_mode()
+    def _decode_step(self):
+        """Feed the pending token of every active sequence, sample the next ones and retire finished sequences"""
+
+        if not self._active:
+            return
+
+        attention_mask = torch.cat([self._attention_mask, torch.ones_like(self._next_tokens)], dim=1)
+        position_ids = (attention_mask.sum(dim=1, keepdim=True) - 1)
+        out = self.model(
+            input_ids=self._next_tokens, attention_mask=attention_mask, position_ids=position_ids,
+            past_key_values=self._past_key_values, use_cache=True,
+        )
+        self._past_key_values = _to_legacy_cache(out.past_key_values)
+        self._attention_mask = attention_mask
+
+        keep = []
+        next_tokens = []
+        for i, request in enumerate(self._active):
+            token_id = sample_next_token(out.logits[i, -1], request.do_sample, request.temperature, request.top_p)
+            request.add_token(token_id)
+            if self._is_finished(request, token_id):
+                request.finish()
+            else:
+                keep.append(i)
+                next_tokens.append(token_id)
+
+        if len(keep) < len(self._active):
+            self._retire(keep)
+        if self._active:
+            self._next_tokens = torch.tensor(next_tokens, device=self._next_tokens.device).unsqueeze(1)
+
+    def _retire(self, keep: List[int]):
+
+        self._active = [self._active[i] for i in keep]
+        if not self._active:
+            self._past_key_values, self._attention_mask, self._next_tokens = None, None, None
+            return
+
+        index = torch.tensor(keep, device=self._attention_mask.device)
+        attention_mask = self._attention_mask.index_select(0, index)
+        # Drop the left padding columns that no remaining sequence needs
+        first_used = int((attention_mask.sum(dim=0) > 0).nonzero()[0])
+        self._attention_mask = attention_mask[:, first_used:]
+        self._past_key_values = tuple(
+            (k.index_select(0, index)[:, :, first_used:], v.index_select(0, index)[:, :, first_used:])
+            for k, v in self._past_key_values
+        )
+
+    def _is_finished(self, request: GenerationRequest, token_id: int) -> bool:
+        eos_token_ids = self.eos_token_id if isinstance(self.eos_token_id, list) else [self.eos_token_id]
+        return token_id in eos_token_ids or len(request.generated_ids) >= request.max_new_tokens or should_stop(request.stopping_criteria, request.generated_ids)
+
+
+class SpeculativeDecoder:
+    """
+    Speculative decoding: a small draft causal LM that shares the target model's tokenizer proposes `num_draft_tokens`
+    tokens, which the target model verifies in a single forward pass. Under greedy decoding the output is identical to
+    the target model's own greedy output; under sampling, draft tokens are accepted by rejection sampling so that the
+    output follows the target model's distribution.
+
+    The acceptance statistics of the last generation of the calling thread and the running totals are kept in
+    `last_stats` and `stats`, so that concurrent requests read their own statistics.
+    """
+
+    def __init__(self, model, draft_model, num_draft_tokens: int = 4, eos_token_id: Optional[int] = None, prefix_cache: Optional[PrefixCache] = None):
+        """
+        :param model: The target causal LM whose output is reproduced.
+        :param draft_model: Small causal LM with the same vocabulary as the target model.
+        :param num_draft_tokens: Number of tokens the draft model proposes per verification step.
+        :param eos_token_id: Token that ends a sequence. Defaults to the target model's generation config.
+        :param prefix_cache: Cache of a constant prompt prefix reused when prefilling matching prompts with the target model.
+        """
+        self.model = model
+        self.draft_model = draft_model
+        self.num_draft_tokens = num_draft_tokens
+        self.eos_token_id = eos_token_id if eos_token_id is not None else model.generation_config.eos_token_id
+        self.prefix_cache = prefix_cache
+        # The embedding matrices may be padded differently; only the shared vocabulary is compared
+        self.vocab_size = min(model.config.vocab_size, draft_model.config.vocab_size)
+
+        self.stats = {"generated_tokens": 0, "drafted_tokens": 0, "accepted_tokens": 0, "target_forward_passes": 0}
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def last_stats(self) -> Dict[str, Any]:
+        """Statistics of the last generation of the calling thread"""
+        return getattr(self._local, "last_stats", {})
+
+    @staticmethod
+    def summarize(stats: Dict[str, int]) -> Dict[str, float]:
+        """Acceptance rate of the drafted tokens and generated tokens per target forward pass (the speedup upper bound)"""
+        return {
+            **stats,
+            "acceptance_rate": stats["accepted_tokens"] / stats["drafted_tokens"] if stats["drafted_tokens"] else 0.0,
+            "tokens_per_target_forward": stats["generated_tokens"] / stats["target_forward_passes"] if stats["target_forward_passes"] else 0.0,
+        }
+
+    @torch.inference_mode()
+    def generate(self, input_ids: torch.Tensor, max_new_tokens: int = 100, do_sample: bool = False, temperature: float = 1.0, top_p: float = 1.0,
+                 stopping_criteria: Optional[List[SentenceStoppingCriteria]] = None) -> torch.Tensor:
+        """Generate from the prompt ids (shape [1, prompt_length]). Returns only the new tokens, like `PrefixCache.generate`."""
+
+        input_ids = input_ids.to(self.model.device)
+        stats = {"generated_tokens": 0, "drafted_tokens": 0, "accepted_tokens": 0, "target_forward_passes": 1}
+        eos_token_ids = self.eos_token_id if isinstance(self.eos_token_id, list) else [self.eos_token_id]
+
+        # Prefill both models. Invariant: each cache covers all tokens except its `pending` tokens, which are fed next.
+        if self.prefix_cache is not None and self.prefix_cache.matches(input_ids):
+            n = self.prefix_cache.prefix_length
+            out = self.model(input_ids=input_ids[:, n:], past_key_values=self.prefix_cache.get_cache(), use_cache=True,
+                             position_ids=torch.arange(n, input_ids.shape[1], device=input_ids.device).unsqueeze(0))
+        else:
+            out = self.model(input_ids=input_ids, use_cache=True)
+        target_past = _to_legacy_cache(out.past_key_values)
+        draft_past = None
+        draft_pending = input_ids[0].tolist()
+
+        generated = [sample_next_token(out.logits[0, -1, :self.vocab_size], do_sample, temperature, top_p)]
+        stopped = should_stop(stopping_criteria, generated)
+        while len(generated) < max_new_tokens and generated[-1] not in eos_token_ids and not stopped:
+            k = min(self.num_draft_tokens, max_new_tokens - len(generated))
+            draft_pending.append(generated[-1])
+
+            # Draft k tokens autoregressively with the draft model
+            drafted, draft_probs = [], []
+            for _ in range(k):
+                draft_out = self.draft_model(input_ids=torch.tensor([draft_pending], device=self.draft_model.device),
+                                             past_key_values=_as_cache(draft_past), use_cache=True)
+                draft_past = _to_legacy_cache(draft_out.past_key_values)
+                logits = draft_out.logits[0, -1, :self.vocab_size].to(input_ids.device)
+                if do_sample:
+                    probs = next_token_probs(logits, temperature, top_p)
+                    token_id = int(torch.multinomial(probs, num_samples=1))
+                    draft_probs.append(probs)
+                else:
+                    token_id = int(torch.argmax(logits, dim=-1))
+                drafted.append(token_id)
+                draft_pending = [token_id]
+
+            # Verify the last accepted token and the k drafted tokens in one target forward pass
+            verify_ids = torch.tensor([[generated[-1]] + drafted], device=input_ids.device)
+            out = self.model(input_ids=verify_ids, past_key_values=_as_cache(target_past), use_cache=True)
+            target_past = _to_legacy_cache(out.past_key_values)
+            target_logits = out.logits[0, :, :self.vocab_size]
+            stats["target_forward_passes"] += 1
+            stats["drafted_tokens"] += k
+
+            num_accepted, next_token = self._verify(drafted, draft_probs, target_logits, do_sample, temperature, top_p)
+            accepted = drafted[:num_accepted]
+            for i, token_id in enumerate(accepted):
+                if token_id in eos_token_ids:
+                    accepted, next_token = accepted[:i], token_id
+                    break
+            stats["accepted_tokens"] += len(accepted)
+            new_tokens = accepted + [next_token]
+            if stopping_criteria:
+                # Stop at the first new token after which the stopping criteria are met
+                for i in range(len(new_tokens)):
+                    if should_stop(stopping_criteria, generated + new_tokens[:i + 1]):
+                        new_tokens, stopped = new_tokens[:i + 1], True
+                        break
+            generated.extend(new_tokens)
+
+            # Drop the cache entries of the rejected draft tokens
+            cache_length = input_ids.shape[1] + len(generated) - 1
+            target_past = _crop_cache(target_past, cache_length)
+            if len(accepted) == k:
+                # the draft cache lacks the last drafted token
+                draft_pending = [drafted[-1]]
+            else:
+                draft_past = _crop_cache(draft_past, cache_length)
+                draft_pending = []
+
+        generated = generated[:max_new_tokens]
+        stats["generated_tokens"] = len(generated)
+        self._local.last_stats = self.summarize(stats)
+        with self._stats_lock:
+            for key, value in stats.items():
+                self.stats[key] += value
+
+        return torch.tensor([generated], dtype=torch.long)
+
+    @staticmethod
+    def _verify(drafted: List[int], draft_probs: List[torch.Tensor], target_logits: torch.Tensor, do_sample: bool, temperature: float, top_p: float):
+        """Number of accepted draft tokens and the target model's token that follows them (a correction or a bonus token)"""
+
+        if not do_sample:
+            target_ids = torch.argmax(target_logits, dim=-1).tolist()
+            num_accepted = 0
+            while num_accepted < len(drafted) and drafted[num_accepted] == target_ids[num_accepted]:
+                num_accepted += 1
+            return num_accepted, target_ids[num_accepted]
+
+        for i, token_id in enumerate(drafted):
+            p = next_token_probs(target_logits[i], temperature, top_p)
+            q = draft_probs[i]
+            if torch.rand(()) * q[token_id] > p[token_id]:
+                # Rejected: sample from the residual distribution max(0, p - q)
+                residual = torch.clamp(p - q, min=0.0)
+                residual = residual / residual.sum() if residual.sum() > 0 else p
+                return i, int(torch.multinomial(residual, num_samples=1))
+        return len(drafted), int(torch.multinomial(next_token_probs(target_logits[-1], temperature, top_p), num_samples=1))
+
+
+def _as_cache(past_key_values):
+    if past_key_values is not None and DynamicCache is not None:
+        return DynamicCache.from_legacy_cache(past_key_values)
+    return past_key_values
+
+def _crop_cache(past_key_values, length: int):
+    return tuple((k[:, :, :length], v[:, :, :length]) for k, v in past_key_values)
+
+def _to_legacy_cache(past_key_values):
+    if hasattr(past_key_values, "to_legacy_cache"):
+        return past_key_values.to_legacy_cache()
+    return past_key_values
+
+def _merge_left_padded(past_a, mask_a, past_b, mask_b):
+    """Concatenate two batched key/value caches along the batch dimension, left-padding the shorter one"""
+
+    length = max(mask_a.shape[1], mask_b.shape[1])
+
+    def pad(past, mask):
+        pad_len = length - mask.shape[1]
+        if pad_len == 0:
+            return past, mask
+        past = tuple((F.pad(k, (0, 0, pad_len, 0)), F.pad(v, (0, 0, pad_len, 0))) for k, v in past)
+        return past, F.pad(mask, (pad_len, 0))
+
+    past_a, mask_a = pad(past_a, mask_a)
+    past_b, mask_b = pad(past_b, mask_b)
+    past = tuple((torch.cat([ka, kb], dim=0), torch.cat([va, vb], dim=0)) for (ka, va), (kb, vb) in zip(past_a, past_b))
+    return past, torch.cat([mask_a, mask_b], dim=0)
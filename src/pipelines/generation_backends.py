@@ -0,0 +1,134 @@
+from typing import Optional
+from abc import ABC, abstractmethod
+import logging
+
+import torch
+from transformers import AutoModelForCausalLM
+
+from pipelines.generation import should_stop
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationBackend(ABC):
+    """
+    Runtime that loads the Generator's causal LM and decodes tokens from prompt token ids.
+
+    Backends that expose a transformers `model` support the prefix cache, the batching scheduler and speculative
+    decoding of the Generator; the others only implement `generate`.
+    """
+
+    name = None
+    model = None
+
+    @abstractmethod
+    def generate(self, input_ids: torch.Tensor, max_new_tokens: int = 100, do_sample: bool = False, temperature: float = 1.0, top_p: float = 1.0,
+                 stopping_criteria=None) -> torch.Tensor:
+        """
+        Generate from the prompt ids (shape [1, prompt_length]). Returns only the new tokens, of shape [1, num_new_tokens].
+        `stopping_criteria` is a transformers StoppingCriteriaList of SentenceStoppingCriteria.
+        """
+        pass
+
+
+class TransformersBackend(GenerationBackend):
+    """transformers causal LM, loaded with the given `from_pretrained` arguments"""
+
+    name = "transformers"
+
+    def __init__(self, model_name_or_path: str, **model_kwargs):
+        self.model = AutoModelForCausalLM.from_pretrained(model_name_or_path, **model_kwargs).eval()
+        # Disable Tensor Parallelism
+        self.model.config.pretraining_tp = 1
+
+    def generate(self, input_ids: torch.Tensor, **generation_kwargs) -> torch.Tensor:
+        input_ids = input_ids.to(self.model.device)
+        with torch.inference_mode():
+            output_ids = self.model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), **generation_kwargs)
+        return output_ids[:, input_ids.shape[1]:]
+
+
+class GPUBackend(TransformersBackend):
+    """4-bit NF4 bitsandbytes quantization dispatched over the available GPUs"""
+
+    name = "gpu"
+
+    def __init__(self, model_name_or_path: str):
+        from transformers import BitsAndBytesConfig
+
+        bnb_config = BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_use_double_quant=True,
+            bnb_4bit_quant_type="nf4",
+            bnb_4bit_compute_dtype=torch.bfloat16
+        )
+        super().__init__(model_name_or_path, quantization_config=bnb_config, device_map="auto")
+
+
+class CPUBackend(TransformersBackend):
+    """CPU inference with int8 weights: the linear layers are dynamically quantized with torch"""
+
+    name = "cpu"
+
+    def __init__(self, model_name_or_path: str, num_threads: Optional[int] = None, quantize: bool = True):
+        """
+        :param model_name_or_path: transformers causal LM.
+        :param num_threads: Number of torch intra-op threads. None keeps the torch default.
+        :param quantize: Quantize the weights of the linear layers to int8. Otherwise the model runs in float32.
+        """
+        if num_threads:
+            torch.set_num_threads(num_threads)
+        super().__init__(model_name_or_path, torch_dtype=torch.float32, low_cpu_mem_usage=True)
+        if quantize:
+            torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+class LlamaCppBackend(GenerationBackend):
+    """
+    GGUF model (e.g. a Q4_K_M conversion of the Generator's model) run with llama-cpp-python on CPU.
+    The prompt is tokenized with the transformers tokenizer, so the GGUF model must share its vocabulary.
+    """
+
+    name = "llama_cpp"
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = None, n_ctx: int = 4096):
+        """
+        :param model_path: Path of the .gguf model file.
+        :param num_threads: Number of llama.cpp threads. None lets llama.cpp choose.
+        :param n_ctx: Context window in tokens.
+        """
+        try:
+            from llama_cpp import Llama
+        except ImportError as e:
+            raise ImportError("The llama_cpp generation backend requires llama-cpp-python: pip install llama-cpp-python") from e
+
+        self.llm = Llama(model_path=model_path, n_threads=num_threads, n_ctx=n_ctx, verbose=False)
+
+    def generate(self, input_ids: torch.Tensor, max_new_tokens: int = 100, do_sample: bool = False, temperature: float = 1.0, top_p: float = 1.0,
+                 stopping_criteria=None) -> torch.Tensor:
+
+        # top_k=0 disables llama.cpp's default top-k filtering; temp=0 is greedy decoding
+        sampling = {"temp": temperature, "top_p": top_p, "top_k": 0} if do_sample else {"temp": 0.0}
+        generated = []
+        # llama.cpp reuses the evaluated tokens that the new prompt shares with the previous one (e.g. the system prompt)
+        for token_id in self.llm.generate(input_ids[0].tolist(), **sampling):
+            if token_id == self.llm.token_eos():
+                break
+            generated.append(token_id)
+            if len(generated) >= max_new_tokens or should_stop(stopping_criteria, generated):
+                break
+        return torch.tensor([generated], dtype=torch.long)
+
+
+def load_backend(backend: str, model_name_or_path: str, num_threads: Optional[int] = None, gguf_path: Optional[str] = None) -> GenerationBackend:
+    """Build the generation backend selected by name: "gpu", "cpu" or "llama_cpp" """
+
+    if backend == "gpu":
+        return GPUBackend(model_name_or_path)
+    if backend == "cpu":
+        return CPUBackend(model_name_or_path, num_threads=num_threads)
+    if backend == "llama_cpp":
+        if gguf_path is None:
+            raise ValueError("The llama_cpp generation backend requires the path of a .gguf model file.")
+        return LlamaCppBackend(gguf_path, num_threads=num_threads)
+    raise ValueError(f"Unknown generation backend '{backend}'. Choose one of 'gpu', 'cpu', 'llama_cpp'.")
@@ -0,0 +1,177 @@
+from typing import Dict, Iterable, List, Optional, Set
+import hashlib
+import logging
+
+from haystack.schema import Document
+from haystack.nodes.base import BaseComponent
+from haystack.document_stores import BaseDocumentStore
+
+from pipelines.near_duplicates import NEAR_DUPLICATE_SOURCES_META_FIELD
+
+logger = logging.getLogger(__name__)
+
+CONTENT_HASH_META_FIELD = "content_hash"
+SOURCE_META_FIELD = "source"
+# Id of the last indexing run that wrote or found a passage (see ChangedPassagesFilter.run)
+INDEXING_RUN_META_FIELD = "indexing_run"
+
+
+def get_content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def get_passage_id(source: str, content_hash: str) -> str:
+    """Id of a passage: the same content gets the same id within a source file, and a different one in another file"""
+    return hashlib.sha256(f"{source}\n{content_hash}".encode("utf-8")).hexdigest()[:32]
+
+
+class ChangedPassagesFilter(BaseComponent):
+    """
+    Skip the preprocessed passages that the document store already holds, so that only new or changed passages are
+    embedded and written.
+
+    Every passage gets an id derived from its content hash and its source file (`meta["source"]`), and the ids are
+    looked up in the document store in bulk. Once the passages of a source have been indexed, the stored passages of
+    that source that it no longer produces are deleted. A source indexed in parts (e.g. a streamed file) is indexed
+    under a run id instead, which is stored with its passages, and the passages of the source that the run did not
+    store are deleted at its end (see `remove_stale_documents`). Passages without a source are never deleted. A dropped passage
+    that near-duplicates of other sources were linked to (see `NearDuplicateFilter`) is handed over to the first of
+    these sources instead, so that their text stays indexed until they are indexed again themselves.
+
+    Passages indexed before incremental indexing have haystack's default id (a hash of the content) and no
+    `content_hash` meta field. The stored copies of the passages being indexed are deleted, so they are not duplicated;
+    old passages whose content changed since cannot be matched to their source and stay until the index is rebuilt.
+    """
+
+    outgoing_edges = 1
+
+    def __init__(self, document_store: BaseDocumentStore, batch_size: int = 1000):
+        """
+        :param document_store: Document store the passages are written to.
+        :param batch_size: Number of ids looked up per document store request.
+        """
+        super().__init__()
+        self.document_store = document_store
+        self.batch_size = batch_size
+
+    def assign_ids(self, documents: List[Document]):
+        for doc in documents:
+            doc.meta = doc.meta or {}
+            doc.meta[CONTENT_HASH_META_FIELD] = get_content_hash(doc.content)
+            doc.id = get_passage_id(doc.meta.get(SOURCE_META_FIELD, ""), doc.meta[CONTENT_HASH_META_FIELD])
+
+    def get_existing_ids(self, ids: List[str], index: Optional[str] = None) -> Set[str]:
+        """The ids that the document store holds"""
+
+        existing = set()
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start : start + self.batch_size]
+            existing.update(doc.id for doc in self.document_store.get_documents_by_id(ids=batch, index=index, batch_size=self.batch_size))
+        return existing
+
+    def remove_legacy_documents(self, documents: List[Document], index: Optional[str] = None) -> List[str]:
+        """Delete the stored copies of the documents that were indexed with the default content hash id. Returns the deleted ids."""
+
+        legacy_ids = list({Document(content=doc.content, content_type=doc.content_type).id for doc in documents})
+        stored = []
+        for start in range(0, len(legacy_ids), self.batch_size):
+            batch = legacy_ids[start : start + self.batch_size]
+            stored.extend(self.document_store.get_documents_by_id(ids=batch, index=index, batch_size=self.batch_size))
+        removed = [doc.id for doc in stored if CONTENT_HASH_META_FIELD not in (doc.meta or {})]
+        if removed:
+            self.document_store.delete_documents(index=index, ids=removed)
+            logger.info(f"Removed {len(removed)} passages indexed before incremental indexing, to be written with their source")
+        return removed
+
+    def mark_indexing_run(self, ids: List[str], run_id: str, index: Optional[str] = None):
+        """Store the run id with the stored passages: one update by query per batch on Elasticsearch, one update per passage otherwise"""
+
+        client = getattr(self.document_store, "client", None)
+        for start in range(0, len(ids), self.batch_size):
+            batch = ids[start : start + self.batch_size]
+            if hasattr(client, "update_by_query"):
+                client.update_by_query(
+                    index=index or self.document_store.index, conflicts="proceed", refresh=True,
+                    body={"query": {"ids": {"values": batch}},
+                          "script": {"source": f"ctx._source.{INDEXING_RUN_META_FIELD} = params.run_id", "params": {"run_id": run_id}}},
+                    )
+            else:
+                for id in batch:
+                    self.document_store.update_document_meta(id=id, meta={INDEXING_RUN_META_FIELD: run_id}, index=index)
+
+    def remove_dropped_documents(self, ids_by_source: Dict[str, Iterable[str]], index: Optional[str] = None) -> List[str]:
+        """Delete the stored passages of the sources that are not among their current ids. Returns the deleted ids."""
+
+        removed = []
+        for source, ids in ids_by_source.items():
+            if not source:
+                continue
+            ids = set(ids)
+            stored = self.document_store.get_all_documents_generator(
+                index=index, filters={SOURCE_META_FIELD: [source]}, return_embedding=False, batch_size=self.batch_size
+                )
+            removed.extend(self._remove(source, [doc for doc in stored if doc.id not in ids], index=index))
+        return removed
+
+    def remove_stale_documents(self, source: str, run_id: str, index: Optional[str] = None) -> List[str]:
+        """Delete the stored passages of the source that the run `run_id` did not store. Returns the deleted ids."""
+
+        if not source:
+            return []
+        stored = self.document_store.get_all_documents_generator(
+            index=index, filters={SOURCE_META_FIELD: [source], INDEXING_RUN_META_FIELD: {"$nin": [run_id]}},
+            return_embedding=False, batch_size=self.batch_size
+            )
+        return self._remove(source, list(stored), index=index)
+
+    def _remove(self, source: str, dropped: List[Document], index: Optional[str] = None) -> List[str]:
+        """Delete the dropped passages of the source, or hand them over to their linked near-duplicate sources. Returns the deleted ids."""
+
+        handed_over = [doc for doc in dropped if doc.meta.get(NEAR_DUPLICATE_SOURCES_META_FIELD)]
+        for doc in handed_over:
+            linked = doc.meta[NEAR_DUPLICATE_SOURCES_META_FIELD]
+            self.document_store.update_document_meta(
+                id=doc.id, meta={SOURCE_META_FIELD: linked[0], NEAR_DUPLICATE_SOURCES_META_FIELD: linked[1:]}, index=index
+                )
+        dropped_ids = [doc.id for doc in dropped if not doc.meta.get(NEAR_DUPLICATE_SOURCES_META_FIELD)]
+        if dropped_ids:
+            self.document_store.delete_documents(index=index, ids=dropped_ids)
+            logger.info(f"Removed {len(dropped_ids)} passages that {source} no longer contains")
+        if handed_over:
+            logger.info(f"Handed {len(handed_over)} passages that {source} no longer contains over to their linked near-duplicate sources")
+        return dropped_ids
+
+    def run(self, documents: List[Document], index: Optional[str] = None, remove_dropped: bool = True, run_id: Optional[str] = None):
+        """
+        :param remove_dropped: Delete the dropped passages of the sources of the documents. Disable it when the
+                               documents are only a part of their sources (e.g. a window of a streamed file).
+        :param run_id: Id of the indexing run the documents belong to. It is stored with the new and the unchanged
+                       passages, so that `remove_stale_documents` can delete the dropped ones at the end of the run.
+        """
+        self.assign_ids(documents)
+        # Unique ids: a passage repeated in a file is written once
+        unique = list({doc.id: doc for doc in documents}.values())
+        existing = self.get_existing_ids([doc.id for doc in unique], index=index)
+        changed = [doc for doc in unique if doc.id not in existing]
+        if run_id is not None:
+            for doc in changed:
+                doc.meta[INDEXING_RUN_META_FIELD] = run_id
+            self.mark_indexing_run(list(existing), run_id, index=index)
+
+        removed = self.remove_legacy_documents(changed, index=index)
+        if remove_dropped:
+            ids_by_source = {}
+            for doc in documents:
+                ids_by_source.setdefault(doc.meta.get(SOURCE_META_FIELD, ""), []).append(doc.id)
+            removed.extend(self.remove_dropped_documents(ids_by_source, index=index))
+
+        logger.info(f"{len(changed)} new or changed passages to index, {len(unique) - len(changed)} unchanged")
+
+        output = {
+            "documents": changed,
+            "unchanged_passages": len(unique) - len(changed),
+            "removed_ids": removed,
+        }
+        return output, "output_1"
+
+    def run_batch(self, documents: List[Document], index: Optional[str] = None, remove_dropped: bool = True, run_id: Optional[str] = None):
+        return self.run(documents=documents, index=index, remove_dropped=remove_dropped, run_id=run_id)
@@ -5,11 +5,22 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
 import logging
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
 
-from haystack.nodes import EmbeddingRetriever, PreProcessor
+from haystack.schema import Document
+from haystack.pipelines import Pipeline
 from transformers import AutoTokenizer
 from utils.file_type_classifier import init_file_to_doc_pipeline
 from document_store.initialize_document_store import document_store as DOCUMENT_STORE
+from pipelines.passage_tokenizer import PassageTokenizer
+from pipelines.preprocessor import BatchTokenChunker
+from pipelines.cached_embedding_retriever import CachedEmbeddingRetriever
+from pipelines.embedding_cache import DEFAULT_EMBEDDING_CACHE_DIR
+from pipelines.embedding_engine import PassageEmbeddingEngine
+from pipelines.incremental_indexing import ChangedPassagesFilter
+from pipelines.jsonl_streaming import index_jsonl_windows
+from pipelines.near_duplicates import NearDuplicateFilter
 
 
 logging.basicConfig(level=logging.INFO)
@@ -18,10 +29,34 @@ if DOCUMENT_STORE is None:
     raise ValueError("the imported document_store is None. Please make sure that the Elasticsearch service is properly launched")
 
 embedding_model = "panosgriz/covid_el_paraphrase-multilingual-MiniLM-L12-v2"
-retriever = EmbeddingRetriever(embedding_model=embedding_model, document_store=DOCUMENT_STORE, max_seq_len=128)
+# Tokenizers of the query time Ranker and Reader. Passages are pretokenized with them at index time if enabled.
+ranker_model = "amberoad/bert-multilingual-passage-reranking-msmarco"
+reader_model = "panosgriz/mdeberta-v3-base-squad2-covid-el_small"
+STORE_PASSAGE_TOKENS = os.getenv("STORE_PASSAGE_TOKENS", "false").lower() == "true"
+# Number of processes converting and preprocessing uploaded files. 1 converts them sequentially in the request thread.
+INDEXING_NUM_WORKERS = int(os.getenv("INDEXING_NUM_WORKERS", 1))
+# Number of lines of an uploaded .jsonl file indexed at a time (see index_jsonl_stream). 0 indexes .jsonl files as a whole.
+STREAMING_WINDOW_SIZE = int(os.getenv("STREAMING_WINDOW_SIZE", 1000))
+# Only embed and write the passages that the document store does not hold yet (see ChangedPassagesFilter)
+INCREMENTAL_INDEXING = os.getenv("INCREMENTAL_INDEXING", "true").lower() == "true"
+# Skip the passages that are near-duplicates of indexed ones (see NearDuplicateFilter): "link", "drop" or "off"
+NEAR_DUPLICATE_MODE = os.getenv("NEAR_DUPLICATE_MODE", "off").lower()
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0.8))
+# Persistent cache of passage embeddings, shared with the dev scripts. An empty value disables it.
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", DEFAULT_EMBEDDING_CACHE_DIR) or None
+# Number of CPU processes embedding the passages (see PassageEmbeddingEngine) and torch threads of each. 0 embeds them in this process.
+EMBEDDING_NUM_WORKERS = int(os.getenv("EMBEDDING_NUM_WORKERS", 0))
+EMBEDDING_THREADS_PER_WORKER = int(os.getenv("EMBEDDING_THREADS_PER_WORKER", 1))
+embedding_engine = PassageEmbeddingEngine(
+    embedding_model, max_seq_len=128, num_workers=EMBEDDING_NUM_WORKERS, threads_per_worker=EMBEDDING_THREADS_PER_WORKER
+    ) if EMBEDDING_NUM_WORKERS > 0 else None
+retriever = CachedEmbeddingRetriever(
+    embedding_model=embedding_model, document_store=DOCUMENT_STORE, max_seq_len=128,
+    embedding_cache_dir=EMBEDDING_CACHE_DIR, embedding_engine=embedding_engine
+    )
 tokenizer = AutoTokenizer.from_pretrained(embedding_model)
 
-preprocessor = PreProcessor(
+preprocessor = BatchTokenChunker(
     clean_empty_lines=True,
     split_by = "token",
     split_length=128,
@@ -31,9 +66,63 @@ preprocessor = PreProcessor(
 
 
 #DOCUMENT_STORE.recreate_index = True
-indexing_pipeline = init_file_to_doc_pipeline(custom_preprocessor=preprocessor)
+indexing_pipeline = init_file_to_doc_pipeline(custom_preprocessor=preprocessor, num_workers=INDEXING_NUM_WORKERS)
+
+passage_tokenizer = PassageTokenizer(tokenizer_names=[ranker_model, reader_model]) if STORE_PASSAGE_TOKENS else None
+changed_passages_filter = ChangedPassagesFilter(document_store=DOCUMENT_STORE) if INCREMENTAL_INDEXING else None
+near_duplicate_filter = NearDuplicateFilter(
+    document_store=DOCUMENT_STORE, threshold=NEAR_DUPLICATE_THRESHOLD, mode=NEAR_DUPLICATE_MODE
+    ) if NEAR_DUPLICATE_MODE != "off" else None
+
+def add_embedding_and_writing_nodes(pipeline: Pipeline, input_node: str = "Preprocessor") -> Pipeline:
+    """Update the document embeddings in the the document store using the encoding model specified in the retriever"""
+
+    last_node = input_node
+    if INCREMENTAL_INDEXING:
+        pipeline.add_node(component=changed_passages_filter, name="ChangedPassages", inputs=[last_node])
+        last_node = "ChangedPassages"
+    if near_duplicate_filter is not None:
+        pipeline.add_node(component=near_duplicate_filter, name="NearDuplicates", inputs=[last_node])
+        last_node = "NearDuplicates"
+    if STORE_PASSAGE_TOKENS:
+        pipeline.add_node(component=passage_tokenizer, name="PassageTokenizer", inputs=[last_node])
+        last_node = "PassageTokenizer"
+    pipeline.add_node(component=retriever, name = "DenseRetriever", inputs=[last_node])
+    pipeline.add_node(component=DOCUMENT_STORE, name= "DocumentStore", inputs=["DenseRetriever"])
+    return pipeline
+
+add_embedding_and_writing_nodes(indexing_pipeline)
+
+# Indexes already converted documents: run(documents=...)
+document_indexing_pipeline = Pipeline()
+document_indexing_pipeline.add_node(component=preprocessor, name="Preprocessor", inputs=["File"])
+add_embedding_and_writing_nodes(document_indexing_pipeline)
+
+# Indexes already preprocessed passages: run(documents=...)
+passage_indexing_pipeline = add_embedding_and_writing_nodes(Pipeline(), input_node="File")
+
 
-# Update the document embeddings in the the document store using the encoding model specified in the retriever
-indexing_pipeline.add_node(component=retriever, name = "DenseRetriever", inputs=["Preprocessor"])
-indexing_pipeline.add_node(component=DOCUMENT_STORE, name= "DocumentStore", inputs=["DenseRetriever"])
+def index_jsonl_stream(
+    file_path: Union[str, Path],
+    window_size: int = STREAMING_WINDOW_SIZE,
+    meta: Optional[dict] = None,
+    index: Optional[str] = None,
+    on_change: Optional[Callable[[List[str]], None]] = None
+    ) -> Dict:
+    """
+    Index a .jsonl file window by window with the document indexing pipeline (see index_jsonl_windows), so that memory
+    does not grow with the size of the file.
 
+    :param index: Document store index to write to. Defaults to the index of the document store.
+    :param on_change: Called with the ids of the written and of the removed passages.
+    :return: Number of lines, written, unchanged, near-duplicate and removed passages and windows of the file.
+    """
+    params = {}
+    if index is not None:
+        params["DocumentStore"] = {"index": index}
+    if near_duplicate_filter is not None:
+        params["NearDuplicates"] = {"index": index}
+    return index_jsonl_windows(
+        file_path, document_indexing_pipeline, window_size, meta=meta, params=params,
+        changed_passages_filter=changed_passages_filter, index=index, on_change=on_change
+        )
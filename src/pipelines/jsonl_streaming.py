@@ -0,0 +1,77 @@
+from typing import Callable, Dict, List, Optional, Union
+import logging
+import uuid
+from pathlib import Path
+
+from haystack.pipelines import Pipeline
+
+from pipelines.incremental_indexing import ChangedPassagesFilter, SOURCE_META_FIELD
+from utils.parallel_file_converter import documents_from_json_lines
+
+logger = logging.getLogger(__name__)
+
+
+def index_jsonl_windows(
+    file_path: Union[str, Path],
+    pipeline: Pipeline,
+    window_size: int,
+    meta: Optional[dict] = None,
+    params: Optional[dict] = None,
+    changed_passages_filter: Optional[ChangedPassagesFilter] = None,
+    index: Optional[str] = None,
+    on_change: Optional[Callable[[List[str]], None]] = None
+    ) -> Dict:
+    """
+    Index a .jsonl file window by window: every `window_size` lines are converted and run through `pipeline`
+    (run(documents=...)) before the next lines are read, so that memory does not grow with the size of the file.
+    With a `changed_passages_filter` (the "ChangedPassages" node of the pipeline), the passages are stored under a new
+    run id, and the passages of the source (`meta["source"]`) that the run did not store, i.e. that the file no longer
+    contains, are removed after the last window.
+
+    :param params: Params of the pipeline runs.
+    :param index: Document store index of the changed passages filter.
+    :param on_change: Called with the ids of the written and of the removed passages.
+    :return: Number of lines, written, unchanged, near-duplicate and removed passages and windows of the file.
+    """
+    params = dict(params or {})
+    run_id = uuid.uuid4().hex
+    if changed_passages_filter is not None:
+        # The dropped passages are only known once the whole file has been read
+        params["ChangedPassages"] = {"index": index, "remove_dropped": False, "run_id": run_id}
+    stats = {"file": Path(file_path).name, "lines": 0, "documents": 0, "unchanged": 0, "near_duplicates": 0, "removed": 0, "windows": 0}
+
+    def index_window(lines: List[str]):
+        documents = documents_from_json_lines(lines, meta)
+        if not documents:
+            return
+        result = pipeline.run(documents=documents, params=params)
+        written_ids = [doc.id for doc in result.get("documents", [])]
+        # Stored copies of the passages indexed before incremental indexing
+        removed_ids = result.get("removed_ids", [])
+        stats["documents"] += len(written_ids)
+        stats["unchanged"] += result.get("unchanged_passages", 0)
+        stats["near_duplicates"] += result.get("near_duplicates", 0)
+        stats["removed"] += len(removed_ids)
+        stats["windows"] += 1
+        if on_change is not None:
+            on_change(written_ids + removed_ids)
+
+    window = []
+    with open(file_path, "r", encoding="utf-8", errors="ignore") as fp:
+        for line in fp:
+            stats["lines"] += 1
+            window.append(line)
+            if len(window) >= window_size:
+                index_window(window)
+                window = []
+    index_window(window)
+
+    if changed_passages_filter is not None:
+        source = (meta or {}).get(SOURCE_META_FIELD, "")
+        removed_ids = changed_passages_filter.remove_stale_documents(source, run_id, index=index)
+        stats["removed"] += len(removed_ids)
+        if on_change is not None:
+            on_change(removed_ids)
+
+    logger.info(f"Indexed {stats['documents']} passages of {stats['lines']} lines of {stats['file']} in {stats['windows']} windows")
+    return stats
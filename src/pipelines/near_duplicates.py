@@ -0,0 +1,162 @@
+from typing import Dict, List, Optional, Set
+import hashlib
+import logging
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+from haystack.schema import Document
+from haystack.nodes.base import BaseComponent
+from haystack.document_stores import BaseDocumentStore
+
+logger = logging.getLogger(__name__)
+
+# LSH band keys of a passage, stored with it so that the LSH index lives in the document store index itself
+MINHASH_META_FIELD = "minhash_bands"
+# Sources whose near-duplicates of a passage were linked to it instead of being indexed
+NEAR_DUPLICATE_SOURCES_META_FIELD = "near_duplicate_sources"
+SOURCE_META_FIELD = "source"
+
+# Prime above 2**32 of the universal hash functions (a * x + b) % p of 32 bit shingle hashes
+_PRIME = 4294967311
+
+
+def get_shingles(text: str, size: int = 3) -> Set[int]:
+    """Hashes of the word n-grams of a text, lowercased and without accents"""
+
+    text = "".join(c for c in unicodedata.normalize("NFD", text.lower()) if unicodedata.category(c) != "Mn")
+    words = re.findall(r"\w+", text)
+    grams = [" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))] if words else []
+    return {zlib.crc32(gram.encode("utf-8")) for gram in grams}
+
+def jaccard(a: Set[int], b: Set[int]) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+class MinHasher:
+    """MinHash signatures of shingle sets, cut into LSH bands"""
+
+    def __init__(self, num_perm: int = 128, num_bands: int = 16, seed: int = 1):
+        if num_perm % num_bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of num_bands ({num_bands})")
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, _PRIME, size=num_perm, dtype=np.uint64)
+        self.num_bands = num_bands
+
+    def signature(self, shingles: Set[int]) -> np.ndarray:
+        hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        # a * x + b stays below 2**64 for 32 bit a, b and x
+        return ((np.outer(self.a, hashes) + self.b[:, None]) % _PRIME).min(axis=1)
+
+    def band_keys(self, shingles: Set[int]) -> List[str]:
+        """One key per band: passages that share a key are candidate near-duplicates"""
+
+        bands = self.signature(shingles).reshape(self.num_bands, -1)
+        return [f"{i:02x}{hashlib.blake2b(band.tobytes(), digest_size=8).hexdigest()}" for i, band in enumerate(bands)]
+
+
+class NearDuplicateFilter(BaseComponent):
+    """
+    Skip the passages that are near-duplicates of an indexed passage or of an earlier passage of the same run, so
+    that they are not embedded and stored.
+
+    Candidates are found with MinHash LSH: the band keys of every passage are stored in its `minhash_bands` meta
+    field and looked up in the document store with a terms filter. A candidate is a near-duplicate if the Jaccard
+    similarity of the word 3-grams of both passages is at least `threshold`. Stored passages of the same source are
+    not candidates, since they may be outdated versions of the passages being indexed.
+
+    In "link" mode the source of a skipped passage is added to the `near_duplicate_sources` meta field of the passage
+    it duplicates. In "drop" mode it is only skipped.
+    """
+
+    outgoing_edges = 1
+
+    def __init__(self, document_store: Optional[BaseDocumentStore], threshold: float = 0.8, mode: str = "link",
+                 num_perm: int = 128, num_bands: int = 16, batch_size: int = 100):
+        """
+        :param document_store: Document store the passages are written to. Without one, only the passages of the
+                               same run are compared.
+        :param threshold: Minimum Jaccard similarity of a near-duplicate.
+        :param mode: "link" or "drop".
+        :param batch_size: Number of passages whose candidates are looked up per document store request.
+        """
+        super().__init__()
+        if mode not in ("link", "drop"):
+            raise ValueError(f"Unknown near-duplicate mode '{mode}', use 'link' or 'drop'")
+        self.document_store = document_store
+        self.threshold = threshold
+        self.mode = mode
+        self.minhasher = MinHasher(num_perm=num_perm, num_bands=num_bands)
+        self.batch_size = batch_size
+
+    def get_stored_candidates(self, documents: List[Document], index: Optional[str] = None) -> Dict[str, Document]:
+        """The stored passages that share a band key with one of the documents, by id"""
+
+        candidates = {}
+        if self.document_store is None:
+            return candidates
+        for start in range(0, len(documents), self.batch_size):
+            keys = list({key for doc in documents[start:start + self.batch_size] for key in doc.meta[MINHASH_META_FIELD]})
+            if keys:
+                stored = self.document_store.get_all_documents(index=index, filters={MINHASH_META_FIELD: {"$in": keys}}, return_embedding=False)
+                candidates.update((doc.id, doc) for doc in stored)
+        return candidates
+
+    def run(self, documents: List[Document], index: Optional[str] = None):
+
+        shingles = {}
+        for doc in documents:
+            doc.meta = doc.meta or {}
+            shingles[doc.id] = get_shingles(doc.content)
+            doc.meta[MINHASH_META_FIELD] = self.minhasher.band_keys(shingles[doc.id]) if shingles[doc.id] else []
+
+        # Band key -> passages that are indexed or kept in this run
+        buckets: Dict[str, List[Document]] = {}
+        for candidate in self.get_stored_candidates(documents, index=index).values():
+            shingles[candidate.id] = get_shingles(candidate.content)
+            for key in candidate.meta.get(MINHASH_META_FIELD) or []:
+                buckets.setdefault(key, []).append(candidate)
+
+        kept, duplicates = [], []
+        kept_ids = set()
+        linked: Dict[str, Document] = {}
+        for doc in documents:
+            source = doc.meta.get(SOURCE_META_FIELD)
+            candidates = {c.id: c for key in doc.meta[MINHASH_META_FIELD] for c in buckets.get(key, [])
+                          if c.id != doc.id and (c.id in kept_ids or c.meta.get(SOURCE_META_FIELD) != source)}
+            similarities = {c_id: jaccard(shingles[doc.id], shingles[c_id]) for c_id in candidates}
+            best = max(similarities, key=similarities.get, default=None)
+            if best is not None and similarities[best] >= self.threshold:
+                duplicates.append(doc)
+                if self.mode == "link":
+                    canonical = candidates[best]
+                    sources = canonical.meta.setdefault(NEAR_DUPLICATE_SOURCES_META_FIELD, [])
+                    if source and source != canonical.meta.get(SOURCE_META_FIELD) and source not in sources:
+                        sources.append(source)
+                        linked[canonical.id] = canonical
+                continue
+            kept.append(doc)
+            kept_ids.add(doc.id)
+            for key in doc.meta[MINHASH_META_FIELD]:
+                buckets.setdefault(key, []).append(doc)
+
+        # Passages kept in this run are written with their links, stored ones are updated
+        for canonical in linked.values():
+            if canonical.id not in kept_ids:
+                self.document_store.update_document_meta(
+                    id=canonical.id, meta={NEAR_DUPLICATE_SOURCES_META_FIELD: canonical.meta[NEAR_DUPLICATE_SOURCES_META_FIELD]}, index=index
+                    )
+
+        logger.info(f"{len(duplicates)} near-duplicate passages skipped, {len(kept)} to index")
+
+        output = {
+            "documents": kept,
+            "near_duplicates": len(duplicates),
+            "near_duplicate_ids": [doc.id for doc in duplicates],
+        }
+        return output, "output_1"
+
+    def run_batch(self, documents: List[Document], index: Optional[str] = None):
+        return self.run(documents=documents, index=index)
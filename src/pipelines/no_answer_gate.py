@@ -0,0 +1,75 @@
+from typing import Dict, List, Optional
+import logging
+
+from haystack.schema import Document
+from haystack.nodes.base import BaseComponent
+
+logger = logging.getLogger(__name__)
+
+
+def pick_threshold(samples: List[Dict], max_answer_loss: float = 0.02) -> Dict:
+    """Highest threshold that loses at most `max_answer_loss` of the correctly answered questions"""
+
+    num_correct = sum(s["correct"] for s in samples)
+    curve = []
+    best = {"threshold": 0.0, "answer_loss": 0.0, "skipped": 0.0}
+
+    for threshold in sorted({s["top_ranker_score"] for s in samples}):
+        skipped = [s for s in samples if s["top_ranker_score"] < threshold]
+        lost = sum(s["correct"] for s in skipped)
+        point = {
+            "threshold": threshold,
+            "answer_loss": lost / num_correct if num_correct else 0.0,
+            "skipped": len(skipped) / len(samples),
+            # how often the Reader would have failed anyway on the skipped questions
+            "skipped_wrong": (len(skipped) - lost) / len(skipped) if skipped else 0.0,
+        }
+        curve.append(point)
+        if point["answer_loss"] <= max_answer_loss:
+            best = point
+
+    return {"chosen": best, "max_answer_loss": max_answer_loss, "num_questions": len(samples), "num_correct": num_correct, "curve": curve}
+
+
+class NoAnswerGate(BaseComponent):
+    """
+    Decision node placed between the Ranker and the Reader.
+    If the best (scaled) ranker score of the candidate documents is below a calibrated threshold, the query is answered
+    with an empty answer list right away (output_2, which is left unconnected) and the Reader is skipped.
+    Otherwise the documents are passed on to the Reader (output_1).
+
+    The threshold can be picked from evaluation data with `dev/evaluation/calibrate_no_answer_threshold.py` (see pick_threshold).
+    """
+    outgoing_edges = 2
+
+    def __init__(self, threshold: Optional[float] = None):
+        """
+        :param threshold: Minimum top ranker score for a query to reach the Reader. None disables the gate.
+        """
+        super().__init__()
+        self.threshold = threshold
+
+    def is_answerable(self, documents: List[Document], threshold: Optional[float] = None) -> bool:
+        """Check whether the best ranked document scores above the threshold"""
+
+        threshold = self.threshold if threshold is None else threshold
+        if threshold is None:
+            return True
+        scores = [doc.score for doc in documents if doc.score is not None]
+        return bool(scores) and max(scores) >= threshold
+
+    def run(self, query: str, documents: List[Document], threshold: Optional[float] = None):
+
+        if self.is_answerable(documents, threshold):
+            return {"documents": documents}, "output_1"
+
+        logger.info(f"No candidate document scores above the no-answer threshold for query: {query}. Skipping the Reader.")
+        return {"documents": documents, "answers": []}, "output_2"
+
+    def run_batch(self, queries: List[str], documents: List[List[Document]], threshold: Optional[float] = None):
+
+        # A batch can only be routed to a single edge; skip the Reader only if none of the queries is answerable
+        if any(self.is_answerable(docs, threshold) for docs in documents):
+            return {"documents": documents}, "output_1"
+
+        return {"documents": documents, "answers": [[] for _ in documents]}, "output_2"
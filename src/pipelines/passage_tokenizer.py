@@ -0,0 +1,83 @@
+from typing import List, Dict, Optional
+import logging
+import re
+
+from haystack.schema import Document
+from haystack.nodes.base import BaseComponent
+from transformers import AutoTokenizer
+from haystack.modeling.model.feature_extraction import _get_start_of_word_QA
+
+logger = logging.getLogger(__name__)
+
+# Meta field under which the token data of every tokenizer is stored
+PRETOKENIZED_META_FIELD = "pretokenized"
+
+
+def get_tokenizer_key(tokenizer_name: str) -> str:
+    """Turn a tokenizer name (e.g. a HF hub id) into a key that is safe to use as a document store field name."""
+    return re.sub(r"\W", "_", str(tokenizer_name))
+
+def tokenize_passages(tokenizer, texts: List[str]) -> List[Dict[str, List[int]]]:
+    """
+    Tokenize passages exactly like the query time components do (no special tokens added).
+    For each passage return the token ids, the character offset where each token starts and the start-of-word flags
+    expected by the FARM question answering processor.
+    """
+    encoded = tokenizer(
+        texts, return_offsets_mapping=True, add_special_tokens=False, truncation=False, verbose=False
+    )
+    tokenized = []
+    for i, input_ids in enumerate(encoded["input_ids"]):
+        tokenized.append({
+            "input_ids": list(input_ids),
+            "offsets": [int(offset[0]) for offset in encoded["offset_mapping"][i]],
+            "start_of_word": [int(flag) for flag in _get_start_of_word_QA(encoded.encodings[i].words)]
+        })
+    return tokenized
+
+def get_pretokenized(document: Document, tokenizer_name: str) -> Optional[Dict[str, List[int]]]:
+    """Return the token data stored with a document at index time for the given tokenizer, if any."""
+    pretokenized = (document.meta or {}).get(PRETOKENIZED_META_FIELD)
+    if not isinstance(pretokenized, dict):
+        return None
+    return pretokenized.get(get_tokenizer_key(tokenizer_name))
+
+
+class PassageTokenizer(BaseComponent):
+    """
+    Tokenize preprocessed passages once at index time with the tokenizers of the query time components (ranker, reader)
+    and store the token data in the documents' meta, so that these components do not need to re-tokenize passage text
+    on every query that retrieves them.
+    """
+    outgoing_edges = 1
+
+    def __init__(self, tokenizer_names: List[str], batch_size: int = 256):
+        """
+        :param tokenizer_names: Names or paths of the (fast) tokenizers to pretokenize passages with.
+        :param batch_size: Number of passages to tokenize at a time.
+        """
+        super().__init__()
+        self.batch_size = batch_size
+        self.tokenizers = {name: AutoTokenizer.from_pretrained(name) for name in tokenizer_names}
+
+    def run(self, documents: List[Document]):
+
+        for start in range(0, len(documents), self.batch_size):
+            batch = documents[start : start + self.batch_size]
+            texts = [doc.content for doc in batch]
+            for name, tokenizer in self.tokenizers.items():
+                for doc, tokenized in zip(batch, tokenize_passages(tokenizer, texts)):
+                    if doc.meta is None:
+                        doc.meta = {}
+                    doc.meta.setdefault(PRETOKENIZED_META_FIELD, {})[get_tokenizer_key(name)] = tokenized
+
+        logger.info(f"Pretokenized {len(documents)} passages with {len(self.tokenizers)} tokenizer(s)")
+
+        return {"documents": documents}, "output_1"
+
+    def run_batch(self, documents: List[List[Document]]):
+
+        for docs in documents:
+            self.run(documents=docs)
+
+        return {"documents": documents}, "output_1"
@@ -0,0 +1,145 @@
+from typing import List, Optional, Tuple, Union
+import logging
+
+from haystack import __version__ as haystack_version
+from haystack.nodes import PreProcessor
+from haystack.schema import Document
+from tqdm import tqdm
+from transformers import PreTrainedTokenizerFast
+
+from utils.sentence_segmentation import get_sentence_segmenter
+
+logger = logging.getLogger(__name__)
+
+# BatchTokenChunker reproduces the token splitting of this haystack version (pinned in requirements.txt)
+BATCH_TOKEN_CHUNKER_HAYSTACK_VERSION = "1.25.5"
+
+
+class SentencePreProcessor(PreProcessor):
+    """
+    haystack PreProcessor that splits sentences with the shared offline segmenter (utils.sentence_segmentation)
+    instead of nltk's punkt model, for `split_by="sentence"` and `split_respect_sentence_boundary=True`.
+    """
+
+    def __init__(self, language: str = "el", **kwargs):
+        super().__init__(language=language, **kwargs)
+        self.sentence_segmenter = get_sentence_segmenter(language)
+
+    def _split_sentences(self, text: str) -> List[str]:
+        # haystack joins the sentences back into passages, so their whitespace is kept
+        return self.sentence_segmenter.split_preserving_whitespace(text)
+
+
+class BatchTokenChunker(SentencePreProcessor):
+    """
+    SentencePreProcessor that splits a batch of documents by tokens with one call to a fast (Rust) HuggingFace
+    tokenizer, instead of one Python tokenizer call per sentence.
+
+    haystack counts the tokens of every sentence tokenized on its own, so the sentences of all documents are
+    tokenized together in one batch and packed into passages in one pass with the same rule. The passages, their
+    boundaries and meta are identical to the ones of SentencePreProcessor. Other configurations (split overlap, other
+    split units, slow tokenizers) are split by SentencePreProcessor.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if haystack_version != BATCH_TOKEN_CHUNKER_HAYSTACK_VERSION:
+            logger.warning("BatchTokenChunker reproduces the splitting of haystack %s, not %s; documents are split by SentencePreProcessor.",
+                           BATCH_TOKEN_CHUNKER_HAYSTACK_VERSION, haystack_version)
+
+    def _process_batch(self, documents: List[Union[dict, Document]], id_hash_keys: Optional[List[str]] = None, **kwargs) -> List[Document]:
+
+        params = {name: value if value is not None else getattr(self, name) for name, value in kwargs.items()}
+        if not params.get("remove_substrings"):
+            params["remove_substrings"] = self.remove_substrings
+        if not self._is_batchable(params):
+            return super()._process_batch(documents, id_hash_keys=id_hash_keys, **kwargs)
+
+        cleaned_documents = [
+            self.clean(
+                document=document,
+                clean_whitespace=params["clean_whitespace"],
+                clean_header_footer=params["clean_header_footer"],
+                clean_empty_lines=params["clean_empty_lines"],
+                remove_substrings=params["remove_substrings"],
+                id_hash_keys=id_hash_keys,
+            )
+            for document in tqdm(documents, disable=not self.progress_bar, desc="Preprocessing", unit="docs")
+        ]
+        sentences = [self._split_sentences(doc.content) if isinstance(doc.content, str) else [] for doc in cleaned_documents]
+        token_counts = self._count_tokens([sen for doc_sentences in sentences for sen in doc_sentences], params["tokenizer"])
+
+        split_documents = []
+        position = 0
+        for document, doc_sentences in zip(cleaned_documents, sentences):
+            if not isinstance(document.content, str):
+                splits = self.split(document=document, split_by=params["split_by"], split_length=params["split_length"], split_overlap=0,
+                                    split_respect_sentence_boundary=True, tokenizer=params["tokenizer"], id_hash_keys=id_hash_keys)
+            else:
+                counts = token_counts[position:position + len(doc_sentences)]
+                position += len(doc_sentences)
+                text_splits, splits_pages, splits_start_idxs = self._pack_sentences(doc_sentences, counts, params["split_length"])
+                splits = self._create_docs_from_splits(
+                    text_splits=text_splits,
+                    splits_pages=splits_pages,
+                    splits_start_idxs=splits_start_idxs,
+                    headlines=document.meta.get("headlines", []),
+                    meta=document.meta or {},
+                    split_overlap=0,
+                    id_hash_keys=id_hash_keys if id_hash_keys is not None else self.id_hash_keys,
+                )
+            split_documents.extend(self._long_documents(splits, max_chars_check=self.max_chars_check))
+        return split_documents
+
+    @staticmethod
+    def _is_batchable(params: dict) -> bool:
+        return (haystack_version == BATCH_TOKEN_CHUNKER_HAYSTACK_VERSION and params["split_by"] == "token" and bool(params["split_length"]) and params["split_respect_sentence_boundary"]
+                and not params["split_overlap"] and isinstance(params["tokenizer"], PreTrainedTokenizerFast))
+
+    @staticmethod
+    def _count_tokens(sentences: List[str], tokenizer: PreTrainedTokenizerFast) -> List[int]:
+        """Number of tokens of every sentence tokenized on its own, as haystack's _split_tokens counts them"""
+
+        if not sentences:
+            return []
+        encodings = tokenizer(sentences, add_special_tokens=False, return_attention_mask=False, return_token_type_ids=False)
+        return [len(input_ids) for input_ids in encodings["input_ids"]]
+
+    def _pack_sentences(self, sentences: List[str], token_counts: List[int], split_length: int) -> Tuple[List[str], List[int], List[int]]:
+        """
+        Greedily pack the sentences into passages of at most `split_length` tokens, as haystack's
+        _split_into_units_respecting_sent_boundary does without overlap. Returns the passages, their pages and start indices.
+        """
+        if any(count > split_length for count in token_counts):
+            long_sentence_message = "We found one or more sentences whose split count is higher than the split length."
+            if long_sentence_message not in self.print_log:
+                self.print_log.add(long_sentence_message)
+                logger.warning(long_sentence_message)
+
+        splits, splits_pages, splits_start_idxs = [], [], []
+        current_slice: List[str] = []
+        slice_count = 0
+        cur_page = 1
+        cur_start_idx = 0
+        for sen, count in zip(sentences, token_counts):
+            if slice_count + count > split_length:
+                if current_slice:
+                    splits.append("".join(current_slice))
+                    splits_pages.append(cur_page)
+                    splits_start_idxs.append(cur_start_idx)
+                cur_start_idx += sum(len(s) for s in current_slice)
+                if self.add_page_number:
+                    cur_page += self._count_processed_page_breaks(
+                        sentences=current_slice, split_overlap=0, overlapping_sents=[], current_sent=sen
+                    )
+                current_slice = []
+                slice_count = 0
+            current_slice.append(sen)
+            slice_count += count
+
+        if current_slice:
+            splits.append("".join(current_slice))
+            splits_pages.append(cur_page)
+            splits_start_idxs.append(cur_start_idx)
+
+        return [txt for txt in splits if txt], splits_pages, splits_start_idxs
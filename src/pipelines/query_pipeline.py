@@ -0,0 +1,29 @@
+import os
+import sys
+import logging
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from haystack.pipelines import Pipeline
+
+from pipelines.retrieval import retrieval_pipeline
+from pipelines.extractive_qa_pipeline import reader, no_answer_gate
+from pipelines.rag_pipeline import context_builder, generator
+from pipelines.branching_pipeline import BranchingQueryPipeline
+
+logger = logging.getLogger(__name__)
+
+
+extractive_branch = Pipeline()
+extractive_branch.add_node(component=no_answer_gate, name="NoAnswerGate", inputs=["Query"])
+extractive_branch.add_node(component=reader, name="Reader", inputs=["NoAnswerGate.output_1"])
+
+generative_branch = Pipeline()
+generative_branch.add_node(component=context_builder, name="ContextBuilder", inputs=["Query"])
+generative_branch.add_node(component=generator, name="Generator", inputs=["ContextBuilder"])
+
+query_pipeline = BranchingQueryPipeline(
+    retrieval=retrieval_pipeline,
+    branches={"extractive": extractive_branch, "generative": generative_branch}
+    )
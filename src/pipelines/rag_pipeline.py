@@ -1,5 +1,6 @@
 
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Tuple, Iterator
+from concurrent.futures import ThreadPoolExecutor
 
 import os
 import sys
@@ -7,20 +8,45 @@ import sys
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
-from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
+from transformers import AutoModelForCausalLM, AutoTokenizer, StoppingCriteriaList
 import torch
 
 from haystack.pipelines import Pipeline
-from haystack.nodes import  PromptNode, PromptTemplate, AnswerParser, EmbeddingRetriever
 from haystack.nodes.base import BaseComponent
+from haystack.schema import Document, Answer
 
 from document_store.initialize_document_store import document_store as DOCUMENT_STORE
-from pipelines.ranker import SentenceTransformersRanker
+from pipelines.retrieval import retriever, ranker
+from pipelines.context_builder import ContextBuilder
+from pipelines.generation import PrefixCache, GenerationScheduler, SpeculativeDecoder, SentenceStoppingCriteria, render_prompt, encode_prompt
+from pipelines.generation_backends import load_backend
+from pipelines.answer_cache import AnswerCache, DEFAULT_ANSWER_CACHE_PATH
 from utils.data_handling_utils import post_process_generator_answers, remove_second_answers_occurrence
 
 if DOCUMENT_STORE is None:
     raise ValueError("the imported document_store is None. Please make sure that the Elasticsearch service is properly launched")
 
+# Causal LM of the Generator. A tiny model with a chat template can stand in for Meltemi in tests.
+GENERATOR_MODEL = os.getenv("GENERATOR_MODEL", "ilsp/Meltemi-7B-Instruct-v1")
+# Generation backend: "gpu" (4-bit bitsandbytes), "cpu" (int8 weights) or "llama_cpp" (GGUF model at GENERATOR_GGUF_PATH)
+GENERATOR_BACKEND = os.getenv("GENERATOR_BACKEND", "gpu")
+GENERATOR_GGUF_PATH = os.getenv("GENERATOR_GGUF_PATH")
+GENERATOR_NUM_THREADS = int(os.environ["GENERATOR_NUM_THREADS"]) if "GENERATOR_NUM_THREADS" in os.environ else None
+# Maximum number of document tokens (Meltemi tokenizer) in the Generator's prompt. Unset passes all ranked documents.
+CONTEXT_TOKEN_BUDGET = int(os.environ["CONTEXT_TOKEN_BUDGET"]) if "CONTEXT_TOKEN_BUDGET" in os.environ else None
+# Drop sentences with a lower bi-encoder similarity to the query from the prompt documents. Unset disables compression.
+CONTEXT_MIN_SENTENCE_SIMILARITY = float(os.environ["CONTEXT_MIN_SENTENCE_SIMILARITY"]) if "CONTEXT_MIN_SENTENCE_SIMILARITY" in os.environ else None
+# Maximum number of concurrent /rag-query generations decoded in one batch. Unset generates one request at a time.
+GENERATOR_MAX_BATCH_SIZE = int(os.environ["GENERATOR_MAX_BATCH_SIZE"]) if "GENERATOR_MAX_BATCH_SIZE" in os.environ else None
+# Small causal LM with Meltemi's tokenizer that drafts tokens for speculative decoding. Unset disables speculative decoding.
+GENERATOR_DRAFT_MODEL = os.environ["GENERATOR_DRAFT_MODEL"] if "GENERATOR_DRAFT_MODEL" in os.environ else None
+GENERATOR_NUM_DRAFT_TOKENS = int(os.environ["GENERATOR_NUM_DRAFT_TOKENS"]) if "GENERATOR_NUM_DRAFT_TOKENS" in os.environ else 4
+# Fraction of max_new_tokens after which generation stops at the next sentence end. Set to 1 to only stop on max_new_tokens.
+GENERATOR_SOFT_TOKEN_RATIO = float(os.getenv("GENERATOR_SOFT_TOKEN_RATIO", 0.5))
+# Persistent cache of generated answers. Set ANSWER_CACHE_MAX_ENTRIES=0 to disable it.
+ANSWER_CACHE_PATH = os.getenv("ANSWER_CACHE_PATH", DEFAULT_ANSWER_CACHE_PATH)
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 10000))
+
 import logging
 
 logging.basicConfig(format="%(levelname)s - %(name)s -  %(message)s", level=logging.WARNING)
@@ -34,71 +60,193 @@ class Generator(BaseComponent):
                 prompt_messages:List[Dict]=[
                      {"role": "system", "content": 'Χρησιμοποιώντας τις πληροφορίες που περιέχονται στο παρακάτω Κείμενο, δώσε μια ολοκληρωμένη απάντηση στην Ερώτηση. Εάν δεν μπορείς να απαντήσεις με βάση το Κείμενο, απάντα "Δεν γνωρίζω".'},
                      {"role": "user", "content": 'Ερώτηση: {query} | Κείμενο: {join(documents)} | Απάντηση: '}
-                     ]):
-        
-        self.model_name = "ilsp/Meltemi-7B-Instruct-v1"
-        self.model = load_model(self.model_name)
+                     ],
+                use_prefix_cache: bool = True,
+                max_batch_size: Optional[int] = None,
+                draft_model_name: Optional[str] = None,
+                num_draft_tokens: int = 4,
+                model_name: str = "ilsp/Meltemi-7B-Instruct-v1",
+                backend: str = "gpu",
+                num_threads: Optional[int] = None,
+                gguf_path: Optional[str] = None,
+                soft_token_ratio: float = 0.5,
+                answer_cache: Optional[AnswerCache] = None):
+
+        if max_batch_size and draft_model_name:
+            raise ValueError("Speculative decoding (draft_model_name) cannot be combined with the batching scheduler (max_batch_size).")
+
+        self.model_name = model_name
+        self.soft_token_ratio = soft_token_ratio
+        self.answer_cache = answer_cache
+        self.backend = load_backend(backend, model_name, num_threads=num_threads, gguf_path=gguf_path)
+        # None for backends that do not run a transformers model (llama_cpp)
+        self.model = self.backend.model
+        if self.model is None and (max_batch_size or draft_model_name):
+            raise ValueError(f"The {backend} generation backend supports neither the batching scheduler nor speculative decoding.")
         self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
         self.prompt = self.tokenizer.apply_chat_template(prompt_messages, add_generation_prompt=True, tokenize=False)
-        self.prompt_template = PromptTemplate(prompt = self.prompt,
-                                            output_parser=AnswerParser(pattern = r"(?<=<\|assistant\|>\n)([\s\S]*)"))
+        # Generation only prefills the tokens after the constant system instruction; its key/value cache is computed once here.
+        # The prefix ends at the last line break before the query so that its tokens do not merge with the query's.
+        prefix = self.prompt[:self.prompt.rindex("\n", 0, self.prompt.index("{query}")) + 1]
+        self.prefix_cache = PrefixCache.from_text(self.model, self.tokenizer, prefix) if use_prefix_cache and self.model is not None else None
+        # With a max_batch_size, concurrent requests are decoded together by a continuous batching scheduler
+        self.scheduler = GenerationScheduler(self.model, eos_token_id=self.tokenizer.eos_token_id, max_batch_size=max_batch_size, prefix_cache=self.prefix_cache) if max_batch_size else None
+        # With a draft model, tokens are proposed by the draft model and verified by Meltemi (speculative decoding)
+        self.speculative_decoder = None
+        if draft_model_name:
+            if AutoTokenizer.from_pretrained(draft_model_name).get_vocab() != self.tokenizer.get_vocab():
+                raise ValueError(f"The draft model {draft_model_name} must use the same tokenizer as {self.model_name}.")
+            draft_model = AutoModelForCausalLM.from_pretrained(draft_model_name, torch_dtype="auto").to(self.model.device).eval()
+            self.speculative_decoder = SpeculativeDecoder(self.model, draft_model, num_draft_tokens=num_draft_tokens,
+                                                          eos_token_id=self.tokenizer.eos_token_id, prefix_cache=self.prefix_cache)
 
         super().__init__()
 
-    def run(self, query, documents, max_new_tokens:int=100, temperature:float = 0.4, top_p:float = 0.5):
+    def generate(self, prompt: str, generation_kwargs: Dict[str, Any]) -> Tuple[str, int]:
+        """Generate the completion of a rendered prompt. Returns the completion and the number of generated tokens."""
+
+        input_ids = encode_prompt(self.tokenizer, prompt)
+        with torch.inference_mode():
+            if self.scheduler is not None:
+                output_ids = self.scheduler.generate(input_ids, **generation_kwargs)
+            elif self.speculative_decoder is not None:
+                output_ids = self.speculative_decoder.generate(input_ids, **generation_kwargs)
+            elif self.prefix_cache is not None:
+                output_ids = self.prefix_cache.generate(input_ids, **generation_kwargs)
+            else:
+                output_ids = self.backend.generate(input_ids, **generation_kwargs)
+
+        return self.tokenizer.decode(output_ids[0], skip_special_tokens=True).strip(), output_ids.shape[1]
+
+    def get_stopping_criteria(self, max_new_tokens: int, soft_max_new_tokens: Optional[int] = None) -> SentenceStoppingCriteria:
+        """Stop at a sentence end after the soft token budget (by default a fraction of max_new_tokens) or on the refusal answer"""
+        if soft_max_new_tokens is None:
+            soft_max_new_tokens = int(max_new_tokens * self.soft_token_ratio)
+        return SentenceStoppingCriteria(self.tokenizer, soft_max_new_tokens=soft_max_new_tokens)
+
+    def stream(self, query, documents, max_new_tokens:int=100, temperature:float = 0.4, top_p:float = 0.5, soft_max_new_tokens: Optional[int] = None,
+               do_sample: bool = True) -> Iterator[str]:
+        """Yield the answer text piece by piece as it is decoded. Requires the continuous batching scheduler."""
+
+        if self.scheduler is None:
+            raise ValueError("Streaming requires the Generator to be initialized with a max_batch_size.")
+
+        generation_kwargs = get_generation_kwargs(max_new_tokens=max_new_tokens, temperature=temperature, top_p=top_p, do_sample=do_sample)
+        generation_kwargs["stopping_criteria"] = StoppingCriteriaList([self.get_stopping_criteria(max_new_tokens, soft_max_new_tokens)])
+        input_ids = encode_prompt(self.tokenizer, render_prompt(self.prompt, query, documents))
+        request = self.scheduler.submit(input_ids, **generation_kwargs)
+
+        text = ""
+        for _ in request.stream():
+            # Decode the whole sequence so far; multi-byte characters may span several tokens
+            decoded = self.tokenizer.decode(request.generated_ids, skip_special_tokens=True)
+            if len(decoded) > len(text) and not decoded.endswith("\ufffd"):
+                yield decoded[len(text):]
+                text = decoded
+
+    def run(self, query, documents, max_new_tokens:int=100, temperature:float = 0.4, top_p:float = 0.5, soft_max_new_tokens: Optional[int] = None,
+            do_sample: bool = True):
         """"""
-        generation_kwargs={
-                            'max_new_tokens': max_new_tokens,
-                            'temperature': temperature,
-                            'do_sample': True,
-                            'top_p': top_p
-                            }
-        
-        generator = PromptNode(model_name_or_path = self.model_name,
-                               default_prompt_template = self.prompt_template,
-                               top_k= 1,
-                               model_kwargs = {
-            'model': self.model,
-            'tokenizer': self.tokenizer,
-            'task_name': 'text2text-generation',
-            'device': None,
-            "generation_kwargs": generation_kwargs
-        })
-
-
-        result, _ = generator.run(query=query, documents=documents)
-        
-        # Post-process answers to avoid incomplete text resulting from the max_new_tokens parameter
-        result = post_process_generator_answers(result)
+        generation_kwargs = get_generation_kwargs(max_new_tokens=max_new_tokens, temperature=temperature, top_p=top_p, do_sample=do_sample)
+
+        # Serve the answer of an earlier request with the same query, prompt documents and generation parameters
+        if self.answer_cache is not None:
+            cache_key = AnswerCache.make_key(query, documents, {
+                "model": self.model_name, "prompt": self.prompt, "soft_max_new_tokens": soft_max_new_tokens,
+                "soft_token_ratio": self.soft_token_ratio, **generation_kwargs
+            })
+            cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                answer = Answer.from_dict(cached)
+                answer.meta["cached"] = True
+                return {"results": [answer.answer], "answers": [answer]}, 'output_1'
+
+        stopping_criteria = self.get_stopping_criteria(max_new_tokens, soft_max_new_tokens)
+        generation_kwargs["stopping_criteria"] = StoppingCriteriaList([stopping_criteria])
+
+        prompt = render_prompt(self.prompt, query, documents)
+        answer, num_generated_tokens = self.generate(prompt, generation_kwargs)
+        if stopping_criteria.reason == "refusal":
+            answer = stopping_criteria.trim_refusal(answer)
+        # Upper bound of the tokens not decoded compared to decoding up to max_new_tokens
+        tokens_saved = max_new_tokens - num_generated_tokens if stopping_criteria.reason is not None else 0
+        meta = {"prompt": prompt, "generated_tokens": num_generated_tokens, "stop_reason": stopping_criteria.reason, "tokens_saved": tokens_saved}
+        if self.speculative_decoder is not None:
+            meta["speculative_decoding"] = self.speculative_decoder.last_stats
+        result = {
+            "results": [answer],
+            "answers": [Answer(answer=answer, type="generative", document_ids=[doc.id for doc in documents], meta=meta)]
+        }
+
+        # Fallback when decoding was not stopped at a sentence end: drop the incomplete text resulting from the max_new_tokens parameter
+        if stopping_criteria.reason is None:
+            result = post_process_generator_answers(result)
         result = remove_second_answers_occurrence(result)
-        
+
+        if self.answer_cache is not None:
+            self.answer_cache.put(cache_key, result["answers"][0].to_dict(), document_ids=[doc.id for doc in documents])
+
         return result, 'output_1'
     
-    def run_batch(
-        self):
-         return
-    
-def load_model (model_name):
-    """"""
-    bnb_config = BitsAndBytesConfig(
-    load_in_4bit=True,
-    bnb_4bit_use_double_quant=True,
-    bnb_4bit_quant_type="nf4",
-    bnb_4bit_compute_dtype=torch.bfloat16
+    def run_batch(self, queries: List[str], documents: Union[List[Document], List[List[Document]]], max_new_tokens:int=100, temperature:float = 0.4, top_p:float = 0.5,
+                  soft_max_new_tokens: Optional[int] = None, do_sample: bool = True):
+        """
+        Generate an answer for each query from its list of documents. A single query is applied to every list of documents.
+        With the batching scheduler (max_batch_size) all prompts are submitted at once and decoded together; otherwise
+        they are generated one after another.
+        """
+        if len(documents) > 0 and isinstance(documents[0], Document):
+            documents = [documents]
+        if len(queries) == 1:
+            queries = queries * len(documents)
+        if len(queries) != len(documents):
+            raise ValueError("Number of queries must be equal to number of provided Document lists.")
+
+        def run(query_and_documents):
+            query, docs = query_and_documents
+            result, _ = self.run(query=query, documents=docs, max_new_tokens=max_new_tokens, temperature=temperature, top_p=top_p, soft_max_new_tokens=soft_max_new_tokens, do_sample=do_sample)
+            return result["answers"]
+
+        if self.scheduler is not None and len(queries) > 1:
+            # Each thread waits for its request, so the scheduler admits up to max_batch_size of them into one decode batch
+            with ThreadPoolExecutor(max_workers=min(len(queries), self.scheduler.max_batch_size)) as executor:
+                answers = list(executor.map(run, zip(queries, documents)))
+        else:
+            answers = [run(query_and_documents) for query_and_documents in zip(queries, documents)]
+
+        return {"queries": queries, "answers": answers}, 'output_1'
+
+def get_generation_kwargs(max_new_tokens:int=100, temperature:float = 0.4, top_p:float = 0.5, do_sample: bool = True) -> Dict[str, Any]:
+    """Generation parameters passed to the model's generate() on every call. do_sample=False decodes greedily (temperature and top_p are then ignored)."""
+    return {
+        'max_new_tokens': max_new_tokens,
+        'temperature': temperature,
+        'do_sample': do_sample,
+        'top_p': top_p
+        }
+
+context_builder = ContextBuilder(
+    tokenizer_name_or_path=GENERATOR_MODEL,
+    token_budget=CONTEXT_TOKEN_BUDGET,
+    embedding_model="panosgriz/covid_el_paraphrase-multilingual-MiniLM-L12-v2",
+    min_sentence_similarity=CONTEXT_MIN_SENTENCE_SIMILARITY
+    )
+answer_cache = AnswerCache(ANSWER_CACHE_PATH, max_entries=ANSWER_CACHE_MAX_ENTRIES) if ANSWER_CACHE_MAX_ENTRIES > 0 else None
+generator = Generator(
+    max_batch_size=GENERATOR_MAX_BATCH_SIZE,
+    draft_model_name=GENERATOR_DRAFT_MODEL,
+    num_draft_tokens=GENERATOR_NUM_DRAFT_TOKENS,
+    model_name=GENERATOR_MODEL,
+    backend=GENERATOR_BACKEND,
+    num_threads=GENERATOR_NUM_THREADS,
+    gguf_path=GENERATOR_GGUF_PATH,
+    soft_token_ratio=GENERATOR_SOFT_TOKEN_RATIO,
+    answer_cache=answer_cache
     )
-
-    model = AutoModelForCausalLM.from_pretrained(model_name,  quantization_config=bnb_config, device_map="auto")
-    # Disable Tensor Parallelism 
-    model.config.pretraining_tp=1
-    
-    return model
-
-retriever = EmbeddingRetriever(embedding_model="panosgriz/covid_el_paraphrase-multilingual-MiniLM-L12-v2", document_store=DOCUMENT_STORE, max_seq_len=128)
-ranker = SentenceTransformersRanker(model_name_or_path="amberoad/bert-multilingual-passage-reranking-msmarco")
-generator = Generator()
 
 p = Pipeline()
 p.add_node(component=retriever, name ="Retriever", inputs=["Query"])
 p.add_node(component=ranker, name="Ranker", inputs=["Retriever"])
-p.add_node(component=generator, name="Generator", inputs=["Ranker"])
+p.add_node(component=context_builder, name="ContextBuilder", inputs=["Ranker"])
+p.add_node(component=generator, name="Generator", inputs=["ContextBuilder"])
 rag_pipeline = p
\ No newline at end of file
@@ -11,6 +11,8 @@ from haystack.lazy_imports import LazyImport
 import os 
 import sys
 
+from pipelines.passage_tokenizer import get_pretokenized
+
 
 logger = logging.getLogger(__name__)
 
@@ -143,10 +145,13 @@ class SentenceTransformersRanker(BaseRanker):
         docs_with_meta_fields = self._add_meta_fields_to_docs(
             documents=documents, embed_meta_fields=self.embed_meta_fields
         )
-        docs = [doc.content for doc in docs_with_meta_fields]
-        features = self.transformer_tokenizer(
-            [query for _ in documents], docs, max_length=512, padding="max_length", truncation=True, return_tensors="pt"
-        ).to(self.devices[0])
+        features = self._get_pretokenized_features(query=query, documents=documents)
+        if features is None:
+            docs = [doc.content for doc in docs_with_meta_fields]
+            features = self.transformer_tokenizer(
+                [query for _ in documents], docs, max_length=512, padding="max_length", truncation=True, return_tensors="pt"
+            )
+        features = features.to(self.devices[0])
 
         # SentenceTransformerRanker uses:
         # 1. the logit as similarity score/answerable classification
@@ -169,6 +174,32 @@ class SentenceTransformersRanker(BaseRanker):
 
         return sorted_documents
 
+    def _get_pretokenized_features(self, query: str, documents: List[Document], max_length: int = 512):
+        """
+        Build the cross-encoder input tensors from the passage token ids stored at index time (see `PassageTokenizer`)
+        and the query tokens, without re-tokenizing passage text.
+
+        Returns None if any of the documents lacks stored token ids for this ranker's tokenizer or if meta fields
+        are embedded in the passages, in which case the passages have to be tokenized as usual.
+        """
+        if self.embed_meta_fields or not documents:
+            return None
+
+        pretokenized = [get_pretokenized(doc, self.transformer_tokenizer.name_or_path) for doc in documents]
+        if any(tokens is None for tokens in pretokenized):
+            return None
+
+        query_ids = self.transformer_tokenizer.encode(query, add_special_tokens=False)
+        encoded_pairs = [
+            self.transformer_tokenizer.prepare_for_model(
+                query_ids, tokens["input_ids"], add_special_tokens=True, truncation=True, max_length=max_length
+            )
+            for tokens in pretokenized
+        ]
+        return self.transformer_tokenizer.pad(
+            encoded_pairs, padding="max_length", max_length=max_length, return_tensors="pt"
+        )
+
     def _add_scores_to_documents(
         self, sorted_scores_and_documents: List[Tuple[Any, Document]], logits_dim: int
     ) -> List[Document]:
@@ -0,0 +1,409 @@
+from typing import List, Dict, Any, Optional, Tuple
+import copy
+import inspect
+import logging
+
+import numpy as np
+import torch
+
+from haystack.schema import Document, Answer, Span
+from haystack.nodes import FARMReader
+from haystack.modeling.infer import Inferencer
+from haystack.modeling.data_handler.inputs import QAInput, Question
+from haystack.modeling.data_handler.processor import SquadProcessor
+from haystack.modeling.data_handler.samples import SampleBasket
+from haystack.modeling.model.prediction_head import QuestionAnsweringHead
+from haystack.modeling.model.feature_extraction import _get_start_of_word_QA
+from haystack.utils import get_batches_from_generator
+
+from pipelines.passage_tokenizer import get_pretokenized
+
+logger = logging.getLogger(__name__)
+
+
+class PretokenizedSquadProcessor(SquadProcessor):
+    """
+    SquadProcessor that builds the reader's input baskets from passage token data stored at index time
+    (see `PassageTokenizer`). Only the questions are tokenized at query time.
+    Falls back to the default tokenization if token data is missing for any of the passages.
+    """
+
+    # Token data per document id, set on the reader's per call copy of the processor
+    pretokenized: Dict[str, Dict[str, List[int]]] = {}
+
+    def dataset_from_dicts(
+        self, dicts: List[Dict], indices: Optional[List[int]] = None, return_baskets: bool = False, debug: bool = False
+    ):
+        if indices is None:
+            indices = []
+        pre_baskets = [self.convert_qa_input_dict(x) for x in dicts]
+
+        if not self.pretokenized or not all(self._get_passage_tokens(b) is not None for b in pre_baskets):
+            return super().dataset_from_dicts(dicts=dicts, indices=indices, return_baskets=return_baskets, debug=debug)
+
+        baskets = self._tokenize_questions(pre_baskets, indices)
+        # The remaining steps are the same as in SquadProcessor.dataset_from_dicts
+        baskets = self._split_docs_into_passages(baskets)
+        max_answers = (
+            self.max_answers
+            if self.max_answers is not None
+            else max(*(len(basket.raw["answers"]) for basket in baskets), 1)
+        )
+        if not return_baskets:
+            baskets = self._convert_answers(baskets, max_answers)
+        baskets = self._passages_to_pytorch_features(baskets, return_baskets, max_answers)
+        dataset, tensor_names, baskets = self._create_dataset(baskets)
+
+        if return_baskets:
+            return dataset, tensor_names, self.problematic_sample_ids, baskets
+        else:
+            return dataset, tensor_names, self.problematic_sample_ids
+
+    def _get_passage_tokens(self, pre_basket: Dict[str, Any]) -> Optional[Dict[str, List[int]]]:
+        # FARMReader uses the document id as the question id of each QAInput
+        doc_id = pre_basket["qas"][0]["id"] if pre_basket["qas"] else None
+        return self.pretokenized.get(doc_id)
+
+    def _tokenize_questions(self, pre_baskets: List[Dict[str, Any]], indices: List[Any]) -> List[SampleBasket]:
+        """Same as haystack's `tokenize_batch_question_answering` but the passage token data is taken from the index."""
+        baskets = []
+        for i_doc, d in enumerate(pre_baskets):
+            passage_tokens = self._get_passage_tokens(d)
+            document_tokens_strings = self.tokenizer.convert_ids_to_tokens(passage_tokens["input_ids"])
+
+            for i_q, q in enumerate(d["qas"]):
+                tokenized_q = self.tokenizer(
+                    q["question"], return_offsets_mapping=True, return_special_tokens_mask=True, add_special_tokens=False
+                )
+                raw = {
+                    "document_text": d["context"],
+                    "document_tokens": passage_tokens["input_ids"],
+                    "document_offsets": np.asarray(passage_tokens["offsets"], dtype="int16"),
+                    "document_start_of_word": passage_tokens["start_of_word"],
+                    "question_text": q["question"],
+                    "question_tokens": tokenized_q["input_ids"],
+                    "question_offsets": [x[0] for x in tokenized_q["offset_mapping"]],
+                    "question_start_of_word": _get_start_of_word_QA(tokenized_q.encodings[0].words),
+                    "answers": q["answers"],
+                    "document_tokens_strings": document_tokens_strings,
+                    "question_tokens_strings": tokenized_q.encodings[0].tokens,
+                }
+                baskets.append(
+                    SampleBasket(raw=raw, id_internal=f"{indices[i_doc]}-{i_q}", id_external=q["id"], samples=None)
+                )
+        return baskets
+
+
+class PackedQuestionAnsweringHead(QuestionAnsweringHead):
+    """
+    QuestionAnsweringHead for inputs that pack several passages separated by the separator token (see
+    `ExtractiveReader._pack_passages`). Spans are only taken within one passage, and every passage yields up to
+    `n_best_per_sample` of them, as if it were a sample of its own.
+    """
+
+    separator_token_id: Optional[int] = None
+
+    def logits_to_preds(self, logits: torch.Tensor, span_mask: torch.Tensor, start_of_word: torch.Tensor, seq_2_start_t: torch.Tensor,
+                        max_answer_length: int = 1000, **kwargs):
+
+        # Number the passages of every sample from 1; the question comes first (0) and separators belong to none (-1)
+        is_separator = kwargs["input_ids"].cpu().numpy() == self.separator_token_id
+        self._passage_ids = np.where(is_separator, -1, np.cumsum(is_separator, axis=1))
+        self._span_mask = span_mask.cpu().numpy()
+        return super().logits_to_preds(logits, span_mask, start_of_word, seq_2_start_t, max_answer_length=max_answer_length, **kwargs)
+
+    def get_top_candidates(self, sorted_candidates, start_end_matrix, sample_idx: int, start_matrix, end_matrix):
+
+        passage_ids = self._passage_ids[sample_idx]
+        start_passages, end_passages = passage_ids[sorted_candidates[:, 0]], passage_ids[sorted_candidates[:, 1]]
+        spans = []
+        no_answer = None
+        passages = np.unique(passage_ids[self._span_mask[sample_idx] == 1])
+        for passage_id in passages[passages > 0]:
+            in_passage = (start_passages == passage_id) & (end_passages == passage_id)
+            *passage_spans, no_answer = super().get_top_candidates(
+                sorted_candidates[in_passage], start_end_matrix, sample_idx, start_matrix=start_matrix, end_matrix=end_matrix
+            )
+            spans.extend(passage_spans)
+        if no_answer is None:
+            return super().get_top_candidates(sorted_candidates, start_end_matrix, sample_idx, start_matrix=start_matrix, end_matrix=end_matrix)
+
+        return sorted(spans, key=lambda candidate: candidate.score, reverse=True) + [no_answer]
+
+
+class ExtractiveReader(FARMReader):
+    """
+    FARMReader that reuses the passage token ids stored at index time by `PassageTokenizer`
+    instead of re-tokenizing the passage text on every query.
+
+    It also supports a CPU serving profile (see `cpu_profile_kwargs`):
+        - the sequence length is sized to the query and passages actually given instead of the fixed `max_seq_len`
+        - multiprocessing preprocessing is skipped for small inputs
+        - the number of torch threads is set explicitly
+        - the model's linear layers are dynamically quantized to int8
+
+    With `pack_passages=True` several short ranked passages are concatenated, separated by the tokenizer's separator
+    token, into one input window, so the model runs far fewer sequences per query. Spans are only predicted within
+    a passage (see PackedQuestionAnsweringHead) and are mapped back to the original documents and offsets.
+    """
+
+    def __init__(
+        self,
+        *args,
+        dynamic_max_seq_len: bool = False,
+        multiprocessing_min_docs: Optional[int] = None,
+        num_threads: Optional[int] = None,
+        quantize: bool = False,
+        pack_passages: bool = False,
+        **kwargs,
+    ):
+        """
+        :param dynamic_max_seq_len: Size the sequence length of every call to the longest query + passage input
+                                    (bounded by `max_seq_len`) instead of padding all inputs to `max_seq_len`.
+        :param multiprocessing_min_docs: Run preprocessing in the inferencer's process pool only when at least this
+                                         many documents are given. None always uses the pool, if there is one.
+        :param num_threads: Number of threads used by torch for intra-op parallelism on CPU.
+        :param quantize: Apply dynamic int8 quantization to the linear layers of the model. Only supported on CPU.
+        :param pack_passages: Pack several short passages into each input window of `max_seq_len` tokens.
+        See FARMReader for the remaining parameters.
+        """
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+
+        super().__init__(*args, **kwargs)
+        # Swap in the processor subclass; it shares all state with the loaded SquadProcessor
+        self.inferencer.processor.__class__ = PretokenizedSquadProcessor
+
+        self.dynamic_max_seq_len = dynamic_max_seq_len
+        self.multiprocessing_min_docs = multiprocessing_min_docs
+        self.pack_passages = pack_passages
+        self.configured_max_seq_len = self.inferencer.processor.max_seq_len
+        self.configured_doc_stride = self.inferencer.processor.doc_stride
+
+        if quantize:
+            if self.devices[0].type != "cpu":
+                raise ValueError("Dynamic quantization is only supported when the reader runs on CPU. Set use_gpu=False.")
+            torch.quantization.quantize_dynamic(self.inferencer.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+            logger.info("Applied dynamic int8 quantization to the reader model")
+
+    def get_params(self, return_defaults: bool = False) -> Dict[str, Any]:
+        # The FARMReader parameters are passed through **kwargs, so their defaults come from FARMReader's signature
+        signature = {**inspect.signature(FARMReader).parameters, **inspect.signature(self.__class__).parameters}
+        params = {key: value for key, value in self._component_config["params"].items()
+                  if return_defaults or key not in signature or value != signature[key].default}
+        if return_defaults:
+            for key, param in signature.items():
+                if key not in params and param.kind not in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                    params[key] = param.default
+        return params
+
+    def predict(self, query: str, documents: List[Document], top_k: Optional[int] = None):
+
+        if top_k is None:
+            top_k = self.top_k
+
+        tokenizer_name = self.inferencer.processor.tokenizer.name_or_path
+        pretokenized = {}
+        for doc in documents:
+            tokens = get_pretokenized(doc, tokenizer_name)
+            if tokens is not None:
+                pretokenized[doc.id] = tokens
+
+        packs = None
+        if self.pack_passages and len(documents) > 1:
+            documents, pretokenized, packs = self._pack_passages(query, documents, pretokenized)
+
+        if packs is None:
+            inferencer = self._get_call_inferencer(query, documents, pretokenized)
+            return self._predict(inferencer, query, documents, top_k)
+
+        # Each packed document keeps top_k_per_candidate answers for every passage it holds
+        top_k_per_candidate = self.top_k_per_candidate * max(len(pack) for pack in packs.values())
+        inferencer = self._get_call_inferencer(query, documents, pretokenized, top_k_per_candidate=top_k_per_candidate)
+        result = self._predict(inferencer, query, documents, top_k=None, top_k_per_candidate=top_k_per_candidate)
+        result["answers"] = self._unpack_answers(result["answers"], packs)[:top_k]
+
+        return result
+
+    def _get_call_inferencer(
+        self, query: str, documents: List[Document], pretokenized: Dict[str, Dict[str, List[int]]], top_k_per_candidate: Optional[int] = None
+    ) -> Inferencer:
+        """
+        Shallow copy of the inferencer with its own processor, holding the settings of one call. The reader is shared
+        by concurrent requests, so these are never set on the shared inferencer. The model weights and tokenizer are
+        shared. With `top_k_per_candidate` (packed documents) the call gets its own PackedQuestionAnsweringHead.
+        """
+        processor = copy.copy(self.inferencer.processor)
+        processor.problematic_sample_ids = set()
+        processor.pretokenized = pretokenized
+        if self.dynamic_max_seq_len:
+            self._set_max_seq_len(processor, self._fit_max_seq_len(query, documents, pretokenized))
+
+        inferencer = copy.copy(self.inferencer)
+        inferencer.processor = processor
+        if top_k_per_candidate is not None:
+            head = copy.copy(self.inferencer.model.prediction_heads[0])
+            head.__class__ = PackedQuestionAnsweringHead
+            head.separator_token_id = processor.tokenizer.sep_token_id
+            head.n_best = top_k_per_candidate + 1  # including possible no_answer
+            model = copy.copy(self.inferencer.model)
+            model._modules = {**model._modules, "prediction_heads": torch.nn.ModuleList([head])}
+            inferencer.model = model
+        # Starting a process pool round trip costs more than preprocessing a handful of passages in process
+        if self.multiprocessing_min_docs is not None and len(documents) < self.multiprocessing_min_docs:
+            inferencer.process_pool = None
+        return inferencer
+
+    def _predict(
+        self, inferencer: Inferencer, query: str, documents: List[Document], top_k: Optional[int], top_k_per_candidate: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """FARMReader.predict with the given inferencer, keeping `top_k_per_candidate` answers per document if given"""
+
+        inputs = [QAInput(doc_text=doc.content, questions=Question(text=query, uid=doc.id)) for doc in documents]
+        predictions = []
+        for input_batch in get_batches_from_generator(inputs, self.preprocessing_batch_size):
+            predictions.extend(inferencer.inference_from_objects(objects=input_batch, return_json=False, multiprocessing_chunksize=1))
+        # Deduplicate same answers resulting from Document split overlap
+        predictions = self._deduplicate_predictions(predictions, documents)
+        reader = self
+        if top_k_per_candidate is not None:
+            reader = copy.copy(self)
+            reader.top_k_per_candidate = top_k_per_candidate
+        answers, max_no_ans_gap = reader._extract_answers_of_predictions(predictions, top_k)
+        answers = [self._add_answer_page_number(documents=documents, answer=answer) for answer in answers]
+        return {"query": query, "no_ans_gap": max_no_ans_gap, "answers": answers}
+
+    def _question_len(self, query: str) -> int:
+
+        processor = self.inferencer.processor
+        return min(len(processor.tokenizer.tokenize(query)), processor.max_query_length)
+
+    def _passage_len(self, doc: Document, pretokenized: Dict[str, Dict[str, List[int]]]) -> int:
+
+        if doc.id in pretokenized:
+            return len(pretokenized[doc.id]["input_ids"])
+        return len(self.inferencer.processor.tokenizer.tokenize(doc.content))
+
+    def _fit_max_seq_len(self, query: str, documents: List[Document], pretokenized: Dict[str, Dict[str, List[int]]]) -> int:
+        """Smallest sequence length (multiple of 8, bounded by the configured max_seq_len) that fits the query and the longest passage."""
+
+        passage_lens = [self._passage_len(doc, pretokenized) for doc in documents]
+        # Room for the special tokens ([CLS] q [SEP] [SEP] p [SEP] in the worst case)
+        seq_len = self._question_len(query) + max(passage_lens, default=0) + 4
+        # The processor reserves max_query_length tokens for the question and needs at least one passage token left
+        seq_len = max(seq_len, self.inferencer.processor.max_query_length + 2)
+        seq_len = int(np.ceil(seq_len / 8) * 8)
+
+        return min(seq_len, self.configured_max_seq_len)
+
+    def _pack_passages(
+        self, query: str, documents: List[Document], pretokenized: Dict[str, Dict[str, List[int]]]
+    ) -> Tuple[List[Document], Dict[str, Dict[str, List[int]]], Dict[str, List[Tuple[int, Document]]]]:
+        """
+        Greedily pack the documents, in ranked order, into windows that fit `max_seq_len` together with the query.
+        Returns the packed documents, their token data (if all members were pretokenized) and, per packed document id,
+        the character offset at which each original document starts.
+        """
+        tokenizer = self.inferencer.processor.tokenizer
+        separator = f" {tokenizer.sep_token} "
+        budget = self.configured_max_seq_len - self._question_len(query) - 4
+
+        groups: List[List[Document]] = []
+        group_len = 0
+        for doc in documents:
+            doc_len = self._passage_len(doc, pretokenized)
+            # +1 for the separator token
+            if groups and group_len + 1 + doc_len <= budget:
+                groups[-1].append(doc)
+                group_len += 1 + doc_len
+            else:
+                groups.append([doc])
+                group_len = doc_len
+
+        packed_docs = []
+        packed_pretokenized = {}
+        packs = {}
+        for i, group in enumerate(groups):
+            packed_id = f"packed_{i}_" + "_".join(doc.id for doc in group)
+            starts = []
+            text = ""
+            for doc in group:
+                if text:
+                    text += separator
+                starts.append(len(text))
+                text += doc.content
+            packed_docs.append(Document(id=packed_id, content=text))
+            packs[packed_id] = list(zip(starts, group))
+
+            if all(doc.id in pretokenized for doc in group):
+                tokens = {"input_ids": [], "offsets": [], "start_of_word": []}
+                for start, doc in packs[packed_id]:
+                    if tokens["input_ids"]:
+                        tokens["input_ids"].append(tokenizer.sep_token_id)
+                        tokens["offsets"].append(start - len(separator) + 1)
+                        tokens["start_of_word"].append(1)
+                    tokens["input_ids"].extend(pretokenized[doc.id]["input_ids"])
+                    tokens["offsets"].extend(offset + start for offset in pretokenized[doc.id]["offsets"])
+                    tokens["start_of_word"].extend(pretokenized[doc.id]["start_of_word"])
+                packed_pretokenized[packed_id] = tokens
+
+        logger.debug(f"Packed {len(documents)} passages into {len(packed_docs)} reader inputs")
+
+        return packed_docs, packed_pretokenized, packs
+
+    def _unpack_answers(self, answers: List[Answer], packs: Dict[str, List[Tuple[int, Document]]]) -> List[Answer]:
+        """
+        Map answers predicted on packed documents back to the original documents and offsets, keeping at most
+        `top_k_per_candidate` answers per document as without packing. The answers are sorted by score.
+        """
+        unpacked = []
+        answers_per_document: Dict[str, int] = {}
+        for answer in answers:
+            # no_answer predictions are not tied to a document
+            if not answer.document_ids or answer.document_ids[0] not in packs or not answer.offsets_in_document:
+                unpacked.append(answer)
+                continue
+
+            start, end = answer.offsets_in_document[0].start, answer.offsets_in_document[0].end
+            for doc_start, doc in packs[answer.document_ids[0]]:
+                if doc_start <= start and end <= doc_start + len(doc.content):
+                    if answers_per_document.get(doc.id, 0) < self.top_k_per_candidate:
+                        answers_per_document[doc.id] = answers_per_document.get(doc.id, 0) + 1
+                        unpacked.append(self._map_answer_to_document(answer, doc, start - doc_start, end - doc_start))
+                    break
+
+        return unpacked
+
+    def _map_answer_to_document(self, answer: Answer, doc: Document, start: int, end: int) -> Answer:
+
+        context_window_size = self.inferencer.model.prediction_heads[0].context_window_size
+        half_window = max(0, context_window_size - (end - start)) // 2
+        context_start = max(0, start - half_window)
+        context_end = min(len(doc.content), end + half_window)
+
+        answer.document_ids = [doc.id]
+        answer.offsets_in_document = [Span(start=start, end=end)]
+        answer.context = doc.content[context_start:context_end]
+        answer.offsets_in_context = [Span(start=start - context_start, end=end - context_start)]
+
+        # The packed document has no page numbers, so the answer's page is taken from the original document
+        return self._add_answer_page_number(documents=[doc], answer=answer)
+
+    def _set_max_seq_len(self, processor: SquadProcessor, max_seq_len: int):
+
+        processor.max_seq_len = max_seq_len
+        # The stride has to stay smaller than the passage part of the window
+        processor.doc_stride = min(self.configured_doc_stride, max_seq_len - processor.max_query_length - 1)
+
+
+def cpu_profile_kwargs(num_threads: Optional[int] = None) -> Dict[str, Any]:
+    """ExtractiveReader arguments for serving on CPU"""
+
+    return {
+        "use_gpu": False,
+        "devices": None,
+        "dynamic_max_seq_len": True,
+        "multiprocessing_min_docs": 32,
+        "num_threads": num_threads,
+        "quantize": True,
+    }
@@ -0,0 +1,65 @@
+from typing import List, Optional
+import logging
+
+from haystack.schema import Document, Answer
+from haystack.nodes.base import BaseComponent
+
+from utils.metrics import compute_answer_relevancy
+
+logger = logging.getLogger(__name__)
+
+
+class ReaderConfidenceGate(BaseComponent):
+    """
+    Decision node placed after the Reader in the extractive-first cascade.
+    If the Reader's best answer has a confidence score and a relevancy score (bi-encoder similarity to the query) at or
+    above the thresholds, the query is answered with the Reader's answers (output_1, which is left unconnected).
+    Otherwise the ranked documents are passed on to the generative branch (output_2).
+    The path that answered is recorded in the `answered_by` field of the result.
+    """
+    outgoing_edges = 2
+
+    def __init__(self, min_confidence: float = 0.7, min_relevancy: Optional[float] = None):
+        """
+        :param min_confidence: Minimum Reader confidence score (use_confidence_scores=True) of the best answer.
+        :param min_relevancy: Minimum relevancy score of the best answer. None skips the relevancy check.
+        """
+        super().__init__()
+        self.min_confidence = min_confidence
+        self.min_relevancy = min_relevancy
+
+    def is_confident(self, query: str, answers: List[Answer], min_confidence: Optional[float] = None, min_relevancy: Optional[float] = None) -> bool:
+        """Check whether the best Reader answer passes the confidence and relevancy thresholds"""
+
+        min_confidence = self.min_confidence if min_confidence is None else min_confidence
+        min_relevancy = self.min_relevancy if min_relevancy is None else min_relevancy
+
+        answers = [answer for answer in answers if answer.answer]
+        if not answers:
+            return False
+        best = max(answers, key=lambda answer: answer.score or 0.0)
+        if (best.score or 0.0) < min_confidence:
+            return False
+        if min_relevancy is not None:
+            # Scored once here; add_relevancy_scores_to_results reuses the score
+            best.meta["relevancy_score"] = compute_answer_relevancy(query=query, answers=[best.answer])[0]
+            return best.meta["relevancy_score"] >= min_relevancy
+        return True
+
+    def run(self, query: str, documents: List[Document], answers: List[Answer], min_confidence: Optional[float] = None, min_relevancy: Optional[float] = None):
+
+        if self.is_confident(query, answers, min_confidence, min_relevancy):
+            return {"documents": documents, "answers": answers, "answered_by": "reader"}, "output_1"
+
+        logger.info(f"Reader answer below the confidence thresholds for query: {query}. Running the Generator.")
+        return {"documents": documents, "answered_by": "generator"}, "output_2"
+
+    def run_batch(self, queries: List[str], documents: List[List[Document]], answers: List[List[Answer]], min_confidence: Optional[float] = None, min_relevancy: Optional[float] = None):
+
+        if len(queries) == 1:
+            queries = queries * len(documents)
+        # A batch can only be routed to a single edge; answer with the Reader only if it is confident for every query
+        if all(self.is_confident(query, query_answers, min_confidence, min_relevancy) for query, query_answers in zip(queries, answers)):
+            return {"documents": documents, "answers": answers, "answered_by": "reader"}, "output_1"
+
+        return {"documents": documents, "answered_by": "generator"}, "output_2"
@@ -0,0 +1,32 @@
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(SCRIPT_DIR))
+
+from haystack.nodes import EmbeddingRetriever
+from haystack.pipelines import Pipeline
+
+from document_store.initialize_document_store import document_store as DOCUMENT_STORE
+from pipelines.ranker import SentenceTransformersRanker
+
+if DOCUMENT_STORE is None:
+    raise ValueError("the imported document_store is None. Please make sure that the Elasticsearch service is properly launched")
+
+# Retriever and Ranker shared by all query pipelines, so that each model is loaded once per process
+retriever = EmbeddingRetriever(
+    embedding_model="panosgriz/covid_el_paraphrase-multilingual-MiniLM-L12-v2",
+    document_store=DOCUMENT_STORE,
+    max_seq_len=128,
+    top_k=10
+    )
+ranker = SentenceTransformersRanker(
+    model_name_or_path="amberoad/bert-multilingual-passage-reranking-msmarco",
+    scale_score=True,
+    top_k=10
+    )
+
+p = Pipeline()
+p.add_node(component=retriever, name="Retriever", inputs=["Query"])
+p.add_node(component=ranker, name="Ranker", inputs=["Retriever"])
+retrieval_pipeline = p
@@ -15,7 +15,7 @@ import os
 from transformers import AutoTokenizer
 from haystack.nodes import PreProcessor
 import re
-import nltk
+from utils.sentence_segmentation import split_sentences
 from haystack.utils import SquadData
 
 
@@ -33,9 +33,7 @@ def post_process_generator_answers (result):
 def remove_incomplete_sentences(text):
     """Filter out incomplete sentences from a text where sentences might be cut off"""
 
-    nltk.download('punkt')
-
-    sentences = nltk.sent_tokenize(text)
+    sentences = split_sentences(text)
     complete_sentences = []
 
     sentence_end_regex = re.compile(r'.*[\.\;!]$')
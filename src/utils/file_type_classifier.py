@@ -1,44 +1,64 @@
 # File classifier for: .txt, .pdf, .docx, .json, .jsonl files
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Union
 from haystack.schema import Document
-from haystack.nodes import FileTypeClassifier, JsonConverter, TextConverter, PDFToTextConverter, DocxToTextConverter, PreProcessor
+from haystack.nodes import JsonConverter, TextConverter, PDFToTextConverter, DocxToTextConverter, PreProcessor
 from haystack.pipelines import Pipeline
 from haystack.nodes.base import BaseComponent
 from pathlib import Path
 
+from pipelines.preprocessor import SentencePreProcessor
+from utils.parallel_file_converter import ParallelFileConverter
 
-class JsonFileDetector (BaseComponent):
+
+class FileTypeGroupConverter (BaseComponent):
     """
-    Detect and route json or jsonl input file in a Pipeline to JSONConverter
-    Note: Only a single file path is allowed as input
+    Route every input file to the converter of its type: consecutive files of the same extension are converted with
+    one batched converter call, so that a single upload can mix .txt, .pdf, .docx, .json and .jsonl files and the
+    documents keep the order of the input files.
     """
-    outgoing_edges = 2
-    def __init__(self):
+    outgoing_edges = 1
+    def __init__(self, converters: Dict[str, BaseComponent]):
+        """
+        :param converters: Converter by file extension (e.g. {".pdf": PDFToTextConverter()}).
+        """
         super().__init__()
+        self.converters = converters
+
+    def _group_consecutive(self, file_paths: List[Path], meta: List[Optional[dict]]) -> List[tuple]:
+        groups = []
+        for path, file_meta in zip(file_paths, meta):
+            extension = path.suffix.lower()
+            if extension not in self.converters:
+                raise ValueError(f"Unsupported file type '{extension}' of {path.name}. Supported types: {', '.join(self.converters)}")
+            if not groups or groups[-1][0] != extension:
+                groups.append((extension, [], []))
+            groups[-1][1].append(path)
+            groups[-1][2].append(file_meta)
+        return groups
+
+    def run(self, file_paths: List[Union[str, Path]], meta: Optional[Union[Dict, List[Dict]]] = None):
 
-    def _get_extension(self, file_paths: List[Path]) -> str:
-        extension = file_paths[0].suffix.lower()
-        return extension
-    
-    def run(self, file_paths:List[str]):
-        
         paths = [Path(path) for path in file_paths]
-        extension = self._get_extension(paths)
-        output_index = 1 if extension in [".json", ".jsonl"] else 2
+        if meta is None or isinstance(meta, dict):
+            meta = [meta] * len(paths)
 
-        output = {"file_paths": paths}
+        documents = []
+        for extension, group_paths, group_meta in self._group_consecutive(paths, meta):
+            output, _ = self.converters[extension].run(file_paths=group_paths, meta=group_meta)
+            documents.extend(output["documents"])
 
-        return output, f'output_{output_index}'
+        return {"documents": documents}, "output_1"
 
-    def run_batch(
-        self,
-        **kwargs):
-         return
+    def run_batch(self, file_paths: List[Union[str, Path]], meta: Optional[Union[Dict, List[Dict]]] = None):
+        return self.run(file_paths=file_paths, meta=meta)
 
-def init_file_to_doc_pipeline (custom_preprocessor:PreProcessor=None) -> Pipeline:
-    """Pipeline to route file to corresponding converter and preprocess the resulting docs"""
+def init_file_to_doc_pipeline (custom_preprocessor:PreProcessor=None, num_workers:Optional[int]=None) -> Pipeline:
+    """
+    Pipeline to route file to corresponding converter and preprocess the resulting docs.
+    If `num_workers` is greater than 1, the files are converted and preprocessed in a pool of that many processes
+    (see ParallelFileConverter). The last node is named "Preprocessor" in both cases.
+    """
 
-    file_type_classifier = FileTypeClassifier()
     text_converter = TextConverter(valid_languages=['el'])
     pdf_converter = PDFToTextConverter(valid_languages=['el'])
     docx_converter = DocxToTextConverter(valid_languages=['el'])
@@ -48,7 +68,7 @@ def init_file_to_doc_pipeline (custom_preprocessor:PreProcessor=None) -> Pipelin
     if custom_preprocessor is not None:
         preprocessor = custom_preprocessor
     else:
-        preprocessor = PreProcessor(
+        preprocessor = SentencePreProcessor(
         clean_empty_lines=True,
         clean_header_footer=True,
         clean_whitespace=True,
@@ -59,14 +79,14 @@ def init_file_to_doc_pipeline (custom_preprocessor:PreProcessor=None) -> Pipelin
 
     p = Pipeline()
 
-    # Classify doc according to extension and routes it to corresponding converter
-    p.add_node (component=JsonFileDetector(), name="JsonFileDetector", inputs=["File"])
-    p.add_node(component=json_converter, name="JsonConverter", inputs=["JsonFileDetector.output_1"])
-    p.add_node(component=file_type_classifier, name="FileTypeClassifier", inputs=["JsonFileDetector.output_2"])
-    p.add_node(component=text_converter, name="TextConverter", inputs=["FileTypeClassifier.output_1"])
-    p.add_node(component=pdf_converter, name="PdfConverter", inputs=["FileTypeClassifier.output_2"])
-    p.add_node(component=docx_converter, name="DocxConverter", inputs=["FileTypeClassifier.output_4"])
+    if num_workers is not None and num_workers > 1:
+        p.add_node(component=ParallelFileConverter(preprocessor=preprocessor, num_workers=num_workers), name="Preprocessor", inputs=["File"])
+        return p
+
+    # Route every file to the converter of its type
+    converters = {".txt": text_converter, ".pdf": pdf_converter, ".docx": docx_converter, ".json": json_converter, ".jsonl": json_converter}
+    p.add_node(component=FileTypeGroupConverter(converters), name="FileConverter", inputs=["File"])
     # Split, clean and convert document(s) to haystack Document object(s)
-    p.add_node(component=preprocessor, name="Preprocessor", inputs=["JsonConverter", "TextConverter", "PdfConverter", "DocxConverter"])
+    p.add_node(component=preprocessor, name="Preprocessor", inputs=["FileConverter"])
 
     return p
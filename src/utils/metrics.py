@@ -7,11 +7,25 @@ SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.dirname(SCRIPT_DIR))
 
 import bisect
+import threading
+from functools import lru_cache
 from sentence_transformers import SentenceTransformer
 
+_relevancy_model_lock = threading.Lock()
+
+def get_relevancy_model():
+    """Bi-encoder of the relevancy scores, loaded once per process"""
+    # Requests are served from a thread pool; the lock keeps concurrent first requests from loading it twice
+    with _relevancy_model_lock:
+        return _load_relevancy_model()
+
+@lru_cache(maxsize=None)
+def _load_relevancy_model():
+    return SentenceTransformer("panosgriz/covid_el_paraphrase-multilingual-MiniLM-L12-v2")
+
 def compute_answer_relevancy (query, answers):
     
-    model = SentenceTransformer("panosgriz/covid_el_paraphrase-multilingual-MiniLM-L12-v2")
+    model = get_relevancy_model()
     
     a_embeddings = model.encode(sentences=answers)
     q_embedding = model.encode(sentences=[query])
@@ -27,12 +41,17 @@ def add_relevancy_scores_to_results (results):
     
     query = results["query"]
     answers = results["answers"]
-    answer_texts = [answer.answer for answer in answers]
-    scores = compute_answer_relevancy(query=query, answers=answer_texts)
+    if not answers:
+        return results
+    # Answers scored earlier in the pipeline (e.g. by the ReaderConfidenceGate) keep their score
+    unscored = [answer for answer in answers if "relevancy_score" not in answer.meta]
+    if unscored:
+        for answer, score in zip(unscored, compute_answer_relevancy(query=query, answers=[answer.answer for answer in unscored])):
+            answer.meta["relevancy_score"] = score
+    scores = [answer.meta["relevancy_score"] for answer in answers]
     
     scored_answers = []
     for score, answer in zip(scores, answers):
-        answer.meta["relevancy_score"] = score
         # Use bisect to find the position where the current answer should be inserted
         insert_position = bisect.bisect_right([a.meta["relevancy_score"] for a in scored_answers], score)
         # Insert the current answer into the correct position to maintain sorted order
@@ -0,0 +1,213 @@
+from typing import Dict, Iterable, List, NamedTuple, Optional, Union
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+import json
+import logging
+import multiprocessing
+
+from haystack.schema import Document
+from haystack.nodes import JsonConverter, TextConverter, PDFToTextConverter, DocxToTextConverter, PreProcessor
+from haystack.nodes.base import BaseComponent
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".txt", ".pdf", ".docx", ".json", ".jsonl")
+
+
+def documents_from_json_lines(lines: Iterable[str], meta: Optional[dict] = None) -> List[Document]:
+    """Documents of the lines of a .jsonl file, built as JsonConverter builds them"""
+
+    documents = []
+    for line in lines:
+        if not line.strip():
+            continue
+        doc_dict = json.loads(line)
+        doc_dict["meta"] = {**(doc_dict.get("meta") or {}), **(meta or {})}
+        documents.append(Document.from_dict(doc_dict))
+    return documents
+
+
+class ConversionTask(NamedTuple):
+    """A file, or a page range (pdf, 1-based inclusive) or byte range of whole lines (jsonl) of it, to convert"""
+    path: str
+    start: Optional[int] = None
+    end: Optional[int] = None
+    meta: Optional[dict] = None
+
+
+class FileConversionWorker:
+    """Converts and preprocesses the files of conversion tasks, in the pool's worker processes or inline"""
+
+    def __init__(self, preprocessor: PreProcessor):
+        self.preprocessor = preprocessor
+        self.text_converter = TextConverter(valid_languages=["el"])
+        # Created on the first .pdf file, since it requires the pdftotext binary
+        self._pdf_converter = None
+        self.docx_converter = DocxToTextConverter(valid_languages=["el"])
+        self.json_converter = JsonConverter(valid_languages=["el"])
+
+    @property
+    def pdf_converter(self) -> PDFToTextConverter:
+        if self._pdf_converter is None:
+            self._pdf_converter = PDFToTextConverter(valid_languages=["el"])
+        return self._pdf_converter
+
+    def convert(self, task: ConversionTask) -> List[Document]:
+
+        path = Path(task.path)
+        extension = path.suffix.lower()
+        if extension == ".jsonl":
+            # Also for whole files, so that blank lines are skipped as in line ranges
+            documents = self._convert_json_lines(path, task.start, task.end, task.meta)
+        elif extension == ".json":
+            documents = self.json_converter.convert(file_path=path, meta=task.meta)
+        elif extension == ".pdf":
+            documents = self.pdf_converter.convert(file_path=path, meta=task.meta, start_page=task.start, end_page=task.end)
+        elif extension == ".docx":
+            documents = self.docx_converter.convert(file_path=path, meta=task.meta)
+        else:
+            documents = self.text_converter.convert(file_path=path, meta=task.meta)
+        return self.preprocessor.process(documents)
+
+    @staticmethod
+    def _convert_json_lines(path: Path, start: Optional[int], end: Optional[int], meta: Optional[dict]) -> List[Document]:
+        """Documents of the lines between two byte offsets of a .jsonl file (by default the whole file)"""
+
+        with open(path, "rb") as fp:
+            fp.seek(start or 0)
+            data = fp.read() if end is None else fp.read(end - (start or 0))
+        lines = data.decode("utf-8", errors="ignore").splitlines()
+        return documents_from_json_lines(lines, meta)
+
+
+# Worker of each pool process, created once by the pool initializer
+_worker = None
+
+def _init_worker(preprocessor: PreProcessor):
+    global _worker
+    _worker = FileConversionWorker(preprocessor)
+
+def _convert_task(task: ConversionTask) -> List[Document]:
+    return _worker.convert(task)
+
+
+class ParallelFileConverter(BaseComponent):
+    """
+    Convert and preprocess files in a pool of processes.
+
+    Every file is a task of the pool. Large files are split into several tasks: pdf files into ranges of
+    `pages_per_task` pages and .jsonl files into ranges of `lines_per_task` lines. The documents are returned in the
+    order of the files (and of their ranges), so that the next nodes embed and write them in one stage.
+    Passages do not span the boundary of two page ranges.
+    """
+
+    outgoing_edges = 1
+
+    def __init__(self, preprocessor: PreProcessor, num_workers: int = 1, pages_per_task: int = 20, lines_per_task: int = 1000):
+        """
+        :param preprocessor: Preprocessor of the converted documents. It is pickled to every worker process.
+        :param num_workers: Number of worker processes. 1 converts the files inline, in the calling thread.
+        :param pages_per_task: Number of pages of a pdf file converted by one task.
+        :param lines_per_task: Number of lines of a .jsonl file converted by one task.
+        """
+        super().__init__()
+        self.preprocessor = preprocessor
+        self.num_workers = num_workers
+        self.pages_per_task = pages_per_task
+        self.lines_per_task = lines_per_task
+        self._pool = None
+        self._inline_worker = None
+
+    def plan_tasks(self, file_paths: List[Union[str, Path]], meta: Optional[Union[Dict, List[Dict]]] = None) -> List[ConversionTask]:
+        """Split the files into conversion tasks"""
+
+        if meta is None or isinstance(meta, dict):
+            meta = [meta] * len(file_paths)
+
+        tasks = []
+        for path, file_meta in zip(file_paths, meta):
+            path = Path(path)
+            extension = path.suffix.lower()
+            if extension not in SUPPORTED_EXTENSIONS:
+                raise ValueError(f"Unsupported file type '{extension}' of {path.name}. Supported types: {', '.join(SUPPORTED_EXTENSIONS)}")
+            if extension == ".pdf":
+                tasks.extend(self._page_range_tasks(path, file_meta))
+            elif extension == ".jsonl":
+                tasks.extend(self._line_range_tasks(path, file_meta))
+            else:
+                tasks.append(ConversionTask(path=str(path), meta=file_meta))
+        return tasks
+
+    def _page_range_tasks(self, path: Path, meta: Optional[dict]) -> List[ConversionTask]:
+        try:
+            import fitz
+            with fitz.open(str(path)) as pdf:
+                page_count = pdf.page_count
+        except Exception:
+            # Convert the whole file in one task if the page count is not available
+            return [ConversionTask(path=str(path), meta=meta)]
+
+        if page_count <= self.pages_per_task:
+            return [ConversionTask(path=str(path), meta=meta)]
+        return [
+            ConversionTask(path=str(path), start=start, end=min(start + self.pages_per_task - 1, page_count), meta=meta)
+            for start in range(1, page_count + 1, self.pages_per_task)
+        ]
+
+    def _line_range_tasks(self, path: Path, meta: Optional[dict]) -> List[ConversionTask]:
+
+        # Byte offset of every `lines_per_task`-th line end
+        offsets = [0]
+        position = 0
+        with open(path, "rb") as fp:
+            for i, line in enumerate(fp, start=1):
+                position += len(line)
+                if i % self.lines_per_task == 0:
+                    offsets.append(position)
+        size = path.stat().st_size
+        if offsets[-1] < size:
+            offsets.append(size)
+        if len(offsets) <= 2:
+            return [ConversionTask(path=str(path), meta=meta)]
+        return [ConversionTask(path=str(path), start=start, end=end, meta=meta) for start, end in zip(offsets, offsets[1:])]
+
+    def convert(self, file_paths: List[Union[str, Path]], meta: Optional[Union[Dict, List[Dict]]] = None) -> List[Document]:
+        """Convert and preprocess the files, in the worker processes if there is more than one task"""
+
+        tasks = self.plan_tasks(file_paths, meta)
+        if self.num_workers == 1 or len(tasks) <= 1:
+            # Not worth a round trip to the pool
+            if self._inline_worker is None:
+                self._inline_worker = FileConversionWorker(self.preprocessor)
+            return [doc for task in tasks for doc in self._inline_worker.convert(task)]
+
+        try:
+            results = self._get_pool().map(_convert_task, tasks)
+            return [doc for documents in results for doc in documents]
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory): start a new pool for the next request
+            self._pool = None
+            raise
+
+    def submit(self, task: ConversionTask) -> Future:
+        """Convert and preprocess one task in the worker processes"""
+        return self._get_pool().submit(_convert_task, task)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            logger.info(f"Starting {self.num_workers} file conversion processes")
+            # spawn: forking a process that already runs tokenizer or torch threads can deadlock
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.preprocessor,)
+                )
+        return self._pool
+
+    def run(self, file_paths: List[Union[str, Path]], meta: Optional[Union[Dict, List[Dict]]] = None):
+        return {"documents": self.convert(file_paths, meta)}, "output_1"
+
+    def run_batch(self, file_paths: List[Union[str, Path]], meta: Optional[Union[Dict, List[Dict]]] = None):
+        return self.run(file_paths=file_paths, meta=meta)
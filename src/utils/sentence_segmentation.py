@@ -0,0 +1,109 @@
+from typing import List, Tuple, Optional, Iterable
+from functools import lru_cache
+import os
+import re
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources")
+# ISO 639-1 codes (as used by haystack's PreProcessor) of the supported languages
+LANGUAGE_ISO_MAP = {"el": "greek", "en": "english"}
+
+
+class SentenceSegmenter:
+    """
+    Rule-based sentence segmentation for Greek (and English) text, with no downloads.
+
+    A sentence ends at `.`, `!`, `?`, `…` or, in Greek, at the question mark `;`, optionally followed by closing quotes
+    or brackets and whitespace. A period does not end a sentence before a lowercase word, after an abbreviation of the
+    bundled resource list (resources/sentence_abbreviations_<language>.txt), after a single letter initial or after
+    the number of an enumeration item ("1. ").
+    """
+
+    _BOUNDARY = re.compile(r"(?P<end>\.{2,}|…|[.!?;;])(?P<close>[\"'»”’)\]]*)(?P<space>\s+)(?=(?P<next>\S))")
+    _OPENING_PUNCTUATION = "([{«\"'“‘"
+
+    def __init__(self, language: str = "greek", abbreviations: Optional[Iterable[str]] = None):
+        """
+        :param language: "greek" or "english" (or their ISO 639-1 codes "el", "en").
+        :param abbreviations: Lowercase abbreviations without their final period. Defaults to the bundled list of the language.
+        """
+        self.language = LANGUAGE_ISO_MAP.get(language, language)
+        if self.language not in LANGUAGE_ISO_MAP.values():
+            raise ValueError(f"Unsupported sentence segmentation language '{language}'. Choose one of {list(LANGUAGE_ISO_MAP.values())}.")
+        self.abbreviations = set(abbreviations) if abbreviations is not None else load_abbreviations(self.language)
+        # ";" is the question mark in Greek and a semicolon in English
+        self.sentence_end_chars = ".!?…;;" if self.language == "greek" else ".!?…"
+
+    def span_tokenize(self, text: str) -> List[Tuple[int, int]]:
+        """Character (start, end) spans of the sentences, without their surrounding whitespace"""
+
+        spans = []
+        start = 0
+        for match in self._BOUNDARY.finditer(text):
+            if self._is_boundary(text, start, match):
+                spans.append((start, match.start("space")))
+                start = match.end("space")
+        if text[start:].strip():
+            spans.append((start, len(text.rstrip())))
+
+        # Skip leading whitespace of the first sentence
+        return [(s + len(text[s:e]) - len(text[s:e].lstrip()), e) for s, e in spans if text[s:e].strip()]
+
+    def split(self, text: str) -> List[str]:
+        """Sentences of the text, stripped of surrounding whitespace (same output format as nltk.sent_tokenize)"""
+        return [text[start:end] for start, end in self.span_tokenize(text)]
+
+    def split_preserving_whitespace(self, text: str) -> List[str]:
+        """Sentences with their trailing whitespace, so that joining them restores the text (as haystack's PreProcessor expects)"""
+
+        starts = [start for start, _ in self.span_tokenize(text)]
+        if not starts:
+            return [text] if text else []
+        starts[0] = 0
+        return [text[start:end] for start, end in zip(starts, starts[1:] + [len(text)])]
+
+    def _is_boundary(self, text: str, sentence_start: int, match) -> bool:
+
+        end = match.group("end")
+        if end[0] not in self.sentence_end_chars:
+            return False
+        if end in "!?;;":
+            return True
+
+        # A period or an ellipsis followed by a lowercase word continues the sentence
+        if match.group("next").islower():
+            return False
+        if end != ".":
+            return True
+
+        words = text[sentence_start:match.start("end")].split()
+        if not words:
+            return False
+        word = words[-1].lstrip(self._OPENING_PUNCTUATION)
+        if word.lower() in self.abbreviations:
+            return False
+        # Initials ("Γ. Παπαδόπουλος") and acronyms written with periods ("Η.Π.Α.")
+        if re.fullmatch(r"(?:[^\W\d_]\.)*[^\W\d_]", word):
+            return False
+        # Enumerations ("1. Πλένετε τα χέρια"): the number is the only word of the sentence so far
+        if word.isdigit() and len(words) == 1:
+            return False
+        return True
+
+
+def load_abbreviations(language: str) -> set:
+    """Load the bundled abbreviation list of a language"""
+
+    with open(os.path.join(RESOURCES_DIR, f"sentence_abbreviations_{language}.txt"), "r", encoding="utf-8") as fp:
+        return {line.strip().lower() for line in fp if line.strip() and not line.startswith("#")}
+
+def get_sentence_segmenter(language: str = "greek") -> SentenceSegmenter:
+    """The shared segmenter of a language, loaded once per process"""
+    return _load_segmenter(LANGUAGE_ISO_MAP.get(language, language))
+
+@lru_cache(maxsize=None)
+def _load_segmenter(language: str) -> SentenceSegmenter:
+    return SentenceSegmenter(language=language)
+
+def split_sentences(text: str, language: str = "greek") -> List[str]:
+    """Split text into sentences with the shared segmenter of the language"""
+    return get_sentence_segmenter(language).split(text)
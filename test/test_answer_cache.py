@@ -0,0 +1,48 @@
+import os
+import sys
+from collections import namedtuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pipelines.answer_cache import AnswerCache
+
+Doc = namedtuple("Doc", ["id", "content"])
+DOCS = [Doc("a", "Ο ιός μεταδίδεται με σταγονίδια."), Doc("b", "Η μάσκα προστατεύει.")]
+PARAMS = {"max_new_tokens": 100, "temperature": 0.4, "top_p": 0.5, "do_sample": True}
+
+
+def test_key_ignores_query_formatting_but_not_documents_or_params():
+
+    key = AnswerCache.make_key("Πώς μεταδίδεται ο ιός;", DOCS, PARAMS)
+    assert AnswerCache.make_key("  πώς  μεταδίδεται ο ιός ", DOCS, PARAMS) == key
+    assert AnswerCache.make_key("Πώς μεταδίδεται ο ιός;", DOCS[::-1], PARAMS) != key
+    assert AnswerCache.make_key("Πώς μεταδίδεται ο ιός;", [Doc("a", "Άλλο κείμενο."), DOCS[1]], PARAMS) != key
+    assert AnswerCache.make_key("Πώς μεταδίδεται ο ιός;", DOCS, {**PARAMS, "do_sample": False}) != key
+
+def test_answers_persist_across_instances(tmp_path):
+
+    path = str(tmp_path / "answers.sqlite")
+    key = AnswerCache.make_key("query", DOCS, PARAMS)
+    AnswerCache(path).put(key, {"answer": "Με σταγονίδια."}, document_ids=["a", "b"])
+
+    assert AnswerCache(path).get(key) == {"answer": "Με σταγονίδια."}
+
+def test_least_recently_used_answers_are_evicted(tmp_path):
+
+    cache = AnswerCache(str(tmp_path / "answers.sqlite"), max_entries=2)
+    cache.put("k1", {"answer": "1"}, document_ids=["a"])
+    cache.put("k2", {"answer": "2"}, document_ids=["a"])
+    cache.get("k1")
+    cache.put("k3", {"answer": "3"}, document_ids=["a"])
+
+    assert len(cache) == 2
+    assert cache.get("k2") is None and cache.get("k1") is not None
+
+def test_overwritten_documents_invalidate_their_answers(tmp_path):
+
+    cache = AnswerCache(str(tmp_path / "answers.sqlite"))
+    cache.put("k1", {"answer": "1"}, document_ids=["a", "b"])
+    cache.put("k2", {"answer": "2"}, document_ids=["c"])
+
+    assert cache.invalidate_documents(["b"]) == 1
+    assert cache.get("k1") is None and cache.get("k2") == {"answer": "2"}
@@ -0,0 +1,94 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+pytest.importorskip("haystack")
+from haystack.nodes.base import BaseComponent
+from haystack.pipelines import Pipeline
+from haystack.schema import Answer, Document
+
+from pipelines.branching_pipeline import BranchingQueryPipeline
+from pipelines.no_answer_gate import NoAnswerGate
+
+
+class StubRetriever(BaseComponent):
+    """Returns the same ranked documents for every query"""
+    outgoing_edges = 1
+
+    def __init__(self, scores):
+        super().__init__()
+        self.scores = scores
+        self.calls = 0
+
+    def run(self, query, top_k=None):
+        self.calls += 1
+        documents = [Document(content=f"Απόσπασμα {i}.", score=score) for i, score in enumerate(self.scores)]
+        return {"documents": documents[:top_k]}, "output_1"
+
+    def run_batch(self, queries, top_k=None):
+        raise NotImplementedError
+
+class StubAnswerer(BaseComponent):
+    """Stands in for the Reader or the Generator: answers with its label and the number of documents it got"""
+    outgoing_edges = 1
+
+    def __init__(self, label):
+        super().__init__()
+        self.label = label
+        self.calls = 0
+
+    def run(self, query, documents):
+        self.calls += 1
+        return {"answers": [Answer(answer=f"{self.label} {len(documents)}")], "answered_by": self.label}, "output_1"
+
+    def run_batch(self, queries, documents):
+        raise NotImplementedError
+
+def query_pipeline(scores, threshold=0.5):
+    retriever = StubRetriever(scores)
+    retrieval = Pipeline()
+    retrieval.add_node(component=retriever, name="Retriever", inputs=["Query"])
+
+    reader, generator = StubAnswerer("reader"), StubAnswerer("generator")
+    extractive = Pipeline()
+    extractive.add_node(component=NoAnswerGate(threshold=threshold), name="NoAnswerGate", inputs=["Query"])
+    extractive.add_node(component=reader, name="Reader", inputs=["NoAnswerGate.output_1"])
+    generative = Pipeline()
+    generative.add_node(component=generator, name="Generator", inputs=["Query"])
+
+    pipeline = BranchingQueryPipeline(retrieval=retrieval, branches={"extractive": extractive, "generative": generative})
+    return pipeline, retriever, reader, generator
+
+
+def test_answerable_query_runs_both_branches_on_one_retrieval():
+    pipeline, retriever, reader, generator = query_pipeline([0.9, 0.2, 0.1])
+
+    result = pipeline.run(query="Πώς μεταδίδεται ο ιός;", params={"Retriever": {"top_k": 2}})
+
+    assert retriever.calls == 1
+    assert [doc.score for doc in result["documents"]] == [0.9, 0.2]
+    assert [answer.answer for answer in result["answers"]] == ["reader 2", "generator 2"]
+    assert result["extractive"]["answered_by"] == "reader"
+    assert result["generative"]["answered_by"] == "generator"
+
+def test_decision_node_skips_the_reader_below_the_threshold():
+    pipeline, retriever, reader, generator = query_pipeline([0.3, 0.2])
+
+    result = pipeline.run(query="Ποιος κέρδισε το πρωτάθλημα;")
+
+    assert reader.calls == 0
+    assert generator.calls == 1
+    assert [answer.answer for answer in result["answers"]] == ["generator 2"]
+    assert "answered_by" not in result["extractive"]
+
+def test_params_reach_only_the_branch_with_the_node():
+    pipeline, retriever, reader, generator = query_pipeline([0.3, 0.2])
+
+    # A threshold for the gate only; the generative branch has no NoAnswerGate node and would reject it
+    result = pipeline.run(query="Πώς μεταδίδεται ο ιός;", params={"NoAnswerGate": {"threshold": 0.25}})
+
+    assert (reader.calls, generator.calls) == (1, 1)
+    assert [answer.answer for answer in result["answers"]] == ["reader 2", "generator 2"]
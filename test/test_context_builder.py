@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+pytest.importorskip("haystack")
+tokenizers = pytest.importorskip("tokenizers")
+from haystack.schema import Document
+from transformers import PreTrainedTokenizerFast
+
+from pipelines.context_builder import ContextBuilder
+
+DOCUMENTS = [
+    Document(content="Ο ιός μεταδίδεται με σταγονίδια. Πλένετε τα χέρια σας.", score=0.9),
+    Document(content="Φοράτε μάσκα σε κλειστούς χώρους.", score=0.5),
+]
+
+
+@pytest.fixture(scope="module")
+def tokenizer_path(tmp_path_factory):
+    """Offline fast tokenizer with one token per word or punctuation run"""
+    path = str(tmp_path_factory.mktemp("tokenizer"))
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.WordLevel(vocab={"[UNK]": 0}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]").save_pretrained(path)
+    return path
+
+def test_embedding_model_is_not_loaded_without_compression(tokenizer_path):
+    context_builder = ContextBuilder(tokenizer_name_or_path=tokenizer_path, embedding_model="not-downloaded/embedding-model")
+
+    output, _ = context_builder.run(query="Πώς μεταδίδεται ο ιός;", documents=DOCUMENTS[::-1])
+
+    assert [doc.content for doc in output["documents"]] == [doc.content for doc in DOCUMENTS]
+    assert context_builder._embedding_model is None
+
+def test_token_budget_cuts_at_a_sentence_boundary(tokenizer_path):
+    context_builder = ContextBuilder(tokenizer_name_or_path=tokenizer_path)
+
+    output, _ = context_builder.run(query="Πώς μεταδίδεται ο ιός;", documents=DOCUMENTS, token_budget=8)
+
+    assert [doc.content for doc in output["documents"]] == ["Ο ιός μεταδίδεται με σταγονίδια."]
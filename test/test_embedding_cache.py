@@ -0,0 +1,69 @@
+import multiprocessing
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+np = pytest.importorskip("numpy")
+from pipelines.embedding_cache import EmbeddingCache
+
+MODEL_KEY = {"model": "test-model", "revision": "main", "max_seq_len": 128}
+
+
+def fake_embed(contents):
+    return np.array([[len(content), content.count("α"), 1.0] for content in contents], dtype=np.float32)
+
+
+def put_in_batches(cache_dir, contents, start):
+    start.wait()
+    cache = EmbeddingCache(MODEL_KEY, cache_dir=cache_dir, growth_rows=2)
+    for i in range(0, len(contents), 3):
+        cache.put(contents[i:i + 3], fake_embed(contents[i:i + 3]))
+
+def test_only_misses_are_embedded_and_persist_across_instances(tmp_path):
+
+    embedded = []
+    def embed_fn(contents):
+        def embed(positions):
+            embedded.extend(contents[i] for i in positions)
+            return fake_embed([contents[i] for i in positions])
+        return embed
+
+    contents = ["αβγ", "δεζ", "αβγ"]
+    cache = EmbeddingCache(MODEL_KEY, cache_dir=str(tmp_path), growth_rows=2)
+    first = cache.embed(contents, embed_fn(contents))
+    assert np.array_equal(first, fake_embed(contents))
+
+    embedded.clear()
+    more = ["δεζ", "ηθι", "κλμ", "αα"]
+    second = EmbeddingCache(MODEL_KEY, cache_dir=str(tmp_path), growth_rows=2).embed(more, embed_fn(more))
+
+    assert embedded == ["ηθι", "κλμ", "αα"]
+    assert np.array_equal(second, fake_embed(more))
+
+def test_model_keys_do_not_share_embeddings(tmp_path):
+
+    EmbeddingCache(MODEL_KEY, cache_dir=str(tmp_path)).put(["αβγ"], fake_embed(["αβγ"]))
+
+    assert EmbeddingCache({**MODEL_KEY, "max_seq_len": 256}, cache_dir=str(tmp_path)).get(["αβγ"]) == {}
+
+def test_processes_writing_at_the_same_time_do_not_overwrite_rows(tmp_path):
+
+    context = multiprocessing.get_context("spawn")
+    start = context.Event()
+    contents = [[f"{'α' * (i % 7)}{worker}-{i}" for i in range(60)] for worker in range(2)]
+    workers = [context.Process(target=put_in_batches, args=(str(tmp_path), worker_contents, start)) for worker_contents in contents]
+    for worker in workers:
+        worker.start()
+    start.set()
+    for worker in workers:
+        worker.join(timeout=120)
+        assert worker.exitcode == 0
+
+    all_contents = contents[0] + contents[1]
+    cache = EmbeddingCache(MODEL_KEY, cache_dir=str(tmp_path))
+    cached = cache.get(all_contents)
+    assert len(cache) == len(all_contents)
+    assert np.array_equal(np.stack([cached[i] for i in range(len(all_contents))]), fake_embed(all_contents))
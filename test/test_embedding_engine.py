@@ -0,0 +1,65 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+pytest.importorskip("haystack")
+from tokenizers import Tokenizer
+from tokenizers.models import WordLevel
+from tokenizers.pre_tokenizers import Whitespace
+from transformers import PreTrainedTokenizerFast
+
+from pipelines.embedding_engine import PassageEmbeddingEngine
+
+
+class StubEncoder:
+    """Stands in for a SentenceTransformer: the embedding of a passage is its number and its number of words"""
+
+    def encode(self, texts, batch_size=None, convert_to_numpy=True, show_progress_bar=False):
+        return np.array([[float(text.split()[-1]), len(text.split())] for text in texts], dtype=np.float32)
+
+def load_stub_encoder(model_name_or_path, max_seq_len):
+    return StubEncoder()
+
+@pytest.fixture
+def tokenizer_path(tmp_path):
+    # A whitespace tokenizer saved locally, for the token lengths that the passages are batched by
+    tokenizer = Tokenizer(WordLevel({"[UNK]": 0}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = Whitespace()
+    PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]").save_pretrained(str(tmp_path))
+    return str(tmp_path)
+
+def passages(num_passages):
+    # Decreasing lengths, so that sorting by length reverses the order of the passages
+    return [" ".join(["μάσκα"] * (num_passages - i) + [str(i)]) for i in range(num_passages)]
+
+def expected_embeddings(texts):
+    return np.array([[i, len(text.split())] for i, text in enumerate(texts)], dtype=np.float32)
+
+def embed(tokenizer_path, texts, **kwargs):
+    engine = PassageEmbeddingEngine(tokenizer_path, load_model=load_stub_encoder, **kwargs)
+    try:
+        return engine.embed(texts)
+    finally:
+        engine.close()
+
+
+def test_embeddings_are_returned_in_input_order_across_the_workers(tokenizer_path):
+    texts = passages(7)
+
+    embeddings = embed(tokenizer_path, texts, num_workers=2, batch_size=2)
+
+    np.testing.assert_array_equal(embeddings, expected_embeddings(texts))
+
+def test_fewer_passages_than_workers(tokenizer_path):
+    texts = passages(2)
+
+    embeddings = embed(tokenizer_path, texts, num_workers=4, batch_size=1)
+
+    np.testing.assert_array_equal(embeddings, expected_embeddings(texts))
+
+def test_no_passages(tokenizer_path):
+    assert embed(tokenizer_path, [], num_workers=2).shape[0] == 0
@@ -0,0 +1,76 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+pytest.importorskip("haystack")
+from haystack.nodes import JsonConverter, TextConverter
+from haystack.nodes.base import BaseComponent
+from haystack.schema import Document
+
+from utils.file_type_classifier import FileTypeGroupConverter
+
+
+class StubPDFConverter(BaseComponent):
+    """Stands in for PDFToTextConverter, which needs the pdftotext binary"""
+    outgoing_edges = 1
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def run(self, file_paths, meta=None):
+        self.calls.append([path.name for path in file_paths])
+        return {"documents": [Document(content=f"pdf {path.stem}", meta=dict(file_meta)) for path, file_meta in zip(file_paths, meta)]}, "output_1"
+
+    def run_batch(self, file_paths, meta=None):
+        return self.run(file_paths=file_paths, meta=meta)
+
+@pytest.fixture
+def mixed_upload(tmp_path):
+    files = {
+        "a.txt": "Ο ιός μεταδίδεται με σταγονίδια.",
+        "b.pdf": None,
+        "c.jsonl": "\n".join(json.dumps({"content": content}, ensure_ascii=False) for content in ("Φοράτε μάσκα.", "Πλένετε τα χέρια σας.")),
+        "d.pdf": None,
+        "e.txt": "Κρατάτε αποστάσεις.",
+    }
+    for name, content in files.items():
+        (tmp_path / name).write_text(content if content is not None else "%PDF-1.4", encoding="utf-8")
+    return [tmp_path / name for name in files]
+
+def converter():
+    return FileTypeGroupConverter({".txt": TextConverter(), ".pdf": StubPDFConverter(), ".jsonl": JsonConverter()})
+
+def test_mixed_upload_is_routed_by_type_in_input_order(mixed_upload):
+    file_type_converter = converter()
+    output, _ = file_type_converter.run(file_paths=mixed_upload, meta=[{"source": path.name} for path in mixed_upload])
+
+    assert [(doc.content, doc.meta["source"]) for doc in output["documents"]] == [
+        ("Ο ιός μεταδίδεται με σταγονίδια.", "a.txt"),
+        ("pdf b", "b.pdf"),
+        ("Φοράτε μάσκα.", "c.jsonl"),
+        ("Πλένετε τα χέρια σας.", "c.jsonl"),
+        ("pdf d", "d.pdf"),
+        ("Κρατάτε αποστάσεις.", "e.txt"),
+    ]
+    assert file_type_converter.converters[".pdf"].calls == [["b.pdf"], ["d.pdf"]]
+
+def test_consecutive_files_of_a_type_are_converted_in_one_call(mixed_upload):
+    file_type_converter = converter()
+    pdfs = [path for path in mixed_upload if path.suffix == ".pdf"]
+    output, _ = file_type_converter.run(file_paths=pdfs, meta={"source": "upload"})
+
+    assert file_type_converter.converters[".pdf"].calls == [["b.pdf", "d.pdf"]]
+    assert [doc.meta["source"] for doc in output["documents"]] == ["upload", "upload"]
+
+def test_unsupported_file_type_is_rejected_before_converting(mixed_upload, tmp_path):
+    file_type_converter = converter()
+    (tmp_path / "f.odt").write_text("", encoding="utf-8")
+
+    with pytest.raises(ValueError, match="Unsupported file type '.odt'"):
+        file_type_converter.run(file_paths=mixed_upload + [tmp_path / "f.odt"])
+    assert file_type_converter.converters[".pdf"].calls == []
@@ -0,0 +1,207 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("haystack")
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pipelines.generation import PrefixCache, GenerationScheduler, SpeculativeDecoder, SentenceStoppingCriteria, _as_cache, _crop_cache, _merge_left_padded, _to_legacy_cache
+from pipelines.generation_backends import GenerationBackend, CPUBackend, load_backend
+
+
+def tiny_llama(seed, num_hidden_layers=2):
+    """Small randomly initialized local causal LM; no download needed"""
+    torch.manual_seed(seed)
+    config = transformers.LlamaConfig(
+        vocab_size=128, hidden_size=32, intermediate_size=64, num_hidden_layers=num_hidden_layers,
+        num_attention_heads=4, num_key_value_heads=4, max_position_embeddings=256,
+        bos_token_id=1, eos_token_id=2, pad_token_id=0,
+    )
+    return transformers.AutoModelForCausalLM.from_config(config).eval()
+
+@pytest.fixture(scope="module")
+def model():
+    return tiny_llama(seed=0)
+
+@pytest.fixture(scope="module")
+def prefix_ids():
+    return torch.randint(3, 128, (1, 24), generator=torch.Generator().manual_seed(1))
+
+def greedy(model, input_ids, max_new_tokens=12):
+    output_ids = model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), max_new_tokens=max_new_tokens, do_sample=False)
+    return output_ids[:, input_ids.shape[1]:]
+
+def test_prefix_cache_generates_identical_tokens_under_greedy_decoding(model, prefix_ids):
+
+    prefix_cache = PrefixCache(model, prefix_ids)
+    for seed in range(3):
+        suffix_ids = torch.randint(3, 128, (1, 10 + seed), generator=torch.Generator().manual_seed(seed))
+        input_ids = torch.cat([prefix_ids, suffix_ids], dim=1)
+
+        assert prefix_cache.matches(input_ids)
+        assert torch.equal(prefix_cache.generate(input_ids, max_new_tokens=12, do_sample=False), greedy(model, input_ids))
+
+def test_prefix_cache_is_not_modified_by_generation(model, prefix_ids):
+
+    prefix_cache = PrefixCache(model, prefix_ids)
+    cached = [(k.clone(), v.clone()) for k, v in prefix_cache.past_key_values]
+    input_ids = torch.cat([prefix_ids, torch.tensor([[5, 6, 7]])], dim=1)
+    prefix_cache.generate(input_ids, max_new_tokens=5, do_sample=False)
+
+    for (k, v), (cached_k, cached_v) in zip(prefix_cache.past_key_values, cached):
+        assert torch.equal(k, cached_k) and torch.equal(v, cached_v)
+
+def test_prompt_without_the_prefix_is_generated_without_cache(model, prefix_ids):
+
+    prefix_cache = PrefixCache(model, prefix_ids)
+    input_ids = torch.randint(3, 128, (1, 30), generator=torch.Generator().manual_seed(7))
+
+    assert not prefix_cache.matches(input_ids)
+    assert torch.equal(prefix_cache.generate(input_ids, max_new_tokens=12, do_sample=False), greedy(model, input_ids))
+
+def prefill(model, input_ids, past_key_values=None, attention_mask=None):
+    out = model(input_ids=input_ids, past_key_values=_as_cache(past_key_values), attention_mask=attention_mask, use_cache=True)
+    return out.logits, _to_legacy_cache(out.past_key_values)
+
+def test_cropped_cache_continues_as_a_prefill_of_the_kept_tokens(model):
+
+    input_ids = torch.randint(3, 128, (1, 12), generator=torch.Generator().manual_seed(5))
+    expected, _ = prefill(model, input_ids)
+    _, past = prefill(model, input_ids[:, :9])
+
+    # Drop the entries of 3 (e.g. rejected draft) tokens and feed the tokens from there on again
+    logits, past = prefill(model, input_ids[:, 6:], past_key_values=_crop_cache(past, 6))
+
+    assert all(k.shape[2] == 12 for k, _ in past)
+    assert torch.allclose(logits[0], expected[0, 6:], atol=1e-5)
+
+def test_merged_left_padded_caches_decode_as_separate_sequences(model):
+
+    short_ids = torch.randint(3, 128, (1, 4), generator=torch.Generator().manual_seed(6))
+    long_ids = torch.randint(3, 128, (1, 9), generator=torch.Generator().manual_seed(7))
+    _, short_past = prefill(model, short_ids)
+    _, long_past = prefill(model, long_ids)
+
+    past, attention_mask = _merge_left_padded(short_past, torch.ones_like(short_ids), long_past, torch.ones_like(long_ids))
+
+    assert attention_mask.tolist() == [[0] * 5 + [1] * 4, [1] * 9]
+    assert all(k.shape[:3] == (2, 4, 9) and not k[0, :, :5].any() for k, _ in past)
+    next_ids = torch.tensor([[10], [11]])
+    position_ids = torch.tensor([[4], [9]])
+    out = model(input_ids=next_ids, past_key_values=_as_cache(past), position_ids=position_ids,
+                attention_mask=torch.cat([attention_mask, torch.ones(2, 1, dtype=torch.long)], dim=1), use_cache=True)
+    for i, past_i in enumerate((short_past, long_past)):
+        expected, _ = prefill(model, next_ids[i:i + 1], past_key_values=past_i)
+        assert torch.allclose(out.logits[i, -1], expected[0, -1], atol=1e-5)
+
+def test_scheduler_batches_concurrent_requests_with_identical_greedy_outputs(model, prefix_ids):
+
+    scheduler = GenerationScheduler(model, max_batch_size=4, prefix_cache=PrefixCache(model, prefix_ids))
+    prompts = [torch.cat([prefix_ids, torch.randint(3, 128, (1, 5 + 3 * seed), generator=torch.Generator().manual_seed(seed))], dim=1) for seed in range(4)]
+    prompts.append(torch.randint(3, 128, (1, 17), generator=torch.Generator().manual_seed(9)))
+    # Different lengths make sequences join and leave the running batch at different token boundaries
+    requests = [scheduler.submit(input_ids, max_new_tokens=6 + 2 * i, do_sample=False) for i, input_ids in enumerate(prompts)]
+
+    for i, (input_ids, request) in enumerate(zip(prompts, requests)):
+        assert request.result(timeout=60) == greedy(model, input_ids, max_new_tokens=6 + 2 * i)[0].tolist()
+
+@pytest.mark.parametrize("num_draft_tokens", [1, 3, 5])
+def test_speculative_decoding_generates_identical_tokens_under_greedy_decoding(model, prefix_ids, num_draft_tokens):
+
+    # A different random model rejects most drafts, so corrections and cache cropping are exercised
+    draft_model = tiny_llama(seed=1, num_hidden_layers=1)
+    decoder = SpeculativeDecoder(model, draft_model, num_draft_tokens=num_draft_tokens, prefix_cache=PrefixCache(model, prefix_ids))
+    for seed in range(3):
+        input_ids = torch.cat([prefix_ids, torch.randint(3, 128, (1, 8), generator=torch.Generator().manual_seed(seed))], dim=1)
+        assert torch.equal(decoder.generate(input_ids, max_new_tokens=20, do_sample=False), greedy(model, input_ids, max_new_tokens=20))
+
+def test_speculative_decoding_with_the_target_as_draft_accepts_every_token(model):
+
+    decoder = SpeculativeDecoder(model, model, num_draft_tokens=4)
+    input_ids = torch.randint(3, 128, (1, 12), generator=torch.Generator().manual_seed(3))
+    output_ids = decoder.generate(input_ids, max_new_tokens=16, do_sample=False)
+
+    assert torch.equal(output_ids, greedy(model, input_ids, max_new_tokens=16))
+    assert decoder.last_stats["acceptance_rate"] == 1.0
+    assert decoder.last_stats["tokens_per_target_forward"] > 1.0
+
+def test_speculative_decoding_statistics_are_kept_per_thread(model):
+
+    decoder = SpeculativeDecoder(model, tiny_llama(seed=1, num_hidden_layers=1), num_draft_tokens=3)
+    prompts = [torch.randint(3, 128, (1, 8 + seed), generator=torch.Generator().manual_seed(seed)) for seed in range(4)]
+
+    def generate(input_ids):
+        decoder.generate(input_ids, max_new_tokens=4 + input_ids.shape[1], do_sample=False)
+        return decoder.last_stats["generated_tokens"]
+
+    with ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+        assert list(executor.map(generate, prompts)) == [4 + input_ids.shape[1] for input_ids in prompts]
+    assert decoder.stats["generated_tokens"] == sum(4 + input_ids.shape[1] for input_ids in prompts)
+
+def test_cpu_backend_quantizes_linear_layers_and_generates(model, tmp_path):
+
+    model.save_pretrained(tmp_path)
+    backend = load_backend("cpu", str(tmp_path), num_threads=1)
+    input_ids = torch.randint(3, 128, (1, 10), generator=torch.Generator().manual_seed(4))
+    output_ids = backend.generate(input_ids, max_new_tokens=8, do_sample=False)
+
+    assert isinstance(backend, CPUBackend)
+    assert not any(type(module) is torch.nn.Linear for module in backend.model.model.layers.modules())
+    assert output_ids.shape[0] == 1 and 0 < output_ids.shape[1] <= 8
+
+def test_backends_must_implement_generate():
+
+    class IncompleteBackend(GenerationBackend):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        IncompleteBackend()
+
+def test_unknown_backend_is_rejected():
+
+    with pytest.raises(ValueError):
+        load_backend("tpu", "any-model")
+
+class WordTokenizer:
+    """Decodes token id i to the i-th word"""
+    def __init__(self, words):
+        self.words = words
+
+    def decode(self, ids, skip_special_tokens=True):
+        return "".join(self.words[i] for i in ids)
+
+def test_sentence_stopping_criteria_stops_at_sentence_end_after_soft_budget():
+
+    tokenizer = WordTokenizer(["Ο", " ιός", " μεταδίδεται", ".", " Τα", " μέτρα", " 3", ".", "5", " μέτρα", "."])
+    criteria = SentenceStoppingCriteria(tokenizer, soft_max_new_tokens=5)
+
+    # the first sentence end comes before the soft budget, "3." is a number
+    assert not any(criteria.should_stop(list(range(n))) for n in range(1, 10))
+    assert criteria.should_stop(list(range(11)))
+    assert criteria.reason == "sentence_boundary"
+
+def test_sentence_stopping_criteria_stops_on_refusal():
+
+    tokenizer = WordTokenizer(["Δεν", " γνω", "ρίζω", " γιατί"])
+    criteria = SentenceStoppingCriteria(tokenizer, soft_max_new_tokens=None)
+
+    assert not criteria.should_stop([0, 1])
+    assert criteria.should_stop([0, 1, 2])
+    assert criteria.reason == "refusal"
+    assert criteria.trim_refusal("Δεν γνωρίζω γιατί") == "Δεν γνωρίζω."
+
+def test_sentence_stopping_criteria_in_generate(model):
+
+    # stop after the third generated token, whatever it is
+    tokenizer = WordTokenizer(["x"] * 128)
+    criteria = SentenceStoppingCriteria(tokenizer, soft_max_new_tokens=None, stop_phrases=["xxx"])
+    input_ids = torch.randint(3, 128, (1, 10), generator=torch.Generator().manual_seed(5))
+    output_ids = model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids), max_new_tokens=12, do_sample=False,
+                                min_new_tokens=3, stopping_criteria=transformers.StoppingCriteriaList([criteria]))
+
+    assert output_ids.shape[1] == input_ids.shape[1] + 3
@@ -0,0 +1,105 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+pytest.importorskip("haystack")
+from haystack.schema import Document
+from haystack.document_stores import InMemoryDocumentStore
+
+from pipelines.incremental_indexing import ChangedPassagesFilter, get_content_hash, get_passage_id
+from pipelines.near_duplicates import NearDuplicateFilter
+
+
+class DocumentStore(InMemoryDocumentStore):
+    """InMemoryDocumentStore that skips unknown ids in get_documents_by_id, as Elasticsearch does"""
+
+    def get_documents_by_id(self, ids, index=None, batch_size=None, headers=None):
+        stored = self.indexes.get(index or self.index, {})
+        return [stored[id] for id in ids if id in stored]
+
+def passages(*contents, source="doc_1.txt"):
+    return [Document(content=content, meta={"source": source}) for content in contents]
+
+def index(passages_filter, document_store, documents):
+    output, _ = passages_filter.run(documents=documents)
+    document_store.write_documents(output["documents"])
+    return output
+
+
+def test_only_new_or_changed_passages_are_indexed_and_dropped_ones_removed():
+
+    document_store = DocumentStore(use_bm25=False)
+    passages_filter = ChangedPassagesFilter(document_store=document_store)
+    index(passages_filter, document_store, passages("Πρώτο.", "Δεύτερο.", "Τρίτο."))
+
+    output = index(passages_filter, document_store, passages("Πρώτο.", "Δεύτερο αλλαγμένο."))
+
+    assert [doc.content for doc in output["documents"]] == ["Δεύτερο αλλαγμένο."]
+    assert output["unchanged_passages"] == 1
+    assert len(output["removed_ids"]) == 2
+    assert sorted(doc.content for doc in document_store.get_all_documents()) == ["Δεύτερο αλλαγμένο.", "Πρώτο."]
+
+def test_same_passage_of_another_source_is_kept():
+
+    document_store = DocumentStore(use_bm25=False)
+    passages_filter = ChangedPassagesFilter(document_store=document_store)
+    index(passages_filter, document_store, passages("Κοινό.", source="a.txt"))
+    index(passages_filter, document_store, passages("Κοινό.", source="b.txt"))
+
+    index(passages_filter, document_store, passages("Άλλο.", source="a.txt"))
+
+    assert sorted(doc.meta["source"] for doc in document_store.get_all_documents()) == ["a.txt", "b.txt"]
+
+def test_passages_indexed_before_incremental_indexing_are_replaced():
+
+    document_store = DocumentStore(use_bm25=False)
+    # Default content hash ids and no source, as written by the indexing pipeline before incremental indexing
+    document_store.write_documents([Document(content="Πρώτο."), Document(content="Δεύτερο.")])
+    passages_filter = ChangedPassagesFilter(document_store=document_store)
+
+    output = index(passages_filter, document_store, passages("Πρώτο.", "Τρίτο."))
+
+    assert output["removed_ids"] == [Document(content="Πρώτο.").id]
+    assert sorted((doc.content, doc.meta.get("source")) for doc in document_store.get_all_documents()) == \
+        [("Δεύτερο.", None), ("Πρώτο.", "doc_1.txt"), ("Τρίτο.", "doc_1.txt")]
+
+def test_dropped_passage_with_linked_near_duplicates_is_handed_over():
+
+    document_store = DocumentStore(use_bm25=False)
+    passages_filter = ChangedPassagesFilter(document_store=document_store)
+    near_duplicate_filter = NearDuplicateFilter(document_store=document_store, threshold=0.5, mode="link")
+    content = "Πλένετε συχνά τα χέρια σας με σαπούνι και νερό για τουλάχιστον είκοσι δευτερόλεπτα."
+    for documents in (passages(content, source="a.txt"), passages(content.replace("συχνά ", ""), source="b.txt")):
+        output, _ = passages_filter.run(documents=documents)
+        output, _ = near_duplicate_filter.run(documents=output["documents"])
+        document_store.write_documents(output["documents"])
+
+    output = index(passages_filter, document_store, passages("Άλλο.", source="a.txt"))
+
+    assert output["removed_ids"] == []
+    stored = {doc.content: doc.meta for doc in document_store.get_all_documents()}
+    assert stored[content]["source"] == "b.txt" and stored[content]["near_duplicate_sources"] == []
+    assert stored["Άλλο."]["source"] == "a.txt"
+
+def test_passages_a_run_did_not_store_are_removed_at_its_end():
+
+    document_store = DocumentStore(use_bm25=False)
+    passages_filter = ChangedPassagesFilter(document_store=document_store)
+    index(passages_filter, document_store, passages("Πρώτο.", "Δεύτερο.", "Τρίτο.", "Τέταρτο."))
+    index(passages_filter, document_store, passages("Άλλη πηγή.", source="b.txt"))
+
+    # The file is indexed again window by window: only the run id tells the dropped passages apart
+    for window in (passages("Πρώτο.", "Πέμπτο."), passages("Τρίτο.")):
+        output, _ = passages_filter.run(documents=window, remove_dropped=False, run_id="run-2")
+        assert output["removed_ids"] == []
+        document_store.write_documents(output["documents"])
+
+    removed = passages_filter.remove_stale_documents("doc_1.txt", "run-2")
+
+    assert sorted(removed) == sorted(get_passage_id("doc_1.txt", get_content_hash(content)) for content in ("Δεύτερο.", "Τέταρτο."))
+    assert sorted((doc.content, doc.meta["source"]) for doc in document_store.get_all_documents()) == \
+        [("Άλλη πηγή.", "b.txt"), ("Πέμπτο.", "doc_1.txt"), ("Πρώτο.", "doc_1.txt"), ("Τρίτο.", "doc_1.txt")]
+    assert {doc.meta.get("indexing_run") for doc in document_store.get_all_documents(filters={"source": ["doc_1.txt"]})} == {"run-2"}
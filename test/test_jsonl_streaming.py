@@ -0,0 +1,89 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+pytest.importorskip("haystack")
+from haystack.document_stores import InMemoryDocumentStore
+from haystack.nodes.base import BaseComponent
+from haystack.pipelines import Pipeline
+
+from pipelines.incremental_indexing import ChangedPassagesFilter
+from pipelines.jsonl_streaming import index_jsonl_windows
+
+
+class DocumentStore(InMemoryDocumentStore):
+    """InMemoryDocumentStore that skips unknown ids in get_documents_by_id, as Elasticsearch does"""
+
+    def get_documents_by_id(self, ids, index=None, batch_size=None, headers=None):
+        stored = self.indexes.get(index or self.index, {})
+        return [stored[id] for id in ids if id in stored]
+
+class WindowRecorder(BaseComponent):
+    """Records the contents of every window that reaches the document store"""
+    outgoing_edges = 1
+
+    def __init__(self):
+        super().__init__()
+        self.windows = []
+
+    def run(self, documents):
+        self.windows.append([doc.content for doc in documents])
+        return {"documents": documents}, "output_1"
+
+    def run_batch(self, documents):
+        return self.run(documents=documents)
+
+def streaming_pipeline(document_store):
+    changed_passages_filter = ChangedPassagesFilter(document_store=document_store)
+    recorder = WindowRecorder()
+    pipeline = Pipeline()
+    pipeline.add_node(component=changed_passages_filter, name="ChangedPassages", inputs=["File"])
+    pipeline.add_node(component=recorder, name="WindowRecorder", inputs=["ChangedPassages"])
+    pipeline.add_node(component=document_store, name="DocumentStore", inputs=["WindowRecorder"])
+    return pipeline, changed_passages_filter, recorder
+
+def write_jsonl(path, contents):
+    with open(path, "w", encoding="utf-8") as fp:
+        for content in contents:
+            fp.write(json.dumps({"content": content}, ensure_ascii=False) + "\n")
+    return path
+
+def lines(num_lines):
+    return [f"Ανακοίνωση {i} του ΕΟΔΥ για τον κορωνοϊό." for i in range(num_lines)]
+
+
+@pytest.mark.parametrize("num_lines, windows", [(6, [3, 3]), (7, [3, 3, 1]), (2, [2])])
+def test_file_is_indexed_in_windows_of_the_window_size(tmp_path, num_lines, windows):
+    document_store = DocumentStore(use_bm25=False)
+    pipeline, changed_passages_filter, recorder = streaming_pipeline(document_store)
+    path = write_jsonl(tmp_path / "eody.jsonl", lines(num_lines))
+
+    stats = index_jsonl_windows(path, pipeline, window_size=3, meta={"source": "eody.jsonl"}, changed_passages_filter=changed_passages_filter)
+
+    assert [len(window) for window in recorder.windows] == windows
+    # Every line is indexed once, in file order
+    assert [content for window in recorder.windows for content in window] == lines(num_lines)
+    assert stats == {"file": "eody.jsonl", "lines": num_lines, "documents": num_lines, "unchanged": 0, "near_duplicates": 0,
+                     "removed": 0, "windows": len(windows)}
+    assert document_store.get_document_count() == num_lines
+
+def test_documents_count_only_the_changed_passages_and_dropped_ones_are_removed(tmp_path):
+    document_store = DocumentStore(use_bm25=False)
+    pipeline, changed_passages_filter, _ = streaming_pipeline(document_store)
+    meta = {"source": "eody.jsonl"}
+    index_jsonl_windows(write_jsonl(tmp_path / "eody.jsonl", lines(7)), pipeline, window_size=3, meta=meta, changed_passages_filter=changed_passages_filter)
+
+    changed = lines(5) + ["Νέα ανακοίνωση του ΕΟΔΥ."]
+    written = []
+    stats = index_jsonl_windows(
+        write_jsonl(tmp_path / "eody.jsonl", changed), pipeline, window_size=3, meta=meta,
+        changed_passages_filter=changed_passages_filter, on_change=written.extend
+        )
+
+    assert (stats["lines"], stats["documents"], stats["unchanged"], stats["removed"], stats["windows"]) == (6, 1, 5, 2, 2)
+    assert len(written) == 3
+    assert sorted(doc.content for doc in document_store.get_all_documents()) == sorted(changed)
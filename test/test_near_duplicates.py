@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+pytest.importorskip("haystack")
+from haystack.schema import Document
+
+from pipelines.near_duplicates import NearDuplicateFilter, MinHasher, get_shingles, jaccard
+
+PASSAGE = ("Ο ιός μεταδίδεται κυρίως με σταγονίδια από το αναπνευστικό σύστημα όταν ένα άτομο βήχει ή φτερνίζεται, "
+           "καθώς και με την επαφή με μολυσμένες επιφάνειες. Πλένετε συχνά τα χέρια σας με σαπούνι και νερό.")
+
+
+def passages(*items):
+    return [Document(content=content, meta={"source": source}) for content, source in items]
+
+def test_shingles_ignore_case_and_accents():
+    assert get_shingles(PASSAGE) == get_shingles(PASSAGE.upper().replace("ί", "ι"))
+    assert MinHasher().band_keys(get_shingles(PASSAGE)) == MinHasher().band_keys(get_shingles(PASSAGE.upper()))
+    assert jaccard(get_shingles(PASSAGE), get_shingles("Φοράτε μάσκα σε κλειστούς χώρους.")) == 0.0
+
+def test_near_duplicate_of_another_source_is_linked_and_skipped():
+    near_duplicate_filter = NearDuplicateFilter(document_store=None, threshold=0.8)
+    documents = passages((PASSAGE, "eody.jsonl"), ("Φοράτε μάσκα σε κλειστούς χώρους.", "eody.jsonl"), (PASSAGE.replace("χέρια σας", "χέρια"), "who.txt"))
+
+    output, _ = near_duplicate_filter.run(documents=documents)
+
+    assert [doc.content for doc in output["documents"]] == [documents[0].content, documents[1].content]
+    assert output["near_duplicates"] == 1
+    assert output["documents"][0].meta["near_duplicate_sources"] == ["who.txt"]
+
+def test_dissimilar_passage_is_kept_in_drop_mode():
+    near_duplicate_filter = NearDuplicateFilter(document_store=None, threshold=0.95, mode="drop")
+    documents = passages((PASSAGE, "eody.jsonl"), (PASSAGE.replace("κυρίως", "κατά κύριο λόγο"), "who.txt"))
+
+    output, _ = near_duplicate_filter.run(documents=documents)
+
+    assert len(output["documents"]) == 2
+    assert "near_duplicate_sources" not in output["documents"][0].meta
@@ -0,0 +1,71 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+pytest.importorskip("haystack")
+from haystack.schema import Document
+
+from pipelines.no_answer_gate import NoAnswerGate, pick_threshold
+
+
+def ranked(*scores):
+    return [Document(content=f"Απόσπασμα {i}.", score=score) for i, score in enumerate(scores)]
+
+
+@pytest.mark.parametrize("top_score, edge", [(0.6, "output_1"), (0.5, "output_1"), (0.4, "output_2")])
+def test_top_ranker_score_at_above_and_below_the_threshold(top_score, edge):
+    documents = ranked(0.1, top_score, None)
+
+    output, output_edge = NoAnswerGate(threshold=0.5).run(query="Πώς μεταδίδεται ο ιός;", documents=documents)
+
+    assert output_edge == edge
+    assert output["documents"] == documents
+    assert ("answers" in output) == (edge == "output_2")
+    if edge == "output_2":
+        assert output["answers"] == []
+
+def test_threshold_of_the_query_overrides_the_calibrated_one():
+    gate = NoAnswerGate(threshold=0.5)
+
+    assert gate.run(query="q", documents=ranked(0.4), threshold=0.3)[1] == "output_1"
+    assert gate.run(query="q", documents=ranked(0.4, None), threshold=None)[1] == "output_2"
+
+def test_gate_without_threshold_or_scores():
+    assert NoAnswerGate().run(query="q", documents=ranked(0.0))[1] == "output_1"
+    # Documents without scores are never above a threshold
+    assert NoAnswerGate(threshold=0.5).run(query="q", documents=ranked(None))[1] == "output_2"
+    assert NoAnswerGate(threshold=0.5).run(query="q", documents=[])[1] == "output_2"
+
+def test_batch_skips_the_reader_only_if_no_query_is_answerable():
+    gate = NoAnswerGate(threshold=0.5)
+
+    assert gate.run_batch(queries=["q1", "q2"], documents=[ranked(0.2), ranked(0.7)])[1] == "output_1"
+    output, edge = gate.run_batch(queries=["q1", "q2"], documents=[ranked(0.2), ranked(0.4)])
+    assert edge == "output_2"
+    assert output["answers"] == [[], []]
+
+
+SAMPLES = [
+    {"top_ranker_score": 0.1, "correct": False},
+    {"top_ranker_score": 0.2, "correct": False},
+    {"top_ranker_score": 0.3, "correct": True},
+    {"top_ranker_score": 0.5, "correct": False},
+    {"top_ranker_score": 0.7, "correct": True},
+    {"top_ranker_score": 0.9, "correct": True},
+]
+
+def test_highest_threshold_without_answer_loss_is_picked():
+    report = pick_threshold(SAMPLES, max_answer_loss=0.0)
+
+    assert report["chosen"] == {"threshold": 0.3, "answer_loss": 0.0, "skipped": 2 / 6, "skipped_wrong": 1.0}
+    assert (report["num_questions"], report["num_correct"]) == (6, 3)
+    assert [point["threshold"] for point in report["curve"]] == [0.1, 0.2, 0.3, 0.5, 0.7, 0.9]
+    assert [point["answer_loss"] for point in report["curve"]] == [0.0, 0.0, 0.0, 1 / 3, 1 / 3, 2 / 3]
+
+def test_allowed_answer_loss_raises_the_threshold():
+    chosen = pick_threshold(SAMPLES, max_answer_loss=0.5)["chosen"]
+
+    assert chosen == {"threshold": 0.7, "answer_loss": 1 / 3, "skipped": 4 / 6, "skipped_wrong": 3 / 4}
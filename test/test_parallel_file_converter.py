@@ -0,0 +1,68 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+pytest.importorskip("haystack")
+from utils.parallel_file_converter import FileConversionWorker, ParallelFileConverter
+
+
+class StubPreprocessor:
+    """Keeps the converted documents as they are. Defined at module level, so that it is pickled to the workers."""
+
+    def process(self, documents):
+        return documents
+
+def write_jsonl(path, contents):
+    with open(path, "w", encoding="utf-8") as fp:
+        for content in contents:
+            fp.write(json.dumps({"content": content}, ensure_ascii=False) + "\n")
+    return path
+
+@pytest.fixture
+def files(tmp_path):
+    (tmp_path / "a.txt").write_text("Ο ιός μεταδίδεται με σταγονίδια.", encoding="utf-8")
+    write_jsonl(tmp_path / "b.jsonl", [f"Ανακοίνωση {i} του ΕΟΔΥ." for i in range(7)])
+    (tmp_path / "c.txt").write_text("Κρατάτε αποστάσεις από τους άλλους.", encoding="utf-8")
+    return [tmp_path / "a.txt", tmp_path / "b.jsonl", tmp_path / "c.txt"]
+
+EXPECTED = [("Ο ιός μεταδίδεται με σταγονίδια.", "a.txt")] + \
+    [(f"Ανακοίνωση {i} του ΕΟΔΥ.", "b.jsonl") for i in range(7)] + \
+    [("Κρατάτε αποστάσεις από τους άλλους.", "c.txt")]
+
+def convert(files, **kwargs):
+    converter = ParallelFileConverter(preprocessor=StubPreprocessor(), lines_per_task=3, **kwargs)
+    try:
+        return converter.convert(files, meta=[{"source": path.name} for path in files])
+    finally:
+        if converter._pool is not None:
+            converter._pool.shutdown()
+
+
+def test_jsonl_file_is_split_into_ranges_of_whole_lines(files):
+    converter = ParallelFileConverter(preprocessor=StubPreprocessor(), lines_per_task=3)
+    tasks = converter.plan_tasks([files[1]])
+
+    # The ranges cover the file without gaps
+    assert tasks[0].start == 0 and tasks[-1].end == files[1].stat().st_size
+    assert all(previous.end == task.start for previous, task in zip(tasks, tasks[1:]))
+    worker = FileConversionWorker(StubPreprocessor())
+    assert [len(worker.convert(task)) for task in tasks] == [3, 3, 1]
+
+# 8 workers for 5 tasks
+@pytest.mark.parametrize("num_workers", [1, 8])
+def test_documents_are_returned_in_input_order(files, num_workers):
+    documents = convert(files, num_workers=num_workers)
+
+    assert [(doc.content, doc.meta["source"]) for doc in documents] == EXPECTED
+
+def test_more_workers_than_files(files):
+    documents = convert(files[:1], num_workers=4)
+
+    assert [(doc.content, doc.meta["source"]) for doc in documents] == EXPECTED[:1]
+
+def test_no_files(files):
+    assert convert([], num_workers=4) == []
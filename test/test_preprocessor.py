@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+pytest.importorskip("haystack")
+tokenizers = pytest.importorskip("tokenizers")
+from haystack.schema import Document
+from transformers import PreTrainedTokenizerFast
+
+from pipelines.preprocessor import SentencePreProcessor, BatchTokenChunker
+
+TEXTS = [
+    "Ο ιός μεταδίδεται με σταγονίδια. Πλένετε συχνά τα χέρια σας με σαπούνι και νερό.\n\n\n\nΦοράτε μάσκα σε κλειστούς χώρους!",
+    "Πρώτη σελίδα με μία πρόταση.\fΔεύτερη σελίδα; " + "Πολύ μεγάλη πρόταση χωρίς τέλος " * 10 + "τέλος. Τελευταία πρόταση.",
+    "",
+]
+
+
+def word_tokenizer() -> PreTrainedTokenizerFast:
+    """Offline fast tokenizer with one token per word or punctuation run"""
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.WordLevel(vocab={"[UNK]": 0}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    return PreTrainedTokenizerFast(tokenizer_object=tokenizer, unk_token="[UNK]")
+
+@pytest.mark.parametrize("split_length", [5, 12, 128])
+def test_batch_token_chunker_passages_are_identical_to_the_preprocessor(split_length):
+    config = dict(clean_empty_lines=True, split_by="token", split_length=split_length, split_respect_sentence_boundary=True,
+                  tokenizer=word_tokenizer(), add_page_number=True, progress_bar=False)
+
+    expected = SentencePreProcessor(**config).process([Document(content=text, meta={"source": "a.txt"}) for text in TEXTS])
+    passages = BatchTokenChunker(**config).process([Document(content=text, meta={"source": "a.txt"}) for text in TEXTS])
+
+    assert expected
+    assert [(d.id, d.content, d.meta) for d in passages] == [(d.id, d.content, d.meta) for d in expected]
@@ -0,0 +1,124 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+pytest.importorskip("haystack")
+from haystack.pipelines import Pipeline
+from haystack.schema import Document
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pipelines.passage_tokenizer import PassageTokenizer
+from pipelines.ranker import SentenceTransformersRanker
+from pipelines.reader import ExtractiveReader
+from pipelines.reader_confidence_gate import ReaderConfidenceGate
+
+WORDS = "ο ιός μεταδίδεται με σταγονίδια πλένετε τα χέρια σας μάσκα πώς τι είναι κορωνοϊός η νόσος covid ; . ,".split()
+QUERIES = ["πώς μεταδίδεται ο ιός ;", "τι είναι η νόσος covid ;", "μάσκα ;"]
+
+
+@pytest.fixture(scope="module")
+def tiny_qa_model(tmp_path_factory):
+    """Small randomly initialized local extractive QA model; no download needed"""
+    path = str(tmp_path_factory.mktemp("tiny_qa"))
+    with open(os.path.join(path, "vocab.txt"), "w") as fp:
+        fp.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS))
+    transformers.BertTokenizerFast(vocab_file=os.path.join(path, "vocab.txt"), do_lower_case=True, strip_accents=False).save_pretrained(path)
+    torch.manual_seed(0)
+    config = transformers.BertConfig(vocab_size=len(WORDS) + 5, hidden_size=16, num_hidden_layers=1, num_attention_heads=2,
+                                     intermediate_size=32, max_position_embeddings=512)
+    transformers.BertForQuestionAnswering(config).save_pretrained(path)
+    return path
+
+def documents(num_docs):
+    return [Document(content=" ".join(WORDS[i % 7:i % 7 + 3 + i] * (1 + i % 4))) for i in range(num_docs)]
+
+def answers(result):
+    return [(a.answer, a.document_ids, round(a.score, 5)) for a in result["answers"]]
+
+def load_reader(path, **kwargs):
+    return ExtractiveReader(model_name_or_path=path, use_gpu=False, num_processes=0, max_seq_len=128, doc_stride=16,
+                            max_query_length=16, progress_bar=False, dynamic_max_seq_len=True, multiprocessing_min_docs=32, **kwargs)
+
+def test_concurrent_predict_calls_do_not_share_settings(tiny_qa_model):
+    reader = load_reader(tiny_qa_model)
+    # Calls of different sizes get different sequence lengths
+    calls = [(QUERIES[i % len(QUERIES)], documents(1 + 3 * i)) for i in range(6)]
+    expected = [answers(reader.predict(query, docs, top_k=3)) for query, docs in calls]
+
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        for _ in range(3):
+            results = list(executor.map(lambda call: answers(reader.predict(call[0], call[1], top_k=3)), calls))
+            assert results == expected
+
+    processor = reader.inferencer.processor
+    assert (processor.max_seq_len, processor.doc_stride) == (128, 16)
+    assert processor.pretokenized == {}
+
+def test_concurrent_cascade_runs_route_as_sequential_runs(tiny_qa_model):
+    # The Reader and ReaderConfidenceGate part of the cascade pipeline, run from the /cascade-query thread pool
+    pipeline = Pipeline()
+    pipeline.add_node(component=load_reader(tiny_qa_model), name="Reader", inputs=["Query"])
+    pipeline.add_node(component=ReaderConfidenceGate(min_confidence=0.05), name="ReaderConfidenceGate", inputs=["Reader"])
+    calls = [(QUERIES[i % len(QUERIES)], documents(1 + 3 * i)) for i in range(6)]
+
+    def run(call):
+        result = pipeline.run(query=call[0], documents=call[1], params={"Reader": {"top_k": 3}})
+        return result["answered_by"], answers(result) if "answers" in result else None
+
+    expected = [run(call) for call in calls]
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        assert list(executor.map(run, calls)) == expected
+
+def pretokenized_documents(path, num_docs):
+    docs = documents(num_docs)
+    PassageTokenizer(tokenizer_names=[path]).run(documents=docs)
+    return docs
+
+def test_answers_from_stored_passage_tokens_match_retokenized_answers(tiny_qa_model):
+    reader = load_reader(tiny_qa_model)
+    docs = pretokenized_documents(tiny_qa_model, 6)
+
+    for query in QUERIES:
+        expected = answers(reader.predict(query, documents(6), top_k=5))
+        assert expected
+        assert answers(reader.predict(query, docs, top_k=5)) == expected
+
+def test_ranker_features_from_stored_passage_tokens_match_retokenized_features(tiny_qa_model):
+    ranker = SentenceTransformersRanker(model_name_or_path=tiny_qa_model, use_gpu=False, progress_bar=False)
+    docs = pretokenized_documents(tiny_qa_model, 6)
+
+    features = ranker._get_pretokenized_features(query=QUERIES[0], documents=docs)
+    expected = ranker.transformer_tokenizer([QUERIES[0]] * len(docs), [doc.content for doc in docs], max_length=512,
+                                            padding="max_length", truncation=True, return_tensors="pt")
+    assert features is not None
+    for name in expected:
+        assert torch.equal(features[name], expected[name])
+    assert [doc.id for doc in ranker.predict(QUERIES[0], docs)] == [doc.id for doc in ranker.predict(QUERIES[0], documents(6))]
+
+def test_packed_answers_map_to_the_original_documents(tiny_qa_model):
+    reader = load_reader(tiny_qa_model)
+    packing_reader = load_reader(tiny_qa_model, pack_passages=True)
+    docs = pretokenized_documents(tiny_qa_model, 6)
+    for page_number, doc in enumerate(docs, start=1):
+        doc.meta["page_number"] = page_number
+    docs_by_id = {doc.id: doc for doc in docs}
+
+    for query, pretokenized in [(query, pretokenized) for query in QUERIES for pretokenized in (True, False)]:
+        # Without stored passage tokens the packed passages are tokenized with their separators
+        query_docs = docs if pretokenized else [Document(content=doc.content, meta={"page_number": doc.meta["page_number"]}) for doc in docs]
+        expected = reader.predict(query, query_docs, top_k=10)["answers"]
+        packed = packing_reader.predict(query, query_docs, top_k=10)["answers"]
+
+        assert len(packed) == len(expected) > 0
+        for answer in packed:
+            doc = docs_by_id[answer.document_ids[0]]
+            start, end = answer.offsets_in_document[0].start, answer.offsets_in_document[0].end
+            assert doc.content[start:end] == answer.answer
+            assert answer.context[answer.offsets_in_context[0].start:answer.offsets_in_context[0].end] == answer.answer
+            assert answer.meta == {"answer_page_number": doc.meta["page_number"]}
+        assert all(answer.meta.keys() == packed[0].meta.keys() for answer in expected)
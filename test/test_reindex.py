@@ -0,0 +1,70 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+pytest.importorskip("elasticsearch")
+pytest.importorskip("haystack")
+from document_store.initialize_document_store import check_elasticsearch
+
+if not check_elasticsearch():
+    pytest.skip("needs a running Elasticsearch", allow_module_level=True)
+
+from document_store.initialize_document_store import document_store
+from document_store.reindex import reindex, reindex_in_progress, get_alias_indices
+
+ALIAS = "test_reindex_document"
+TOPICS = ["μεταδίδεται με σταγονίδια", "προκαλεί πυρετό και βήχα", "αντιμετωπίζεται με εμβόλια", "ανιχνεύεται με τεστ PCR"]
+
+
+@pytest.fixture
+def alias():
+    yield ALIAS
+    client = document_store.client
+    for name in client.indices.get(index=f"{ALIAS}_v*"):
+        client.indices.delete(index=name)
+
+def write_source(path, num_lines):
+    with open(path, "w", encoding="utf-8") as fp:
+        for i in range(num_lines):
+            content = f"Ο κορωνοϊός {TOPICS[i % len(TOPICS)]}, σύμφωνα με την ανακοίνωση {i} του ΕΟΔΥ."
+            fp.write(json.dumps({"content": content}, ensure_ascii=False) + "\n")
+    return str(path)
+
+def test_build_is_validated_and_replaces_the_previous_version(alias, tmp_path):
+    client = document_store.client
+    source = write_source(tmp_path / "eody.jsonl", 40)
+
+    first = reindex([source], alias=alias)
+
+    assert get_alias_indices(client, alias) == [first["index"]]
+    assert reindex_in_progress(client, alias) is None
+    assert document_store.get_document_count(index=alias) == first["passages"] > 0
+    assert client.indices.get_settings(index=first["index"])[first["index"]]["settings"]["index"].get("refresh_interval") is None
+
+    # Version names have a resolution of one second
+    time.sleep(1)
+    second = reindex([source], alias=alias)
+
+    assert get_alias_indices(client, alias) == [second["index"]]
+    assert second["passages"] == first["passages"]
+    assert second["deleted"] == [first["index"]]
+
+def test_garbage_collection_keeps_a_version_that_is_being_built(alias, tmp_path):
+    client = document_store.client
+    source = write_source(tmp_path / "eody.jsonl", 8)
+    live = reindex([source], alias=alias)["index"]
+
+    building = f"{alias}_v99999999999999"
+    client.indices.create(index=building)
+    assert reindex_in_progress(client, alias) == building
+
+    time.sleep(1)
+    result = reindex([source], alias=alias)
+
+    assert result["deleted"] == [live]
+    assert client.indices.exists(index=building)
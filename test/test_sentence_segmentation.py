@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from utils.sentence_segmentation import SentenceSegmenter, get_sentence_segmenter, split_sentences
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("Τι είναι ο ιός SARS-CoV-2; Ο ιός είναι νέος. Εμφανίστηκε το 2019.",
+     ["Τι είναι ο ιός SARS-CoV-2;", "Ο ιός είναι νέος.", "Εμφανίστηκε το 2019."]),
+    ("Συμπτώματα (π.χ. πυρετός) είναι συχνά. Ο Γ. Παπαδόπουλος είπε «Ναι!» Μετά έφυγε.",
+     ["Συμπτώματα (π.χ. πυρετός) είναι συχνά.", "Ο Γ. Παπαδόπουλος είπε «Ναι!»", "Μετά έφυγε."]),
+    ("1. Πλένετε τα χέρια. 2. Φοράτε μάσκα.", ["1. Πλένετε τα χέρια.", "2. Φοράτε μάσκα."]),
+    ("Η απόσταση είναι 1.5 μέτρα. Τέλος... και μετά. Χωρίς τελεία", ["Η απόσταση είναι 1.5 μέτρα.", "Τέλος... και μετά.", "Χωρίς τελεία"]),
+    ("  ", []),
+])
+def test_greek_sentences(text, expected):
+    assert split_sentences(text) == expected
+
+def test_semicolon_ends_sentences_only_in_greek():
+    text = "Is it safe; yes it is. Next one."
+    assert SentenceSegmenter("english").split(text) == ["Is it safe; yes it is.", "Next one."]
+    assert SentenceSegmenter("greek").split(text)[0] == "Is it safe;"
+
+def test_sentences_preserving_whitespace_restore_the_text():
+    text = " Πρώτη πρόταση.  Δεύτερη;\nΤρίτη! "
+    sentences = get_sentence_segmenter("el").split_preserving_whitespace(text)
+    assert len(sentences) == 3
+    assert "".join(sentences) == text
+
+def test_segmenter_is_loaded_once_per_language():
+    assert get_sentence_segmenter("greek") is get_sentence_segmenter("el")
+
+def test_unknown_language_is_rejected():
+    with pytest.raises(ValueError):
+        SentenceSegmenter("klingon")